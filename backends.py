@@ -0,0 +1,87 @@
+# Reflection symmetry detection backends used by main.getSymmetries
+# Every backend has a detect(image) method that takes an RGB image array
+# and returns the rows of symBilOurCentLogGaborHSV:
+# [[x1, y1, x2, y2, score, normScore], ...]
+# normScore is missing when only a single symmetry line is found
+
+# Runs the original MATLAB implementation through the MATLAB engine for python
+# Requires matlab to be installed with the python extension
+class MatlabBackend:
+    def __init__(self):
+        import matlab
+        import matlab.engine
+        self.matlab = matlab
+        self.eng = matlab.engine.start_matlab()
+
+    def detect(self, image):
+        mat_a = self.matlab.uint8(image.tolist())
+        return self.eng.pySym(mat_a) #pySym = matlab file
+
+# Runs the NumPy / SciPy port in-process, no MATLAB required
+class NumpyBackend:
+    def __init__(self):
+        import parameters
+        import tiles
+        import triangulation
+        import wavelet
+        import wavesym
+        self.tiles = tiles
+        self.wavelet = wavelet
+        self.wavesym = wavesym
+        self.featureImage = None
+        self.features = None
+        self.pyramidLevels = parameters.pyramidLevels
+        # Tile size (pixels) of the wavelet transform of large images, set by main.py with --tiled, None transforms images whole
+        self.tileSize = None
+        wavelet.filterBankCache.maxBytes = parameters.filterCacheSize * 2**20
+        triangulation.tolerance = parameters.triangulationTolerance
+        triangulation.sampleFraction = parameters.triangulationSample
+        wavesym.setPrecision(parameters.precision)
+
+    def detect(self, image):
+        if self.tiled(image):
+            return self.wavesym.symTiled(image, self.tileSize)
+        if self.pyramidLevels > 1:
+            return self.wavesym.symPyramid(image, self.pyramidLevels)
+        return self.wavesym.symBilOurCentLogGaborHSV(image)
+
+    # Detect symmetries inside the region top, left, height, width of an image
+    # The wavelet features of the whole image are computed on the first request and reused for
+    # every following region of the same image. Coordinates are in the whole image
+    # Images are compared by identity, callers pass the same array for every region of an image
+    # (worker processes keep the copy they received, see scheduler.runNode)
+    def detectRegion(self, image, region):
+        if self.featureImage is not image:
+            self.featureImage = image
+            if self.tiled(image):
+                self.features = self.tiles.tiledFeatures(image, self.wavelet.getWavParam(image), self.tileSize)
+            else:
+                self.features = self.wavesym.detectFeatures(image)
+        return self.wavesym.symRegion(self.features, image.shape, region)
+
+    # Images larger than a tile are transformed tile by tile (see tiles.py)
+    def tiled(self, image):
+        return self.tileSize is not None and max(image.shape[0:2]) > self.tileSize
+
+    # Hit / miss counters of the Log-Gabor filter bank cache
+    def stats(self):
+        return self.wavelet.filterBankCache.stats()
+
+# Returns fixed symmetries without looking at the image: a vertical axis through the center and a weaker horizontal one
+# For testing the pipeline and server without MATLAB, the recursion still cuts the image on the vertical axis
+class MockBackend:
+    def detect(self, image):
+        h, w = image.shape[0:2]
+        return [[w / 2, 1, w / 2, h, 0.8, 1.0], [1, h / 2, w, h / 2, 0.4, 0.5]]
+
+backends = {
+    "matlab": MatlabBackend,
+    "numpy": NumpyBackend,
+    "mock": MockBackend
+}
+
+# Create the backend with the given name
+def getBackend(name):
+    if name not in backends:
+        raise ValueError("Unknown backend '" + name + "', choose from: " + ", ".join(backends))
+    return backends[name]()
@@ -0,0 +1,344 @@
+# Benchmark of the symmetry detection pipeline on fixed workloads
+# Times every stage of main.py (loading, getSymmetries, the recursive search, the post-processing filters and rendering)
+# and reports throughput and peak memory, results are saved as json to compare against later runs
+# Throughput is given in images and in triangulation pairs (pairs of feature points, numpy backend only) per second of the whole workload
+# Every workload runs in a process of its own, so its peak memory is not that of the workloads before it
+# Workloads:
+# bundled: the images in the input folder
+# synthetic: generated images with one known reflection axis or a known 4-fold rotation, for every size and density
+# Usage:
+# python benchmark.py
+# arguements:
+# --input "folder with the bundled images" (default: ./input/)
+# --workloads "bundled and / or synthetic" (default: bundled synthetic)
+# --sizes "sizes in pixels of the square synthetic images, before resizing" (default: 256 512 1024)
+# --densities "number of shapes drawn in the synthetic images" (default: 8 32)
+# --synthetic-images "number of images per synthetic workload" (default: 2)
+# --resize "values of the resize parameter to run every workload with" (default: resize in parameters.py)
+# --rc "values of the rc parameter to run every workload with" (default: rc in parameters.py)
+# --backend "auto/matlab/numpy, auto uses matlab when it can be started and numpy otherwise" (default: auto)
+# --mode "auto/slow/fast, auto uses slow when the machine learning model can be loaded and fast otherwise" (default: auto)
+# --repeat "number of runs of every workload, the fastest run of every stage is reported" (default: 1)
+# --output "json file to save the results in" (default: ./benchmark.json)
+# --baseline "json file of an earlier run to compare with, exits with an error on regressions" (default: off)
+# --threshold "fraction a stage may be slower than in the baseline before it counts as a regression" (default: 0.2)
+
+from matplotlib import image
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import backends
+import forest
+import instrument
+import main
+import parameters
+import sweep
+import util
+
+# Stages shorter than this in the baseline are not compared, their timings are mostly noise
+minCompareSeconds = 0.05
+
+# How peakRssMB is measured, saved with the results
+peakMemoryMethod = "peak resident memory (ru_maxrss) of a new process per workload, including python, the imported modules and the backend"
+
+# Accumulates the time spent in functions of main and util
+# Functions are replaced by timed wrappers, so the pipeline itself is not changed
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    def wrap(self, module, name):
+        func = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        setattr(module, name, timed)
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def reset(self):
+        self.seconds = {}
+        self.calls = {}
+
+# Square image with shapes mirrored around the vertical center line (reflection)
+# or copied around the center in four 90 degree rotations (rotation)
+# Returns the image and its true symmetries in the ground truth format of sweep.py
+def syntheticImage(kind, size, density, rng):
+    size = size - size % 2
+    half = size // 2
+    img = np.empty((size, size, 3), dtype=np.uint8)
+    img[:] = rng.integers(0, 256, 3)
+    for _ in range(density):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        center = (int(rng.integers(0, size)), int(rng.integers(0, size)))
+        axes = (int(rng.integers(size // 32 + 1, size // 6 + 2)), int(rng.integers(size // 32 + 1, size // 6 + 2)))
+        cv2.ellipse(img, center, axes, float(rng.uniform(0, 180)), 0, 360, color, -1, cv2.LINE_AA)
+    if kind == "reflection":
+        img[:, half:] = img[:, :half][:, ::-1]
+        truth = {"reflections": [[half, 0, half, size]], "rotations": []}
+    else:
+        quarter = img[:half, :half].copy()
+        img[:half, half:] = np.rot90(quarter, -1)
+        img[half:, half:] = np.rot90(quarter, 2)
+        img[half:, :half] = np.rot90(quarter, 1)
+        truth = {"reflections": [], "rotations": [[half, half, half]]}
+    return img, truth
+
+# Write the synthetic images of one workload to folder
+# Returns the ground truth of every image
+def writeSynthetic(folder, kind, size, density, count, seed):
+    rng = np.random.default_rng(seed)
+    groundTruth = {}
+    for n in range(count):
+        img, truth = syntheticImage(kind, size, density, rng)
+        name = kind + "-" + str(size) + "-" + str(density) + "-" + str(n) + ".jpg"
+        cv2.imwrite(os.path.join(folder, name), cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 95])
+        groundTruth[name] = truth
+    return groundTruth
+
+# Peak resident memory of this process in megabytes
+# Only the peak of the whole process lifetime is available, so every workload runs in a process of its own
+def peakRss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Pairs of feature points triangulated by the numpy backend in the trace events after offset (bytes) of the events file
+# Every voteSymmetries and refineLevel (pyramid) event pairs its featurePoints with each other
+def triangulationPairs(offset):
+    pairs = 0
+    with open(instrument.eventsPath) as file:
+        file.seek(offset)
+        for line in file:
+            event = json.loads(line)
+            if event["name"] in ["voteSymmetries", "refineLevel"]:
+                pairs += event["featurePoints"] * (event["featurePoints"] - 1) // 2
+    return pairs
+
+# Run every image of a folder through the stages of main.py, the way main.py does with --headless
+# Returns the timings of every stage, throughput and, with groundTruth, the recall of the true symmetries
+def runWorkload(timer, inDir, outDir, imgList, groundTruth=None):
+    main.inDir = inDir
+    main.outDir = outDir
+    timer.reset()
+    traceOffset = os.path.getsize(instrument.eventsPath)
+    pixels = 0
+    found = {"reflections": 0, "rotations": 0}
+    truths = {"reflections": 0, "rotations": 0}
+    start = time.perf_counter()
+    for name in imgList:
+        img = main.loadImage(name)
+        main.detectImage(img)
+        main.processImage(img)
+        main.saveImageHeadless(img)
+        pixels += img["data"].shape[0] * img["data"].shape[1]
+
+        if groundTruth is not None:
+            truth = groundTruth[name]
+            scale = image.imread(inDir + name).shape[1] / img["data"].shape[1]
+            table = util.asTable(img["symmetries"])
+            lines = table.line[np.argsort(-table.score, kind="stable")] * scale
+            rots = [[rot[0][0] * scale, rot[0][1] * scale, rot[1] * scale] for rot in sorted(img["rotations"], key=lambda rot: -rot[2])]
+            found["reflections"] += sweep.countMatches(lines, truth["reflections"], sweep.reflectionMatch)
+            found["rotations"] += sweep.countMatches(rots, truth["rotations"], sweep.rotationMatch)
+            truths["reflections"] += len(truth["reflections"])
+            truths["rotations"] += len(truth["rotations"])
+    seconds = time.perf_counter() - start
+    pairs = triangulationPairs(traceOffset)
+
+    result = {
+        "images": len(imgList),
+        "pixels": pixels,
+        "seconds": seconds,
+        "imagesPerSecond": len(imgList) / seconds if seconds > 0 else 0,
+        "triangulationPairs": pairs,
+        "triangulationPairsPerSecond": pairs / seconds if seconds > 0 else 0,
+        "stages": {name: {"seconds": timer.seconds[name], "calls": timer.calls[name]} for name in timer.seconds},
+        "peakRssMB": peakRss()
+    }
+    if groundTruth is not None:
+        result["recall"] = {kind: found[kind] / truths[kind] for kind in found if truths[kind] > 0}
+    return result
+
+# Timer of the workload process, set by initWorker
+timer = None
+
+# Start the backend and model of a workload process and time the stages of main.py in it
+# Trace events are written to tracePath for triangulationPairs
+def initWorker(backendName, mode, tracePath):
+    global timer
+    instrument.start(tracePath)
+    main.backend = backends.getBackend(backendName)
+    main.model = loadModel(mode)[1]
+    main.args = argparse.Namespace(backend=backendName, reuse_features=False, mode=mode, tiled=None)
+    timer = StageTimer()
+    timer.wrap(main, "loadImage")
+    timer.wrap(main, "getSymmetries")
+    timer.wrap(main, "detectImage")
+    timer.wrap(util, "removeBadSymmetries")
+    timer.wrap(util, "rotationalSymmetriesML")
+    timer.wrap(util, "rotationalSymmetries")
+    timer.wrap(util, "removeSimilarLines")
+    timer.wrap(util, "removeSimilarRotational")
+    timer.wrap(main, "processImage")
+    timer.wrap(main, "saveImageHeadless")
+
+# Run a workload repeat times in the workload process, returns the fastest run of every stage
+def runWorkloadRepeated(resize, rc, repeat, inDir, outDir, imgList, groundTruth):
+    main.resize = resize
+    main.rc = rc
+    return fastestRun([runWorkload(timer, inDir, outDir, imgList, groundTruth) for _ in range(repeat)])
+
+# Run a workload in a new process, started with spawn so it does not share the memory of this process
+def runWorkloadProcess(backendName, mode, tracePath, resize, rc, repeat, inDir, outDir, imgList, groundTruth):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=initWorker, initargs=(backendName, mode, tracePath)) as pool:
+        return pool.submit(runWorkloadRepeated, resize, rc, repeat, inDir, outDir, imgList, groundTruth).result()
+
+# Keep the fastest run of every stage
+def fastestRun(runs):
+    result = dict(min(runs, key=lambda run: run["seconds"]))
+    result["stages"] = {name: min((run["stages"][name] for run in runs if name in run["stages"]), key=lambda stage: stage["seconds"])
+                        for name in result["stages"]}
+    return result
+
+# Workloads of results and baseline are compared on name, resize and rc
+# Returns a list of regressions as text
+def compareResults(results, baseline, threshold):
+    def workloadKey(workload):
+        return (workload["name"], workload["resize"], workload["rc"])
+    old = {workloadKey(workload): workload for workload in baseline["workloads"]}
+    regressions = []
+    for workload in results["workloads"]:
+        base = old.get(workloadKey(workload))
+        if base is None:
+            continue
+        timings = [["total", workload["seconds"], base["seconds"]]]
+        for name, stage in workload["stages"].items():
+            if name in base["stages"]:
+                timings.append([name, stage["seconds"], base["stages"][name]["seconds"]])
+        for name, seconds, baseSeconds in timings:
+            if baseSeconds >= minCompareSeconds and seconds > baseSeconds * (1 + threshold):
+                regressions.append(workload["name"] + " (resize " + str(workload["resize"]) + ", rc " + str(workload["rc"]) + ") " + name + ": "
+                                   + str(round(baseSeconds, 3)) + "s -> " + str(round(seconds, 3)) + "s")
+    return regressions
+
+# The backend to benchmark, with auto matlab when it can be started and numpy otherwise
+def startBackend(name):
+    if name != "auto":
+        return name, backends.getBackend(name)
+    try:
+        return "matlab", backends.getBackend("matlab")
+    except Exception:
+        return "numpy", backends.getBackend("numpy")
+
+# The machine learning model, with auto None (fast mode) when it can not be loaded
+def loadModel(mode):
+    if mode == "fast":
+        return "fast", None
+    try:
+        return "slow", forest.loadModel(main.modelFileName)
+    except Exception:
+        if mode == "slow":
+            raise
+        return "fast", None
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input/", help="Folder with the bundled images (default: ./input/)")
+    parser.add_argument("--workloads", nargs="+", default=["bundled", "synthetic"], choices=["bundled", "synthetic"], help="Workloads to run (default: bundled synthetic)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[256, 512, 1024], help="Sizes of the synthetic images (default: 256 512 1024)")
+    parser.add_argument("--densities", nargs="+", type=int, default=[8, 32], help="Number of shapes in the synthetic images (default: 8 32)")
+    parser.add_argument("--synthetic-images", type=int, default=2, help="Number of images per synthetic workload (default: 2)")
+    parser.add_argument("--resize", nargs="+", type=float, default=[parameters.resize], help="Values of resize to run with (default: parameters.py)")
+    parser.add_argument("--rc", nargs="+", type=int, default=[parameters.rc], help="Values of rc to run with (default: parameters.py)")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + list(backends.backends), help="auto / matlab / numpy (default: auto)")
+    parser.add_argument("--mode", default="auto", choices=["auto", "slow", "fast"], help="auto / slow / fast (default: auto)")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs of every workload (default: 1)")
+    parser.add_argument("--output", default="./benchmark.json", help="Json file to save the results in (default: ./benchmark.json)")
+    parser.add_argument("--baseline", default=None, help="Json file of an earlier run to compare with (default: off)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown per stage compared to the baseline (default: 0.2)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    # auto is resolved once here, every workload process then starts the same backend and model
+    backendName, backend = startBackend(args.backend)
+    mode, model = loadModel(args.mode)
+    del backend, model
+    print("Backend:", backendName, "mode:", mode)
+
+    results = {
+        "commit": gitCommit(),
+        "backend": backendName,
+        "mode": mode,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "peakMemory": peakMemoryMethod,
+        "workloads": []
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        outDir = os.path.join(tmp, "output") + "/"
+        os.mkdir(outDir)
+        workloads = []
+        if "bundled" in args.workloads:
+            workloads.append(["bundled", args.input, sorted(util.listImages(args.input, '.jpg')), None])
+        if "synthetic" in args.workloads:
+            for kind in ["reflection", "rotation"]:
+                for size in args.sizes:
+                    for density in args.densities:
+                        name = "synthetic-" + kind + "-" + str(size) + "-" + str(density)
+                        folder = os.path.join(tmp, name) + "/"
+                        os.mkdir(folder)
+                        groundTruth = writeSynthetic(folder, kind, size, density, args.synthetic_images, seed=size * 1000 + density)
+                        workloads.append([name, folder, sorted(groundTruth), groundTruth])
+
+        print("Peak memory:", peakMemoryMethod)
+        for resize in args.resize:
+            for rc in args.rc:
+                for name, folder, imgList, groundTruth in workloads:
+                    result = runWorkloadProcess(backendName, mode, os.path.join(tmp, "trace.jsonl"), resize, rc, args.repeat, folder, outDir, imgList, groundTruth)
+                    result = dict(name=name, resize=resize, rc=rc, **result)
+                    results["workloads"].append(result)
+                    print(name, "resize", resize, "rc", rc, ":", round(result["seconds"], 3), "s,",
+                          round(result["imagesPerSecond"], 3), "images/s,", round(result["triangulationPairsPerSecond"]), "triangulation pairs/s,",
+                          round(result["peakRssMB"]), "MB peak", result.get("recall", ""))
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print("Saved", args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compareResults(results, baseline, args.threshold)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions above", str(round(args.threshold * 100)) + "%")
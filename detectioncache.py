@@ -0,0 +1,102 @@
+# On-disk cache of the raw recursiveSym output of images
+# Entries are keyed on a hash of the image data and the detector parameters, so a changed image or
+# parameter never hits an old entry. Only the post-processing has to be repeated for cached images
+# Every entry is one .npy file with the SymmetryTable of all recursive loops of an image, loaded memory-mapped
+# The cache is kept under maxBytes by removing the least recently used entries
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from symmetrytable import SymmetryTable
+
+# Changing the stored format invalidates all entries
+cacheVersion = 1
+
+class DetectionCache:
+    def __init__(self, cacheDir, maxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cacheDir, exist_ok=True)
+
+    # Key of an image given its (resized) data and a dict of every parameter that changes the detections
+    def key(self, data, params):
+        h = hashlib.sha256()
+        h.update(json.dumps([cacheVersion, data.shape, str(data.dtype), params], sort_keys=True, default=lambda v: v.item()).encode())
+        h.update(np.ascontiguousarray(data).tobytes())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key + ".npy")
+
+    # Cached symmetries of an image in the recursiveSym format [[symmetries, depth], ...], None when not cached
+    # The SymmetryTables are read-only views on the memory-mapped file
+    def get(self, key):
+        path = self.path(key)
+        try:
+            try:
+                data = np.load(path, mmap_mode="r")
+            except ValueError:
+                # Files without any symmetries can not be memory-mapped
+                data = np.load(path)
+            # Mark as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+
+        table = SymmetryTable(data)
+        starts = np.flatnonzero(np.r_[True, table.node[1:] != table.node[:-1]]) if len(table) > 0 else []
+        ends = list(starts[1:]) + [len(table)]
+        return [[table[start:end], int(table.depth[start])] for start, end in zip(starts, ends)]
+
+    # Store the symmetries of an image in the recursiveSym format [[symmetries, depth], ...]
+    def put(self, key, symmetries):
+        tables = [syms if isinstance(syms, SymmetryTable) else SymmetryTable.fromList(syms) for syms, _ in symmetries]
+        table = SymmetryTable.concatenate(tables)
+        table.node[:] = np.repeat(np.arange(len(tables)), [len(t) for t in tables])
+        table.depth[:] = np.repeat([depth for _, depth in symmetries], [len(t) for t in tables])
+
+        # Write to a temporary file first, so readers never see half written entries
+        path = self.path(key)
+        tmp = path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmp, "wb") as file:
+            np.save(file, table.data)
+        os.replace(tmp, path)
+        self.evict()
+
+    # Remove least recently used entries until the cache is smaller than maxBytes
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.cacheDir):
+                if not name.endswith(".npy"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cacheDir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.maxBytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cacheDir, name))
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
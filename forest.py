@@ -0,0 +1,174 @@
+# Random forest of the machine learning model as flat numpy arrays
+# The trees of a trained sklearn RandomForestClassifier are exported once to a folder of .npy files:
+# nodes.npy (feature, threshold and children of every node of every tree), values.npy (class probabilities
+# of every node) and forest.json (root node of every tree, classes and depth)
+# The exported forest is loaded memory-mapped and predicts without sklearn, giving the same predictions
+# The pickled model is read without sklearn as well, so exporting works with any (or no) sklearn version
+# Usage:
+# python forest.py models/RF-trainValTest.pkl
+# exports the pickled model to models/RF-trainValTest/, which is then used by main.py instead of the pickle
+# loadModel exports the model itself when the folder is missing or older than the pickle
+import json
+import os
+import pickle
+import sys
+import warnings
+
+import numpy as np
+
+# children holds the right child and the left child, the left child is taken when feature <= threshold
+nodeDtype = np.dtype([
+    ("feature", "i4"),
+    ("threshold", "f8"),
+    ("children", "i4", (2,))
+])
+
+# Number of (sample, tree) pairs walked down the trees at once in Forest.predict_proba
+# Keeps the intermediate arrays small enough to stay in cache
+blockSize = 2**16
+
+# Folder of the exported forest of a pickled model
+def exportFolder(modelFileName):
+    return os.path.splitext(modelFileName)[0]
+
+# Export the trees of a fitted RandomForestClassifier (single output) to folder
+# Leaves point to themselves
+def exportForest(model, folder):
+    nodes = []
+    values = []
+    roots = []
+    maxDepth = 0
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        leaf = tree.children_left == -1
+        treeNodes = np.zeros(n, dtype=nodeDtype)
+        treeNodes["feature"] = np.where(leaf, 0, tree.feature)
+        treeNodes["threshold"] = np.where(leaf, 0, tree.threshold)
+        treeNodes["children"][:, 0] = np.where(leaf, np.arange(n), tree.children_right) + offset
+        treeNodes["children"][:, 1] = np.where(leaf, np.arange(n), tree.children_left) + offset
+        # Class probabilities, normalised as DecisionTreeClassifier.predict_proba does
+        value = tree.value[:, 0, :model.n_classes_].astype(float)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        nodes.append(treeNodes)
+        values.append(value / normalizer)
+        roots.append(offset)
+        maxDepth = max(maxDepth, tree.max_depth)
+        offset += n
+
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, "nodes.npy"), np.concatenate(nodes))
+    np.save(os.path.join(folder, "values.npy"), np.concatenate(values))
+    with open(os.path.join(folder, "forest.json"), "w") as file:
+        json.dump({"roots": roots, "classes": model.classes_.tolist(), "maxDepth": int(maxDepth),
+                   "features": int(model.n_features_in_ if hasattr(model, "n_features_in_") else model.n_features_)}, file)
+
+# Object of a pickled sklearn class, keeps the state it is unpickled with as attributes
+class PickledObject:
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+# sklearn.tree._tree.Tree as read by ModelUnpickler, with the attributes of a fitted tree that exportForest uses
+class PickledTree(PickledObject):
+    def __init__(self, *args):
+        pass
+
+    def __setstate__(self, state):
+        nodes = state["nodes"]
+        self.node_count = state["node_count"]
+        self.max_depth = state["max_depth"]
+        self.children_left = nodes["left_child"]
+        self.children_right = nodes["right_child"]
+        self.feature = nodes["feature"]
+        self.threshold = nodes["threshold"]
+        self.value = state["values"]
+
+# Reads a pickled RandomForestClassifier without importing sklearn, sklearn classes become PickledObjects
+class ModelUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if module == "sklearn.tree._tree" and name == "Tree":
+            return PickledTree
+        if module.split(".")[0] == "sklearn":
+            return type(name, (PickledObject,), {})
+        return super().find_class(module, name)
+
+# Export the pickled model of modelFileName to folder, without sklearn
+def exportPickle(modelFileName, folder):
+    with open(modelFileName, 'rb') as file:
+        model = ModelUnpickler(file).load()
+    exportForest(model, folder)
+
+# Exported forest with the predict method of RandomForestClassifier
+class Forest:
+    def __init__(self, folder):
+        nodes = np.load(os.path.join(folder, "nodes.npy"), mmap_mode="r")
+        self.feature = nodes["feature"]
+        self.threshold = nodes["threshold"]
+        self.children = nodes["children"]
+        self.values = np.load(os.path.join(folder, "values.npy"), mmap_mode="r")
+        with open(os.path.join(folder, "forest.json")) as file:
+            meta = json.load(file)
+        self.roots = np.array(meta["roots"], dtype=np.int64)
+        self.classes = np.array(meta["classes"])
+        self.maxDepth = meta["maxDepth"]
+        self.features = meta["features"]
+
+    # Leaf node of every sample (columns) in every tree (rows)
+    # All samples walk down all trees at once, a sample leaves the walk when it reaches a leaf of a tree
+    # As in sklearn, features are compared as float32
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n, features = X.shape
+        X = X.ravel()
+        leaves = np.repeat(self.roots, n)
+        idx = leaves.copy()
+        walk = np.arange(len(idx))
+        offsets = np.tile(np.arange(n) * features, len(self.roots))
+        for _ in range(self.maxDepth):
+            nxt = self.children[idx, (X[offsets + self.feature[idx]] <= self.threshold[idx]).astype(np.intp)]
+            done = nxt == idx
+            if done.any():
+                leaves[walk[done]] = idx[done]
+                walk, offsets, idx = walk[~done], offsets[~done], nxt[~done]
+                if len(idx) == 0:
+                    break
+            else:
+                idx = nxt
+        leaves[walk] = idx
+        return leaves.reshape(len(self.roots), n)
+
+    # Mean class probabilities of all trees, added up tree by tree like sklearn
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        proba = np.zeros((len(X), len(self.classes)))
+        step = max(1, blockSize // len(self.roots))
+        for start in range(0, len(X), step):
+            leaves = self.apply(X[start:start + step])
+            for t in range(len(self.roots)):
+                proba[start:start + step] += self.values[leaves[t]]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+# Load the model of modelFileName as exported forest, the pickle is exported first when the forest is missing or older
+# Falls back to unpickling the model with sklearn when it can not be exported, e.g. in a read-only folder
+def loadModel(modelFileName):
+    folder = exportFolder(modelFileName)
+    meta = os.path.join(folder, "forest.json")
+    if not os.path.isfile(meta) or os.path.getmtime(meta) < os.path.getmtime(modelFileName):
+        try:
+            exportPickle(modelFileName, folder)
+        except (OSError, pickle.UnpicklingError, AttributeError, KeyError) as e:
+            warnings.warn("Could not export " + modelFileName + " to " + folder + " (" + str(e) + "), loading the pickled model with sklearn")
+            with open(modelFileName, 'rb') as file:
+                return pickle.load(file)
+    return Forest(folder)
+
+if __name__ == "__main__":
+    for modelFileName in sys.argv[1:]:
+        exportPickle(modelFileName, exportFolder(modelFileName))
+        print(modelFileName, "->", exportFolder(modelFileName))
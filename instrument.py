@@ -0,0 +1,160 @@
+# Instrumentation of the hot paths of the pipeline
+# A span records the wall time of one call of a function, with workload sizes such as the number of
+# feature points, pairs, votes and lines. Every finished span is one trace event
+# Events are written as json lines, one line per event, or converted to the Chrome trace format
+# (chrome://tracing, Perfetto) when tracing stops
+# Disabled instrumentation costs one flag check per traced call
+# Worker processes append their events to the same file, see scheduler.initWorker
+import functools
+import json
+import os
+import threading
+import time
+
+# Fields that spans take over from the span they are called in, so every event can be traced back to its image
+inheritFields = ["image", "depth"]
+
+enabled = False
+# File the events are written to, with the chrome format a temporary json lines file next to path
+eventsPath = None
+path = None
+traceFormat = None
+fd = None
+local = threading.local()
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.fields = {}
+
+    def __enter__(self):
+        stack = getattr(local, "stack", None)
+        if stack is None:
+            stack = local.stack = []
+        if stack:
+            parent = stack[-1].fields
+            for field in inheritFields:
+                if field in parent:
+                    self.fields[field] = parent[field]
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        local.stack.pop()
+        event = {"name": self.name, "ts": self.start // 1000, "dur": (end - self.start) // 1000,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        event.update(self.fields)
+        write(event)
+        return False
+
+    def record(self, **fields):
+        self.fields.update(fields)
+
+# Returned instead of a span when instrumentation is disabled
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, **fields):
+        pass
+
+nullSpan = NullSpan()
+
+# Span of a block of code, used as: with instrument.span("name"):
+def span(name, **fields):
+    if not enabled:
+        return nullSpan
+    s = Span(name)
+    s.fields.update(fields)
+    return s
+
+# Decorator that records a span for every call of a function
+def traced(func):
+    name = func.__name__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        with Span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+# Add fields (workload sizes, image name) to the innermost span of this thread
+def record(**fields):
+    if not enabled:
+        return
+    stack = getattr(local, "stack", None)
+    if stack:
+        stack[-1].fields.update(fields)
+
+# Inherited fields of the innermost span, to continue a trace in another thread or process (see resume)
+def context():
+    if not enabled:
+        return None
+    stack = getattr(local, "stack", None)
+    if not stack:
+        return {}
+    return {field: stack[-1].fields[field] for field in inheritFields if field in stack[-1].fields}
+
+# Continue a trace in another thread or process: spans inside the with block take over the fields returned by context
+# Unlike a span, no event is written for the block itself
+def resume(ctx):
+    if not enabled or ctx is None:
+        return nullSpan
+    return Context(ctx)
+
+class Context(Span):
+    def __init__(self, fields):
+        Span.__init__(self, None)
+        self.fields.update(fields)
+
+    def __exit__(self, *exc):
+        local.stack.pop()
+        return False
+
+# Every event is a single write to a file opened for appending, so events of threads and processes are not mixed
+def write(event):
+    os.write(fd, (json.dumps(event, default=lambda v: v.item()) + "\n").encode())
+
+# Start writing trace events to path, in the jsonl or chrome format
+# With append, events are added to an existing json lines file (used by worker processes)
+def start(tracePath, fmt="jsonl", append=False):
+    global enabled, eventsPath, path, traceFormat, fd
+    path = tracePath
+    traceFormat = fmt
+    eventsPath = tracePath if fmt == "jsonl" else tracePath + ".events.jsonl"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    if not append:
+        flags |= os.O_TRUNC
+    fd = os.open(eventsPath, flags, 0o644)
+    enabled = True
+
+# Stop tracing, with the chrome format the json lines are converted into one trace file
+def stop():
+    global enabled, fd
+    if not enabled:
+        return
+    enabled = False
+    os.close(fd)
+    fd = None
+    if traceFormat == "chrome":
+        toChrome(eventsPath, path)
+        os.remove(eventsPath)
+
+# Convert a json lines trace into the Chrome trace format, workload sizes become the args of the events
+def toChrome(eventsFile, chromeFile):
+    events = []
+    with open(eventsFile) as file:
+        for line in file:
+            event = json.loads(line)
+            chromeEvent = {key: event.pop(key) for key in ["name", "ts", "dur", "pid", "tid"]}
+            chromeEvent["ph"] = "X"
+            chromeEvent["args"] = event
+            events.append(chromeEvent)
+    with open(chromeFile, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
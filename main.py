@@ -6,17 +6,26 @@
 # --input "custom input folder" (default: ./input/)
 # --output "custom output folder" (default: ./output/)
 # --mode "slow/fast, either uses Machine learning (slow) to detect rotational symmetries or simple rules (fast)" (default: slow)
-# Requires matlab to be installed with the python extension
+# --backend "matlab/numpy/mock, either runs the original matlab code or the in-process numpy port to fetch reflection symmetries, mock returns fixed lines without detecting anything" (default: matlab)
+# --reuse-features "compute wavelet features once per image and reuse them for all cut images, numpy backend only" (default: off)
+# --headless "draw symmetries straight onto the images and save them in a thread pool, without opening figures or pausing" (default: off)
+# --results "jsonl/npz, also save the reflection and rotational symmetries as json lines (results.jsonl) or one .npz file per image" (default: off)
+# --cache-dir "folder to cache the symmetry detections of every image in, a re-run on the same images only repeats the post-processing" (default: off)
+# --workers "number of worker processes fetching symmetries of images and cut images in parallel" (default: 1)
+# --tiled "folder to keep memory-mapped raw copies of the images in, the wavelet features of images larger than tileSize (parameters.py) are computed tile by tile with bounded memory, numpy backend only" (default: off)
+# --trace "file to write trace events with the time and workload sizes of every stage, image and recursive loop to" (default: off)
+# --trace-format "jsonl/chrome, json lines or the Chrome trace format (chrome://tracing, Perfetto)" (default: jsonl)
+# The matlab backend requires matlab to be installed with the python extension
 # Tested on python 3.7.10 with matlab R2020B
 
-import matlab.engine
-from matplotlib import image
-from matplotlib import pyplot as plt
 import os
 import util
-import pickle
 import parameters
 import argparse
+import backends
+from symmetrytable import SymmetryTable
+import pipeline
+import instrument
 
 # Fetching parameters from parameters.py
 # See parameters.py for detailed explaination of the parameters.
@@ -29,91 +38,271 @@ rc = parameters.rc
 lineSimilarity = parameters.lineSimilarity
 rotationSimilarity = parameters.rotationSimilarity
 circleSymThreshold = parameters.circleSymThreshold
+queueSize = parameters.queueSize
+renderThreads = parameters.renderThreads
+detectionCacheSize = parameters.detectionCacheSize
+
+# recursiveSym stops cutting when a cut image is smaller than a minSizeFraction-th of the height or width of the image
+minSizeFraction = 5
+
+# Symmetry detection backend, started by startBackend or by the worker processes of scheduler
+backend = None
+# Machine learning model, loaded by getModel
+modelFileName = "models/RF-trainValTest.pkl"
+model = None
+# Worker pool and detection cache, set from the command line arguments
+symmetryPool = None
+detectionCache = None
 
 # Fetch reflection symmetry lines with Elewady's WaveletSym detection algorithm
-# Return output is structured as follows:
-# [[[x1, y1, x2, y2], slope, score, Normalized score, depth], ...]
-# Depth is appended in the recursiveSym function
-def getSymmetries(inputFile, data):
-    symmetries = []
-    symmetryList = eng.pySym(inputFile) #pySym = matlab file
-    height, _, _ = data.shape
-    for sym in symmetryList:
-        line = [sym[0], sym[1], sym[2], sym[3]]
-        slope = util.getSlope(line, height)
-        score = sym[4]
-        if len(sym) < 6:
-            normScore = 1.0
-        else:
-            normScore = sym[5]
-        newSym = [line, slope, score, normScore]
-        symmetries.append(newSym)
-    return symmetries
+# Lines are moved by locMove, the location of the (cut) image data inside the original image
+# When fullData is given, the backend reuses the features of the whole image instead of processing data on its own
+# Returns a SymmetryTable, depth and node are set in the recursiveSym function and util.placeInOrder
+@instrument.traced
+def getSymmetries(data, locMove={"h":0,"w":0}, fullData=None):
+    height, width, _ = data.shape
+    if fullData is None:
+        symmetryList = backend.detect(data)
+        syms = SymmetryTable.fromDetections(symmetryList, height, locMove)
+    else:
+        # Region results are already in the coordinates of the original image
+        symmetryList = backend.detectRegion(fullData, (locMove.get("h"), locMove.get("w"), height, width))
+        syms = SymmetryTable.fromDetections(symmetryList, height)
+    instrument.record(height=height, width=width, lines=len(syms))
+    return syms
 
-# Recursively cut up images and fetch symmetries until 
-# the processed image is smaller than minSize parameter
-def recursiveSym(img, symmetries, depth, minSize, rc, locMove={"h":0,"w":0}):
+# Fetch the symmetries of one (cut) image and decide where to cut it next
+# Depth is set for every symmetry line
+# Returns the symmetries and a list of cuts [[rows, cols], newLocMove], where img[rows, cols] is the next cut image
+@instrument.traced
+def symmetryNode(img, depth, rc, locMove={"h":0,"w":0}, fullImg=None):
     h, w, _ = img.shape
-    if h < minSize.get("h") or w < minSize.get("w"):
-        return
-    depth = depth + 1
-    mat_a = matlab.uint8(img.tolist())
-    syms = getSymmetries(mat_a, img)
-    del mat_a
+    instrument.record(depth=depth, top=locMove.get("h"), left=locMove.get("w"), height=h, width=w)
+    syms = getSymmetries(img, locMove, fullImg)
+    instrument.record(lines=len(syms), cuts=0)
     if len(syms) < 1:
-        return
+        return syms, []
 
     symThreshold = symThresholdBC
-    if args.mode == "fast":
-        symThreshold = symThresholdBC
 
-    # Copy the top three symmetry lines (if they exist)
+    # Copy the top three symmetry lines (if they exist), in the coordinates of the cut image
     # Any lines below threshold can be skipped, to reduce computation time
     mainSyms = []
     if rc > len(syms):
         rc = len(syms)
     for i in range(0, rc):
-        if syms[i][2] > symThreshold:
-            mainSyms.append(syms[i][0].copy())
-
-    # Adjust location for symmetry lines in the cut images
-    for sym in syms:
-        sym[0][0] = sym[0][0] + locMove.get("w")
-        sym[0][2] = sym[0][2] + locMove.get("w")
-        sym[0][1] = sym[0][1] + locMove.get("h")
-        sym[0][3] = sym[0][3] + locMove.get("h")
-    
-    # Appending depth for later processing
-    for sym in syms:
-        sym.append(depth)
+        if syms.score[i] > symThreshold:
+            line = syms.line[i]
+            mainSyms.append([line[0] - locMove.get("w"), line[1] - locMove.get("h"), line[2] - locMove.get("w"), line[3] - locMove.get("h")])
 
-    symmetries.append([syms, depth])
-
-    del syms
+    # Setting depth for later processing
+    syms.depth[:] = depth
 
     # For each top three symmetry line:
-    # Cut the image in left / right or top / bottom half (diagonal lines are not considered) and process each image
+    # Cut the image in left / right or top / bottom half (diagonal lines are not considered)
     # newLocMove saves the symmetry line location adjustments for the next image
+    cuts = []
     for mainSym in mainSyms:
         if abs(mainSym[0] - mainSym[2]) < h/10:
-            img01 = img[min(int(mainSym[1]), int(mainSym[3])):max(int(mainSym[1]), int(mainSym[3])), 0:int(mainSym[0])]
-            img02 = img[min(int(mainSym[1]), int(mainSym[3])):max(int(mainSym[1]), int(mainSym[3])), int(mainSym[0]):w]
+            rows = slice(min(int(mainSym[1]), int(mainSym[3])), max(int(mainSym[1]), int(mainSym[3])))
 
             newLocMove = {"h": locMove.get("h") + min(int(mainSym[1]), int(mainSym[3])), "w": locMove.get("w")}
-            recursiveSym(img01, symmetries, depth, minSize, rc, newLocMove)
+            cuts.append([[rows, slice(0, int(mainSym[0]))], newLocMove])
 
             newLocMove = {"h": locMove.get("h") + min(int(mainSym[1]), int(mainSym[3])), "w": locMove.get("w") + int(mainSym[0])}
-            recursiveSym(img02, symmetries, depth, minSize, rc, newLocMove)
+            cuts.append([[rows, slice(int(mainSym[0]), w)], newLocMove])
         elif abs(mainSym[1] - mainSym[3]) < w/10:
-            img01 = img[0:int(mainSym[1]), min(int(mainSym[0]), int(mainSym[2])):max(int(mainSym[0]), int(mainSym[2]))]
-            img02 = img[int(mainSym[1]):h, min(int(mainSym[0]), int(mainSym[2])):max(int(mainSym[0]), int(mainSym[2]))]
+            cols = slice(min(int(mainSym[0]), int(mainSym[2])), max(int(mainSym[0]), int(mainSym[2])))
 
             newLocMove = {"h": locMove.get("h"), "w": locMove.get("w") + min(int(mainSym[0]), int(mainSym[2]))}
-            recursiveSym(img01, symmetries, depth, minSize, rc, newLocMove)
-            
+            cuts.append([[slice(0, int(mainSym[1])), cols], newLocMove])
+
             newLocMove = {"h": locMove.get("h") + int(mainSym[1]), "w": locMove.get("w") + min(int(mainSym[0]), int(mainSym[2]))}
-            recursiveSym(img02, symmetries, depth, minSize, rc, newLocMove)
+            cuts.append([[slice(int(mainSym[1]), h), cols], newLocMove])
+    instrument.record(cuts=len(cuts))
+    return syms, cuts
 
+# Recursively cut up images and fetch symmetries until 
+# the processed image is smaller than minSize parameter
+# With fullImg (the original image) the features of the original image are reused for every cut image
+def recursiveSym(img, symmetries, depth, minSize, rc, locMove={"h":0,"w":0}, fullImg=None):
+    h, w, _ = img.shape
+    if h < minSize.get("h") or w < minSize.get("w"):
+        return
+    depth = depth + 1
+    syms, cuts = symmetryNode(img, depth, rc, locMove, fullImg)
+    if len(syms) < 1:
+        return
+
+    symmetries.append([syms, depth])
+
+    del syms
+
+    # Process each cut image
+    for [rows, cols], newLocMove in cuts:
+        recursiveSym(img[rows, cols], symmetries, depth, minSize, rc, newLocMove, fullImg)
+
+
+# Pipeline stages, each image is a dict passed from stage to stage
+# Load and resize an image
+# matplotlib is only imported when an image is loaded, so importing main (as server.py does) does not wait for it
+@instrument.traced
+def loadImage(name):
+    from matplotlib import image
+    instrument.record(image=name)
+    if args.tiled is not None:
+        # Decoded and resized once into a raw copy, later stages read the pixels they need from disk
+        import tiles
+        data = tiles.openRaw(inDir + name, args.tiled, resize)
+        return {"name": name, "data": data, "imgOut": outDir + name}
+    data = image.imread(inDir + name)
+
+    # Rezise image for decreased computation time and improved performance
+    # Commenting this out will likely require different threshold parameters
+    data = util.resize_image(data, resize)
+    return {"name": name, "data": data, "imgOut": outDir + name}
+
+# Start the symmetry detection backend on first use, so runs served from the detection cache never start it
+def startBackend():
+    global backend
+    if backend is None:
+        backend = backends.getBackend(args.backend)
+        if args.tiled is not None:
+            backend.tileSize = parameters.tileSize
+    return backend
+
+# Load the machine learning model on first use, so fast mode never loads it
+# The model is loaded as exported forest (forest.py), which loads without sklearn and is exported on first use
+def getModel():
+    global model
+    if model is None:
+        import forest
+        print(modelFileName)
+        model = forest.loadModel(modelFileName)
+    return model
+
+# Every parameter that changes the output of recursiveSym for an image, used as key of the detection cache
+def detectorParams(data):
+    import triangulation
+    import voting
+    import wavelet
+    return {
+        "backend": args.backend,
+        "reuseFeatures": args.reuse_features,
+        "tileSize": parameters.tileSize if args.tiled is not None else None,
+        "resize": resize,
+        "pyramidLevels": parameters.pyramidLevels,
+        "triangulationTolerance": parameters.triangulationTolerance,
+        "triangulationSample": parameters.triangulationSample,
+        "precision": parameters.precision,
+        "rc": rc,
+        "symThresholdBC": symThresholdBC,
+        "minSize": minSizeFraction,
+        "wavParam": wavelet.getWavParam(data),
+        "voteParam": voting.getVoteParam(data.shape),
+        "maxParam": voting.getMaxParam()
+    }
+
+# Recursively fetch the symmetries of an image, either in-process or on the worker pool
+# With a detection cache, cached images are not searched again
+# The trace event of an image holds the number of recursive loops (nodes), the loops themselves are symmetryNode events
+@instrument.traced
+def detectImage(img):
+    data = img["data"]
+    h, w, _ = data.shape
+    instrument.record(image=img["name"], height=h, width=w, cached=False)
+    minSize = {"h" : h / minSizeFraction, "w": w / minSizeFraction}
+    if detectionCache is not None:
+        key = detectionCache.key(data, detectorParams(data))
+        symmetries = detectionCache.get(key)
+        if symmetries is not None:
+            instrument.record(cached=True, nodes=len(symmetries))
+            img["symmetries"] = symmetries
+            return img
+    if symmetryPool is not None:
+        symmetries = symmetryPool.recursiveSym(data, minSize)
+    else:
+        startBackend()
+        symmetries = []
+        fullImg = None
+        if args.reuse_features:
+            fullImg = data
+        recursiveSym(data, symmetries, -1, minSize, rc, fullImg=fullImg)
+    if detectionCache is not None:
+        detectionCache.put(key, symmetries)
+    instrument.record(nodes=len(symmetries))
+    img["symmetries"] = symmetries
+    return img
+
+# Post-processing parameters from parameters.py, see postProcess
+postParams = {
+    "symThresholdBC": symThresholdBC,
+    "normThresholdBC": normThresholdBC,
+    "symThresholdAC": symThresholdAC,
+    "normThresholdAC": normThresholdAC,
+    "lineSimilarity": lineSimilarity,
+    "rotationSimilarity": rotationSimilarity,
+    "circleSymThreshold": circleSymThreshold
+}
+
+# Filter the symmetries of an image and find rotational symmetries
+# symmetries is the output of recursiveSym, params holds the post-processing parameters (see postParams)
+# Only the shape of data is used
+# Returns the remaining reflection symmetries and the rotational symmetries
+def postProcess(symmetries, data, mode, model, params):
+    symmetries = util.placeInOrder(symmetries)
+    rotations = []
+    if len(symmetries) != 0:
+        # Slow mode uses the machine learning model, will increase performance for detecting rotational symmetries
+        if mode == "slow":
+            symmetries = util.removeBadSymmetries(symmetries, params["symThresholdBC"], params["normThresholdBC"])
+            rotations = util.rotationalSymmetriesML(symmetries, model, data)
+            symmetries = util.removeBadSymmetries(symmetries, params["symThresholdAC"], params["normThresholdAC"])
+        else:
+            symmetries = util.removeBadSymmetries(symmetries, params["symThresholdAC"], params["normThresholdAC"])
+            rotations = util.rotationalSymmetries(symmetries, data, params["circleSymThreshold"])
+
+        symmetries = util.removeSimilarLines(symmetries, data, params["lineSimilarity"])
+        util.removeSimilarRotational(rotations, data, params["rotationSimilarity"])
+    return symmetries, rotations
+
+# Filter the symmetries of an image and find rotational symmetries
+@instrument.traced
+def processImage(img):
+    instrument.record(image=img["name"])
+    model = getModel() if args.mode == "slow" else None
+    img["symmetries"], img["rotations"] = postProcess(img["symmetries"], img["data"], args.mode, model, postParams)
+    return img
+
+# Draw the symmetries onto the image and save it, without opening a figure
+# Can run in multiple threads
+@instrument.traced
+def saveImageHeadless(img):
+    instrument.record(image=img["name"])
+    util.saveImage(img["imgOut"][0:-4] + '.png', img["data"], img["symmetries"], img["rotations"])
+    return img
+
+# Save the reflection and rotational symmetries of an image in a machine readable format
+# jsonl results are added to one results.jsonl file, npz results are saved next to each output image
+def saveResults(img, resultsFile):
+    if args.results == "jsonl":
+        resultsFile.write(util.resultsJson(img["name"], img["data"], img["symmetries"], img["rotations"]) + "\n")
+    elif args.results == "npz":
+        util.saveResultsNpz(img["imgOut"][0:-4] + '.npz', img["symmetries"], img["rotations"])
+
+# Plot the symmetries on the image and save it
+# Uses pyplot, so it has to run on the main thread
+# pyplot is only imported when rendering, headless runs never import it
+def renderImage(img):
+    from matplotlib import pyplot as plt
+    if len(img["symmetries"]) != 0:
+        util.plotLines(img["symmetries"])
+        util.plotRotations(img["rotations"])
+    plt.imshow(img["data"])
+    plt.savefig(img["imgOut"][0:-4] + '.png')
+    plt.show(block=False)
+    plt.pause(1)
+    plt.close()
 
 if __name__ == "__main__":
 
@@ -121,67 +310,72 @@ if __name__ == "__main__":
     parser.add_argument("--mode", default="slow", choices=["slow", "fast"], help="slow / fast (Machine learning turned on or off) (default: slow)")
     parser.add_argument("--input", default="./input/", help="Custom input folder (default: ./input/)")
     parser.add_argument("--output", default="./output/", help="Custom output folder (default: ./output/)")
+    parser.add_argument("--backend", default="matlab", choices=list(backends.backends), help="matlab / numpy / mock (reflection symmetry detection backend) (default: matlab)")
+    parser.add_argument("--reuse-features", action="store_true", help="Compute wavelet features once per image and reuse them for the cut images (numpy backend only)")
+    parser.add_argument("--headless", action="store_true", help="Draw symmetries straight onto the images and save them without opening figures")
+    parser.add_argument("--results", default=None, choices=["jsonl", "npz"], help="Also save the symmetries as jsonl / npz (default: off)")
+    parser.add_argument("--cache-dir", default=None, help="Folder to cache symmetry detections in, cached images are only post-processed (default: off)")
+    parser.add_argument("--workers", default=1, type=int, help="Number of worker processes fetching symmetries in parallel (default: 1)")
+    parser.add_argument("--tiled", default=None, help="Folder to keep memory-mapped raw copies of the images in, large images are transformed in tiles (numpy backend only) (default: off)")
+    parser.add_argument("--trace", default=None, help="File to write trace events of every stage, image and recursive loop to (default: off)")
+    parser.add_argument("--trace-format", default="jsonl", choices=["jsonl", "chrome"], help="jsonl / chrome (format of --trace) (default: jsonl)")
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.reuse_features and args.backend != "numpy":
+        parser.error("--reuse-features requires --backend numpy")
+    if args.tiled is not None and (args.backend != "numpy" or args.workers > 1):
+        parser.error("--tiled requires --backend numpy and a single worker")
 
     inDir = args.input
     outDir = args.output
 
-    modelFileName = "models/RF-trainValTest.pkl"
-    with open(modelFileName, 'rb') as file:
-        model = pickle.load(file)
     if not os.path.isdir(outDir):
         os.mkdir(outDir)
 
-    # Start matlab and fetch images
-    eng = matlab.engine.start_matlab()
-    imgList = util.listImages(inDir, '.jpg')
-    images = []
+    # Open the detection cache
+    detectionCache = None
+    if args.cache_dir is not None:
+        import detectioncache
+        detectionCache = detectioncache.DetectionCache(args.cache_dir, detectionCacheSize * 2**20)
 
-    print(modelFileName)
+    # Tracing is started before the worker pool, so the workers write their trace events as well
+    if args.trace is not None:
+        instrument.start(args.trace, args.trace_format)
 
-    print("Fetching symmetries ...")
+    # Start the symmetry detection backend and fetch images
+    # Without workers the backend is started when the first image is searched
+    # With multiple workers every worker process starts its own backend
+    symmetryPool = None
+    if args.workers > 1:
+        import scheduler
+        symmetryPool = scheduler.SymmetryPool(args.workers, args.backend, rc, args.reuse_features)
+    imgList = util.listImages(inDir, '.jpg')
 
-    for i, img in enumerate(imgList, start=1):
-        print(img + " [" + str(i) + "/" + str(len(imgList)) + "]")
-        imgOut = outDir + img
-        img = inDir + img
-        data = image.imread(img)
+    # Images are loaded, searched for symmetries, processed and saved by stages working at the same time
+    # Only a few images are in memory at once and output is saved as soon as an image is done
+    # With multiple workers, as many images are searched at the same time to keep all workers busy
+    print("Fetching and processing symmetries ...")
+    stages = [[loadImage, 1], [detectImage, args.workers], [processImage, 1]]
+    if args.headless:
+        stages.append([saveImageHeadless, renderThreads])
+    resultsFile = None
+    if args.results == "jsonl":
+        resultsFile = open(outDir + "results.jsonl", "w")
+    try:
+        for i, img in enumerate(pipeline.runPipeline(imgList, stages, queueSize), start=1):
+            print(img["name"] + " [" + str(i) + "/" + str(len(imgList)) + "]")
+            if not args.headless:
+                renderImage(img)
+            saveResults(img, resultsFile)
+    finally:
+        if symmetryPool is not None:
+            symmetryPool.close()
+        if resultsFile is not None:
+            resultsFile.close()
+        instrument.stop()
 
-        # Rezise image for decreased computation time and improved performance
-        # Commenting this out will likely require different threshold parameters
-        data = util.resize_image(data, resize)
-        h, w, _ = data.shape
-        minSize = {"h" : h / 5, "w": w / 5}
-        symmetries = []
-        recursiveSym(data, symmetries, -1, minSize, rc)
-        images.append([symmetries, data, imgOut])
-
-    # Process images
-    print("Processing symmetries ...")
-    for i, img in enumerate(images, start=1):
-        print("[" + str(i) + "/" + str(len(imgList)) + "]")
-        symmetries = img[0].copy()
-        data = img[1]
-        imgOut = img[2]
-        
-        symmetries = util.placeInOrder(symmetries)
-        if len(symmetries) != 0:
-            # Slow mode uses the machine learning model, will increase performance for detecting rotational symmetries
-            if args.mode == "slow":
-                symmetries = util.removeBadSymmetries(symmetries, symThresholdBC, normThresholdBC)
-                rotations = util.rotationalSymmetriesML(symmetries, model, data)
-                symmetries = util.removeBadSymmetries(symmetries, symThresholdAC, normThresholdAC)
-            else:
-                symmetries = util.removeBadSymmetries(symmetries, symThresholdAC, normThresholdAC)
-                rotations = util.rotationalSymmetries(symmetries, data, circleSymThreshold)
-
-            util.removeSimilarLines(symmetries, data, lineSimilarity)
-            util.removeSimilarRotational(rotations, data, rotationSimilarity)
-            util.plotLines(symmetries)
-            util.plotRotations(rotations)
-        plt.imshow(data)    
-        plt.savefig(imgOut[0:-4] + '.png')
-        plt.show(block=False)
-        plt.pause(1)
-        plt.close()
-        # print(symmetries)
\ No newline at end of file
+    if backend is not None and hasattr(backend, "stats"):
+        print("Filter bank cache:", backend.stats())
+    if detectionCache is not None:
+        print("Detection cache:", detectionCache.stats())
@@ -5,6 +5,35 @@
 # Default: 4
 resize = 4
 
+# Number of levels of the image pyramid the 'numpy' backend searches reflection symmetries on, every level half the size of the next
+# Axes are found on the smallest level and moved to their location in the full size image on the larger levels,
+# with scores as on the smallest level. With resize = 1 and 3 levels the results have the accuracy of the full size image,
+# at about the computation time and with the thresholds of resize = 4
+# 1 searches the image itself. Has no function with the 'matlab' backend or --reuse-features
+# Default: 1
+pyramidLevels = 1
+
+# Minimum estimated vote of a pair of features for the 'numpy' backend to compute its symmetry measures and vote with it
+# Higher values skip more pairs in triangulation and voting, at the cost of weaker or missed symmetry axes
+# Run triangulationreport.py to compare values on your images
+# 0 evaluates every pair. Has no function with the 'matlab' backend
+# Default: 0
+triangulationTolerance = 0
+
+# Fraction of the pairs skipped by triangulationTolerance that are evaluated anyway, chosen at random
+# Their votes count 1 / triangulationSample times, so the skipped pairs are still counted on average
+# 0 evaluates no skipped pairs. Has no function with the 'matlab' backend
+# Default: 0
+triangulationSample = 0
+
+# Floating point type of the Log-Gabor responses, filter banks, feature histograms, pair measures and voting space
+# of the 'numpy' backend, 'float32' or 'float64'
+# 'float32' halves their memory and speeds up the wavelet transform, votes are still summed in float64.
+# Axes and scores differ slightly from 'float64', run precisionreport.py to compare them on your images
+# Has no function with the 'matlab' backend
+# Default: 'float64'
+precision = "float64"
+
 # Minimum threshold for symmetry scores of main reflection symmetry lines
 # Lines with scores below this value will be removed, along with all lines discovered in the same recursive loop.
 # This threshold only dictates which lines will be fed to the rotational symmetry machine learning model
@@ -52,3 +81,35 @@ lineSimilarity = 8
 # default = 5
 rotationSimilarity = 3 
 
+# Maximum memory in megabytes used to cache Log-Gabor filter banks in the 'numpy' backend
+# A bank holds 44 planes (nScls + nAngs) of 8-byte values, the default keeps 80 banks of a 768 x 768 image after resize
+# Has no function with the 'matlab' backend
+# Default: 990MB at resize = 4, at most 4096
+filterCacheSize = min(4096, int(80 * 44 * (768 // resize)**2 * 8 / 2**20))
+
+# Height and width in pixels of the tiles the 'numpy' backend reads when run with --tiled
+# Memory of the wavelet transform depends on the tile size instead of the image size, the filter bank of a tile
+# takes about 44 * tileSize^2 * 8 bytes (half that with 'float32' precision) and has to fit in filterCacheSize to be computed only once.
+# Neighbouring tiles overlap by about 270 pixels plus a twenty-fifth of the image size, so smaller tiles transform more pixels in total
+# Images that fit in one tile are transformed as a whole. Has no function with the 'matlab' backend
+# Default: 1024
+tileSize = 1024
+
+# Maximum number of images waiting between two stages of the image pipeline (loading, symmetry detection, processing, saving)
+# Higher values let stages run further ahead of each other at the cost of more images in memory
+# Default: 2
+queueSize = 2
+
+# Number of threads drawing and saving output images in --headless mode
+# Default: 4
+renderThreads = 4
+
+# Maximum size in megabytes of the detection cache (--cache-dir)
+# The least recently used images are removed from the cache first
+# Default: 1024
+detectionCacheSize = 1024
+
+# Maximum number of requests waiting for a free worker in the detection server (server.py)
+# Requests beyond the running and waiting ones are refused with 503 (Service Unavailable), so clients back off
+# Default: 8
+serverQueueSize = 8
@@ -0,0 +1,91 @@
+# Staged pipeline with bounded queues
+# Every stage runs in its own thread(s) and passes its items on to the next stage through a queue
+# of at most queueSize items. Stages work at the same time and the number of items in memory
+# does not depend on the number of input items
+import queue
+import threading
+
+# End of stream marker
+stop = object()
+
+# Run items through stages, a list of [function, threads]
+# function takes an item of the previous stage and returns the item for the next stage,
+# a stage with more than one thread may finish items out of order
+# Yields the items of the last stage as soon as they are finished
+# An error in any stage stops the pipeline and is raised here
+def runPipeline(items, stages, queueSize):
+    queues = [queue.Queue(queueSize) for _ in range(len(stages) + 1)]
+    errors = []
+    abort = threading.Event()
+
+    # Blocking put / get that give up when the pipeline is aborted
+    def put(q, item):
+        while not abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return stop
+
+    def fail(error):
+        errors.append(error)
+        abort.set()
+
+    def feed():
+        try:
+            for item in items:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            fail(e)
+            return
+        put(queues[0], stop)
+
+    # Threads of a stage hand the stop marker to each other, the last one passes it on to the next stage
+    def work(i, function, running):
+        while True:
+            item = get(queues[i])
+            if item is stop:
+                break
+            try:
+                item = function(item)
+            except Exception as e:
+                fail(e)
+                return
+            if not put(queues[i + 1], item):
+                return
+        put(queues[i], stop)
+        with running["lock"]:
+            running["threads"] -= 1
+            last = running["threads"] == 0
+        if last:
+            put(queues[i + 1], stop)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for i, (function, n) in enumerate(stages):
+        running = {"threads": n, "lock": threading.Lock()}
+        threads += [threading.Thread(target=work, args=(i, function, running), daemon=True) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is stop:
+                break
+            yield item
+    finally:
+        abort.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
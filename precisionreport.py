@@ -0,0 +1,124 @@
+# Report on the float32 precision of the numpy backend (precision in parameters.py)
+# Every image is searched once in float64 and once in float32, the axes found in float32 are compared to the float64 axes
+# Usage:
+# python precisionreport.py
+# arguements:
+# --input "custom input folder" (default: ./input/)
+# --resize "resize fraction of the images" (default: resize in parameters.py)
+# --match-pixels "largest distance in pixels between the endpoints of two axes that are the same" (default: 2)
+# --top "number of strongest float64 axes topMatched is computed for" (default: 10)
+# --output "csv file to save the results table in" (default: ./precision.csv)
+# Columns, one row per image: features and axes (float64 / float32), matched and topMatched (fraction of the float64
+# axes found again), endpointError (pixels between the endpoints of matched axes), scoreError (relative difference of
+# the scores of matched axes), normScoreError (difference of their normalized scores), with the mean and the largest
+# difference, and the speedup of the wavelet features and of the voting (triangulation, voting and axes)
+
+from matplotlib import image
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import parameters
+import util
+import wavesym
+
+# Axes of an image in the given precision, with the number of features and the time taken by features and voting
+def detectAxes(data, precision):
+    wavesym.setPrecision(precision)
+    start = time.perf_counter()
+    wavData = wavesym.detectFeatures(data)
+    middle = time.perf_counter()
+    symRes, _ = wavesym.voteSymmetries(wavData, data.shape)
+    end = time.perf_counter()
+    return {"symRes": symRes, "features": len(wavData["x"]), "featureSeconds": middle - start, "voteSeconds": end - middle}
+
+# Fastest of repeat searches, the first search of an image size also computes its filter bank
+def fastestAxes(data, precision, repeat):
+    runs = [detectAxes(data, precision) for _ in range(repeat)]
+    return {
+        "symRes": runs[-1]["symRes"],
+        "features": runs[-1]["features"],
+        "featureSeconds": min(run["featureSeconds"] for run in runs),
+        "voteSeconds": min(run["voteSeconds"] for run in runs)
+    }
+
+# Distance in pixels between two axes x1, y1, x2, y2: the largest distance between their endpoints, in either direction
+def axisDistance(axes, axis):
+    forward = np.maximum(np.hypot(*(axes[:, 0:2] - axis[0:2]).T), np.hypot(*(axes[:, 2:4] - axis[2:4]).T))
+    backward = np.maximum(np.hypot(*(axes[:, 0:2] - axis[2:4]).T), np.hypot(*(axes[:, 2:4] - axis[0:2]).T))
+    return np.minimum(forward, backward)
+
+# Greedy one to one matching of the float32 axes to the float64 axes, strongest float64 axis first
+# Returns the (float64, float32) index pairs of matched axes, and their distances in pixels
+def matchAxes(exact, approx, matchPixels):
+    matched = []
+    distances = []
+    used = np.zeros(len(approx), dtype=bool)
+    for i in range(len(exact)):
+        if len(approx) == 0:
+            break
+        dist = axisDistance(approx[:, 0:4], exact[i, 0:4])
+        dist[used] = np.inf
+        j = np.argmin(dist)
+        if dist[j] <= matchPixels:
+            used[j] = True
+            matched.append((i, j))
+            distances.append(dist[j])
+    return matched, distances
+
+# Normalized scores of symRes, the single axis of a symRes without the column has a normalized score of 1
+def normScores(symRes):
+    if symRes.shape[1] > 5:
+        return symRes[:, 5]
+    return np.ones(len(symRes))
+
+# Compare the float32 axes of an image to the float64 axes
+def compareAxes(exact, approx, matchPixels, top):
+    matched, distances = matchAxes(exact["symRes"], approx["symRes"], matchPixels)
+    i = np.array([i for i, _ in matched], dtype=int)
+    j = np.array([j for _, j in matched], dtype=int)
+    scoreErrors = np.abs(approx["symRes"][j, 4] - exact["symRes"][i, 4]) / exact["symRes"][i, 4]
+    normErrors = np.abs(normScores(approx["symRes"])[j] - normScores(exact["symRes"])[i])
+    axes = len(exact["symRes"])
+    return {
+        "features": exact["features"],
+        "featuresFloat32": approx["features"],
+        "axes": axes,
+        "axesFloat32": len(approx["symRes"]),
+        "matched": len(matched) / axes if axes else 1.0,
+        "topMatched": np.sum(i < top) / min(top, axes) if axes else 1.0,
+        "endpointError": np.mean(distances) if matched else np.nan,
+        "maxEndpointError": np.max(distances) if matched else np.nan,
+        "scoreError": np.mean(scoreErrors) if matched else np.nan,
+        "maxScoreError": np.max(scoreErrors) if matched else np.nan,
+        "normScoreError": np.mean(normErrors) if matched else np.nan,
+        "maxNormScoreError": np.max(normErrors) if matched else np.nan,
+        "featureSpeedup": exact["featureSeconds"] / approx["featureSeconds"],
+        "voteSpeedup": exact["voteSeconds"] / approx["voteSeconds"]
+    }
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input/", help="Custom input folder (default: ./input/)")
+    parser.add_argument("--resize", default=parameters.resize, type=float, help="Resize fraction of the images (default: resize in parameters.py)")
+    parser.add_argument("--match-pixels", default=2, type=float, help="Largest endpoint distance in pixels of two axes that are the same (default: 2)")
+    parser.add_argument("--top", default=10, type=int, help="Number of strongest float64 axes for topMatched (default: 10)")
+    parser.add_argument("--output", default="./precision.csv", help="Csv file to save the results in (default: ./precision.csv)")
+    args = parser.parse_args()
+    repeat = 2
+
+    rows = []
+    for name in util.listImages(args.input, '.jpg'):
+        data = util.resize_image(image.imread(args.input + name), args.resize)
+        exact = fastestAxes(data, "float64", repeat)
+        approx = fastestAxes(data, "float32", repeat)
+        rows.append(dict(image=name, **compareAxes(exact, approx, args.match_pixels, args.top)))
+        print(name, exact["features"], "features,", len(exact["symRes"]), "axes")
+
+    results = pd.DataFrame(rows)
+    results.to_csv(args.output, index=False)
+    print(results.to_string())
+    print(results.mean(numeric_only=True).to_string())
@@ -1,86 +1,39 @@
 import util
 import numpy as np
+from symmetrytable import getSlopes
 
-def preproccesData(data):
-    def isIntersecting(data):
-        if util.line_intersect(data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2'],data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2']) == None:
-            return False
-        return True
-
-    def distToIntersect1(data):
-        intersect = util.line_intersect(data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2'],data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2'])
-        if intersect == None:
-            return -1
-        else:
-            Len = data['line1Len']
-            subLen = np.sqrt( (data['line1x1'] - intersect[0])**2 + (data['line1y1'] - intersect[1])**2 )
-            surface = data['width'] * data['height']
-            return (abs(Len - (subLen * 2)) / surface)
-    def distToIntersect2(data):
-        intersect = util.line_intersect(data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2'],data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2'])
-        if intersect == None:
-            return -1
-        else:
-            Len = data['line1Len']
-            subLen = np.sqrt( (data['line1x2'] - intersect[0])**2 + (data['line1y2'] - intersect[1])**2 )
-            surface = data['width'] * data['height']
-            return (abs(Len - (subLen * 2)) / surface)
-    def distToIntersect3(data):
-        intersect = util.line_intersect(data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2'],data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2'])
-        if intersect == None:
-            return -1
-        else:
-            Len = data['line1Len']
-            subLen = np.sqrt( (data['line2x1'] - intersect[0])**2 + (data['line2y1'] - intersect[1])**2 )
-            surface = data['width'] * data['height']
-            return (abs(Len - (subLen * 2)) / surface)
-    def distToIntersect4(data):
-        intersect = util.line_intersect(data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2'],data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2'])
-        if intersect == None:
-            return -1
-        else:
-            Len = data['line1Len']
-            subLen = np.sqrt( (data['line2x2'] - intersect[0])**2 + (data['line2y2'] - intersect[1])**2 )
-            surface = data['width'] * data['height']
-            return (abs(Len - (subLen * 2)) / surface)
-
-    def calcPerpendicular(data):
-        if data['line1Slope'] != 0:
-            return (-1 * (1 / data['line1Slope']))
-        elif data['line2Slope'] != 0:
-            return (-1 * (1 / data['line2Slope']))
-        else:
-            return -1
-
-    def calcPerpDiff(data):
-        if data['line1Slope'] != 0:
-            return (abs(data['linePerp'] - data['line2Slope']))
-        elif data['line2Slope'] != 0:
-            return (abs(data['linePerp'] - data['line1Slope']))
-        else:
-            return -1
+# Features of pairs of reflection symmetry lines
+# Used to train the model (ML.ipynb) and to predict rotational symmetries (util.rotationalSymmetriesML)
+# Every feature is computed on whole columns at once
 
-    def calcSlope1(data):
-        return util.getSlope([data['line1x1'],data['line1y1'],data['line1x2'],data['line1y2']], data['height'])
-
-    def calcSlope2(data):
-        return util.getSlope([data['line2x1'],data['line2y1'],data['line2x2'],data['line2y2']], data['height'])
-
-    def meanToIntersect(data):
-        return ((data['distToIntersect1'] + data['distToIntersect2'] + data['distToIntersect3'] + data['distToIntersect4']) / 4)
+# Columns returned by preproccesData, in the order the model expects them
+featureColumns = ['ScoreDiff', 'line1Slope', 'line2Slope', 'SlopeDiff', 'linePerp', 'perpDiff', 'LenDiff', 'intersect',
+                  'distToIntersectMean1', 'distToIntersectMean2', 'distToIntersectMean3', 'distToIntersectMean4']
 
+# data holds a pair of lines on every row, with the columns
+# line1x1, line1y1, line1x2, line1y2, line1Score, line2x1, line2y1, line2x2, line2y2, line2Score, height, width
+# Returns data with these columns replaced by featureColumns, other columns (like hasRotation) are kept
+def preproccesData(data):
+    line1 = data[['line1x1', 'line1y1', 'line1x2', 'line1y2']].to_numpy(dtype=float)
+    line2 = data[['line2x1', 'line2y1', 'line2x2', 'line2y2']].to_numpy(dtype=float)
+    height = data['height'].to_numpy(dtype=float)
+    width = data['width'].to_numpy(dtype=float)
 
     #Score difference
     data = data.assign(ScoreDiff=abs(data['line1Score'] - data['line2Score']))
 
     #Slopes
-    data['line1Slope'] = data.apply(lambda row: calcSlope1(row), axis=1)
-    data['line2Slope'] = data.apply(lambda row: calcSlope2(row), axis=1)
+    slope1 = getSlopes(line1, height)
+    slope2 = getSlopes(line2, height)
+    data = data.assign(line1Slope=slope1, line2Slope=slope2)
     data = data.assign(SlopeDiff=abs(data['line1Slope'] - data['line2Slope']))
 
     #Perpendicular slopes
-    data['linePerp'] = data.apply(lambda row: calcPerpendicular(row), axis=1)
-    data['perpDiff'] = data.apply(lambda row: calcPerpDiff(row), axis=1)
+    # Taken from the first line unless its slope is 0, -1 if both slopes are 0
+    with np.errstate(divide="ignore"):
+        perp = np.where(slope1 != 0, -1 * (1 / slope1), np.where(slope2 != 0, -1 * (1 / slope2), -1))
+    perpDiff = np.where(slope1 != 0, abs(perp - slope2), np.where(slope2 != 0, abs(perp - slope1), -1))
+    data = data.assign(linePerp=perp, perpDiff=perpDiff)
 
     #Lengths
     data = data.assign(line1Len=np.sqrt( (data['line1x1'] - data['line1x2'])**2 + (data['line1y1'] - data['line1y2'])**2 ))
@@ -88,15 +41,20 @@ def preproccesData(data):
     data = data.assign(LenDiff=abs(data['line1Len'] - data['line2Len']))
 
     #Intersect
-    data['intersect'] = data.apply(lambda row: isIntersecting(row), axis=1)
-    data['distToIntersect1'] = data.apply(lambda row: distToIntersect1(row), axis=1)
-    data['distToIntersect2'] = data.apply(lambda row: distToIntersect2(row), axis=1)
-    data['distToIntersect3'] = data.apply(lambda row: distToIntersect3(row), axis=1)
-    data['distToIntersect4'] = data.apply(lambda row: distToIntersect4(row), axis=1)
+    # Distances from the intersection to the four endpoints, compared to the length of the first line
+    # -1 when the lines do not intersect
+    intersect, x, y = util.intersectSegments(line1, line2)
+    length = data['line1Len'].to_numpy()
+    surface = width * height
+    dists = []
+    for px, py in [line1[:, 0:2].T, line1[:, 2:4].T, line2[:, 0:2].T, line2[:, 2:4].T]:
+        subLen = np.sqrt( (px - x)**2 + (py - y)**2 )
+        dists.append(np.where(intersect, abs(length - (subLen * 2)) / surface, -1))
+    data = data.assign(intersect=intersect)
+    data = data.assign(distToIntersect1=dists[0], distToIntersect2=dists[1], distToIntersect3=dists[2], distToIntersect4=dists[3])
 
     #new
-    data['meanDistToIntersect'] = data.apply(lambda row: meanToIntersect(row), axis=1)
-    # data = data.assign(meanDistToIntersect=np.mean(data['distToIntersect1'], data['distToIntersect2'], data['distToIntersect3'], data['distToIntersect4']))
+    data = data.assign(meanDistToIntersect=(dists[0] + dists[1] + dists[2] + dists[3]) / 4)
     data = data.assign(distToIntersectMean1=abs(data['distToIntersect1'] - data['meanDistToIntersect']))
     data = data.assign(distToIntersectMean2=abs(data['distToIntersect2'] - data['meanDistToIntersect']))
     data = data.assign(distToIntersectMean3=abs(data['distToIntersect3'] - data['meanDistToIntersect']))
@@ -110,5 +68,5 @@ def preproccesData(data):
 
     #new
     data = data.drop(['distToIntersect1', 'distToIntersect2', 'distToIntersect3', 'distToIntersect4', 'meanDistToIntersect'], axis=1)
-    
-    return data
\ No newline at end of file
+
+    return data
@@ -0,0 +1,182 @@
+import numpy as np
+from scipy import fft
+
+import instrument
+import triangulation
+import voting
+import wavelet
+from wavelet import matRound
+
+# Coarse-to-fine symmetry detection on an image pyramid, each level half the size of the next
+# The coarsest level is searched like symBilOurCentLogGaborHSV: all features, all pairs and the whole voting space.
+# Every finer level only refines the features that voted near the peaks found so far and only searches
+# the voting space around those peaks, so the wavelet transform of the full resolution image is never computed
+# Which axes are found is decided on the coarsest level, the finer levels move them to their full resolution location
+
+# Default pyramid parameters
+# levels is the number of pyramid levels, 1 searches the image itself
+# minSize is the smallest height or width (pixels) of the coarsest level, fewer levels are used for small images
+# bandBins is the half size of the window around a peak in which pairs select the features to refine, in bins of the coarsest level
+# searchBins is the half size of the window around a peak in which it is searched on the next level, in bins of the coarsest level
+# searchRadius is the distance (pixels) a feature can move on the next level
+# margin is the number of pixels around the search window used to compute the wavelet response of a feature
+def getPyramidParam(levels):
+    pyrParam = {
+        "levels": levels,
+        "minSize": 64,
+        "bandBins": 10,
+        "searchBins": 4,
+        "searchRadius": 2,
+        "margin": 24
+    }
+    return pyrParam
+
+# Half the size of an image, every pixel is the mean of 2x2 pixels
+# An odd last row or column is dropped, so pixel p of the result covers pixels 2p - 1 and 2p (1-based)
+def downsample(image):
+    rows = image.shape[0] // 2 * 2
+    cols = image.shape[1] // 2 * 2
+    img = image[:rows, :cols].astype(float)
+    small = (img[0::2, 0::2] + img[1::2, 0::2] + img[0::2, 1::2] + img[1::2, 1::2]) / 4
+    if np.issubdtype(image.dtype, np.integer):
+        small = matRound(small).astype(image.dtype)
+    return small
+
+# Levels of the pyramid of an image, coarsest first
+def buildPyramid(image, pyrParam):
+    levels = [image]
+    while len(levels) < pyrParam["levels"] and min(levels[-1].shape[0:2]) // 2 >= pyrParam["minSize"]:
+        levels.append(downsample(levels[-1]))
+    return levels[::-1]
+
+# 1D gaussian of hsize samples, normalised to sum to 1, as used by voting.gaussianBlur
+def gaussian1d(hsize, sigma):
+    siz = (hsize - 1) / 2
+    g = np.exp(-np.arange(-siz, siz + 1)**2 / (2 * sigma * sigma))
+    return g / g.sum()
+
+# Matrix M of the 1D convolution with g of an axis of length n, zero padded like conv2(A, g, 'same')
+# A @ M is the convolution along the last axis of A, only at the positions keep
+def convolutionMatrix(n, g, keep):
+    shift = np.asarray(keep)[None, :] + len(g) // 2 - np.arange(n)[:, None]
+    valid = (shift >= 0) & (shift < len(g))
+    return np.where(valid, g[np.clip(shift, 0, len(g) - 1)], 0)
+
+# Blurred vote map in a window around a 1-based (angle, displacement) bin
+# Displacement bins of a finer level are colScale times smaller than on the coarsest level, the blur is colScale
+# times wider in that direction and the result colScale times larger, so the blurred votes (the scores) of a
+# peak are the same on every level. The angle axis wraps around, outside of the displacement axis is zero
+# Returns the blurred window and the 1-based bins of its rows and columns
+def blurWindow(voteMap, loc, rowHalf, colHalf, maxParam, colScale):
+    accheight, accwidth = voteMap.shape
+    hsize = maxParam["hsize"]
+    gRows = gaussian1d(hsize, hsize / 4)
+    gCols = gaussian1d(int(matRound(hsize * colScale)), hsize / 4 * colScale)
+    padRows = len(gRows)
+    padCols = len(gCols)
+    rows = np.arange(loc[0] - rowHalf - padRows, loc[0] + rowHalf + padRows + 1)
+    cols = np.arange(loc[1] - colHalf - padCols, loc[1] + colHalf + padCols + 1)
+    inside = (cols >= 1) & (cols <= accwidth)
+    window = np.zeros((len(rows), len(cols)))
+    window[:, inside] = voteMap[np.ix_((rows - 1) % accheight, cols[inside] - 1)]
+    # Only the blurred values inside the window are needed, not those of the padding
+    keepRows = np.arange(padRows, len(rows) - padRows)
+    keepCols = np.arange(padCols, len(cols) - padCols)
+    blurred = convolutionMatrix(len(rows), gRows, keepRows).T @ window @ convolutionMatrix(len(cols), gCols, keepCols) * colScale
+    blurred[:, ~inside[padCols:-padCols]] = -np.inf
+    return blurred, (rows[padRows:-padRows] - 1) % accheight + 1, cols[padCols:-padCols]
+
+# Indices of the features of the pairs that voted within rowHalf, colHalf bins of any of the peaks
+def bandFeatures(voteData, locs, rowHalf, colHalf):
+    accheight, accwidth = voteData["voteMap"].shape
+    pairIds = []
+    for loc in locs:
+        # The angle axis wraps around, so a window can consist of two row ranges
+        for shift in [-accheight, 0, accheight]:
+            rows = np.clip([loc[0] - rowHalf + shift, loc[0] + rowHalf + shift], 1, accheight) - 1
+            if loc[0] - rowHalf + shift > accheight or loc[0] + rowHalf + shift < 1:
+                continue
+            cols = np.clip([loc[1] - colHalf, loc[1] + colHalf], 1, accwidth) - 1
+            pairIds.append(voting.getVotePairs(voteData, rows, cols))
+    if len(pairIds) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(voteData["pairs"][np.concatenate(pairIds)])
+
+# Move the features of the previous (half size) level to their location on this level
+# A feature is moved to the largest response within searchRadius pixels of its location, for the orientation
+# and scale it was found at. The scale is shifted to the same wavelength in pixels of this level.
+# The responses are computed on small crops around the features, with one Log-Gabor filter per feature,
+# instead of the full filter bank over the whole image
+# Returns wavData of the features with updated locations, the other fields are kept
+def refineFeatures(wavData, image, pyrParam):
+    wavParam = wavelet.getWavParam(image)
+    img = wavelet.grayImage(image, wavParam)
+    rows, cols = img.shape
+    radius = pyrParam["searchRadius"]
+    margin = pyrParam["margin"]
+    size = 2 * (radius + margin)
+    refined = dict(wavData)
+    if len(wavData["xS"]) == 0:
+        return refined
+
+    # A feature at pixel p of the previous level lies between pixels 2p - 1 and 2p of this level, the search window
+    # (pixels 2p - radius to 2p - 1 + radius) and the crop around it are centred on that point, so a mirrored pair
+    # of features moves symmetrically
+    x = 2 * np.asarray(wavData["xS"]) - radius
+    y = 2 * np.asarray(wavData["yS"]) - radius
+    pad = radius + margin
+    padded = np.pad(img, pad, mode="reflect")
+    offsets = np.arange(size)
+    crops = padded[(np.clip(x, 1, rows) - 1 - margin + pad)[:, None, None] + offsets[None, :, None],
+                   (np.clip(y, 1, cols) - 1 - margin + pad)[:, None, None] + offsets[None, None, :]]
+
+    logGabor, spread = wavelet.filterBankCache.get(size, size, wavParam)
+    nAngs = wavParam["nAngs"]
+    scaleShift = int(matRound(np.log(2) / np.log(wavParam["mult"])))
+    scl = np.clip(np.asarray(wavData["c"]) + scaleShift, 1, wavParam["nScls"]) - 1
+    ang = matRound((np.asarray(wavData["a"]) + np.pi / 2) * nAngs / np.pi).astype(int) % nAngs
+    responses = fft.ifft2(fft.fft2(crops) * logGabor[scl] * spread[ang], axes=(-2, -1), workers=wavelet.fftWorkers)
+    amp = np.abs(responses[:, margin:margin + 2 * radius, margin:margin + 2 * radius])
+    best = np.argmax(amp.reshape(len(amp), -1), axis=1)
+
+    xS = np.clip(np.clip(x, 1, rows) + best // (2 * radius), 1, rows)
+    yS = np.clip(np.clip(y, 1, cols) + best % (2 * radius), 1, cols)
+    refined["xS"] = xS
+    refined["yS"] = yS
+    refined["x"] = (xS - (rows / 2)) / max(rows, cols)
+    refined["y"] = (yS - (cols / 2)) / max(rows, cols)
+    return refined
+
+# Refine the peaks of the previous level on the next level of the pyramid
+# Only the features that voted near a peak are refined and voted again, every peak moves to the maximum of
+# the blurred votes within searchBins of its location. Peaks that end up in the same bin are merged
+# colScale is the number of displacement bins of this level per bin of the coarsest level
+# Returns the refined wavData, voteData, the 1-based peak bins and their scores
+@instrument.traced
+def refineLevel(wavData, voteData, locs, image, pyrParam, colScale, prevColScale):
+    maxParam = voting.getMaxParam()
+    band = pyrParam["bandBins"]
+    features = bandFeatures(voteData, locs, band, int(np.ceil(band * prevColScale)))
+    wavData = refineFeatures({key: value[features] for key, value in wavData.items()}, image, pyrParam)
+
+    triData = triangulation.computeTriangles(wavData)
+    triData = triangulation.removeNanPairs(triData)
+    voteParam = voting.getVoteParam(image.shape)
+    voteData = voting.computeVotingProj(triData, voteParam)
+
+    search = pyrParam["searchBins"]
+    colHalf = int(np.ceil(search * colScale))
+    peaks = {}
+    for loc in locs:
+        # Location of the peak in the displacement bins of this level
+        center = (loc[0], int(matRound(loc[1] * colScale / prevColScale)))
+        blurred, rows, cols = blurWindow(voteData["voteMap"], center, search, colHalf, maxParam, colScale)
+        r, c = np.unravel_index(np.argmax(blurred), blurred.shape)
+        peak = (int(rows[r]), int(cols[c]))
+        peaks[peak] = max(peaks.get(peak, -np.inf), blurred[r, c])
+
+    instrument.record(height=image.shape[0], width=image.shape[1], featurePoints=len(features),
+                      pairs=len(triData["gamma"]), maxima=len(locs), peaks=len(peaks))
+    locs = np.array(list(peaks.keys()), dtype=int).reshape(-1, 2)
+    scores = np.array(list(peaks.values()))
+    return wavData, voteData, locs, scores
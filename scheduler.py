@@ -0,0 +1,106 @@
+# Parallel recursive symmetry search
+# Every (cut) image of main.recursiveSym is a task on a process pool: a finished task submits the tasks
+# of its cut images, so independent branches and images are processed at the same time
+# Each worker process starts its own symmetry detection backend
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import itertools
+import os
+
+import backends
+import instrument
+import main
+
+# Start the symmetry detection backend of a worker process
+# With tracing on, the worker appends its trace events to the events file of the main process
+def initWorker(backendName, tracePath=None):
+    main.backend = backends.getBackend(backendName)
+    if tracePath is not None:
+        instrument.start(tracePath, append=True)
+
+# Original image (with --reuse-features) this worker process received last and its key
+# Tasks only carry the key, the image is sent again when a worker does not hold it
+workerImage = None
+workerImageKey = None
+
+# Run main.symmetryNode in a worker process, traceContext links its trace events to the image
+# fullKey is the key of the original image when its features are reused, fullImg the image itself or None
+# Returns None when the image of fullKey is needed but not held by this worker
+# The same array is passed for every region of an image, so the backend recognises it without comparing pixels
+def runNode(traceContext, img, depth, rc, locMove, fullKey=None, fullImg=None):
+    global workerImage, workerImageKey
+    if fullKey is not None:
+        if fullImg is not None:
+            workerImage, workerImageKey = fullImg, fullKey
+        elif workerImageKey != fullKey:
+            return None
+        fullImg = workerImage
+    with instrument.resume(traceContext):
+        return main.symmetryNode(img, depth, rc, locMove, fullImg)
+
+# Pool of worker processes shared by all images
+# recursiveSym can be called from several threads at once to search multiple images at the same time
+class SymmetryPool:
+    def __init__(self, workers, backendName, rc, reuseFeatures=False):
+        self.rc = rc
+        self.workers = workers
+        self.reuseFeatures = reuseFeatures
+        # Keys of the images whose features are reused, unique within the pool
+        self.imageKeys = itertools.count()
+        tracePath = instrument.eventsPath if instrument.enabled else None
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(backendName, tracePath))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    # Start all worker processes and their backends now, instead of on the first image
+    def warmUp(self):
+        futures = [self.pool.submit(os.getpid) for _ in range(self.workers)]
+        wait(futures)
+
+    # Recursively fetch symmetries of an image, with reuseFeatures the features of the original image are reused
+    # Returns the same symmetries list as main.recursiveSym:
+    # [[syms, depth], ...] in the order of the sequential (depth first) search
+    def recursiveSym(self, data, minSize):
+        # Results are stored by the path of cut indices from the original image to the cut image,
+        # sorting the paths gives the depth first order
+        results = {}
+        pending = {}
+        fullKey = next(self.imageKeys) if self.reuseFeatures else None
+        traceContext = instrument.context()
+
+        # With reused features the original image is only sent with the first task and to workers that ask for it
+        def run(img, depth, locMove, path, sendImage):
+            fullImg = data if fullKey is not None and sendImage else None
+            future = self.pool.submit(runNode, traceContext, img, depth, self.rc, locMove, fullKey, fullImg)
+            pending[future] = (img, depth, locMove, path)
+
+        def submit(img, depth, locMove, path, sendImage=False):
+            h, w, _ = img.shape
+            if h < minSize.get("h") or w < minSize.get("w"):
+                return
+            # Workers only return the cuts, the cut images are made from the image kept here
+            run(img, depth + 1, locMove, path, sendImage)
+
+        submit(data, -1, {"h":0,"w":0}, (), sendImage=True)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                img, depth, locMove, path = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    run(img, depth, locMove, path, sendImage=True)
+                    continue
+                syms, cuts = result
+                if len(syms) < 1:
+                    continue
+                results[path] = [syms, depth]
+                for c, ([rows, cols], newLocMove) in enumerate(cuts):
+                    submit(img[rows, cols], depth, newLocMove, path + (c,))
+
+        return [results[path] for path in sorted(results)]
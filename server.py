@@ -0,0 +1,229 @@
+# Long running symmetry detection server
+# Keeps the symmetry detection backend, its filter bank cache and the machine learning model loaded between requests,
+# so a single image does not wait for matlab to start, modules to be imported and the model to be loaded
+# Usage:
+# python server.py --backend numpy --mode fast
+# arguements:
+# --host, --port "address to listen on" (default: 127.0.0.1 8000)
+# --socket "unix socket to listen on instead of host and port" (default: off)
+# --input "folder of the images that can be requested by path" (default: ./input/)
+# --mode, --backend, --reuse-features, --cache-dir "as main.py"
+# --workers "number of images searched at the same time, with more than 1 symmetries are fetched by worker processes as in main.py" (default: 1)
+# Requests:
+# POST /detect with the bytes of an RGB or RGBA jpg or png image as body, ?name= sets the image name in the result
+# POST /detect with a json body {"path": "image.jpg"}, a path inside the --input folder
+#   both return the symmetries as json, in the format of main.py --results jsonl
+# GET /health returns the state of the server
+# At most workers images are searched at once and serverQueueSize (parameters.py) requests wait for a worker,
+# further requests are refused with 503 and a Retry-After header
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import socketserver
+import threading
+
+import numpy as np
+
+import backends
+import main
+import parameters
+import util
+
+# Decoded image as 8-bit RGB, the way jpg images are decoded and the thresholds are tuned for
+# png images decode as floats in [0, 1] and are scaled to 0-255, an alpha channel is dropped
+# Grayscale and other images without 3 colour channels raise a ValueError
+def toRGB(data):
+    if data.ndim != 3 or data.shape[2] not in (3, 4):
+        raise ValueError("expected an RGB or RGBA image, got an array of shape " + str(data.shape))
+    data = data[:, :, 0:3]
+    if data.dtype.kind == "f":
+        data = np.rint(np.clip(data, 0, 1) * 255)
+    return data.astype(np.uint8)
+
+# Raised when all workers are busy and the queue is full
+class ServerBusy(Exception):
+    pass
+
+# Runs images through main.detectImage and main.processImage with at most workers images at once
+class DetectionService:
+    def __init__(self, workers, queueSize):
+        self.workers = workers
+        self.running = threading.Semaphore(workers)
+        self.admitted = threading.Semaphore(workers + queueSize)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.served = 0
+        self.rejected = 0
+        self.failed = 0
+
+    # Symmetries of an image (not yet resized) as json, raises ServerBusy when the server is full
+    def detect(self, name, data):
+        if not self.admitted.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise ServerBusy()
+        try:
+            with self.lock:
+                self.active += 1
+            # Without worker processes the backend is shared, so images are searched one at a time
+            with self.running:
+                img = {"name": name, "data": util.resize_image(data, main.resize)}
+                main.detectImage(img)
+                main.processImage(img)
+            with self.lock:
+                self.served += 1
+            return util.resultsJson(name, img["data"], img["symmetries"], img["rotations"])
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.admitted.release()
+
+    def health(self):
+        with self.lock:
+            state = {"status": "ok", "mode": main.args.mode, "backend": main.args.backend, "workers": self.workers,
+                     "active": self.active, "served": self.served, "rejected": self.rejected, "failed": self.failed}
+        if main.backend is not None and hasattr(main.backend, "stats"):
+            state["filterBankCache"] = main.backend.stats()
+        if main.detectionCache is not None:
+            state["detectionCache"] = main.detectionCache.stats()
+        return state
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # Set by startServer
+    service = None
+    inDir = None
+
+    def reply(self, status, body, headers={}):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self.reply(200, self.service.health())
+        else:
+            self.reply(404, {"error": "Unknown path, use POST /detect or GET /health"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if url.path != "/detect":
+            self.reply(404, {"error": "Unknown path, use POST /detect or GET /health"})
+            return
+        try:
+            name, data = self.readImage(url, body)
+        except (ValueError, KeyError, TypeError, OSError, SyntaxError) as e:
+            self.reply(400, {"error": "Could not read image: " + str(e)})
+            return
+        try:
+            self.reply(200, self.service.detect(name, data))
+        except ServerBusy:
+            self.reply(503, {"error": "Server busy, retry later"}, {"Retry-After": "1"})
+        except Exception as e:
+            self.reply(500, {"error": repr(e)})
+
+    # Image of a request, either a json body with the path of an image in the input folder or the image bytes
+    def readImage(self, url, body):
+        from matplotlib import image
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            path = json.loads(body)["path"]
+            fullPath = os.path.realpath(os.path.join(self.inDir, path))
+            if os.path.commonpath([fullPath, os.path.realpath(self.inDir)]) != os.path.realpath(self.inDir):
+                raise ValueError("path is outside of the input folder")
+            return os.path.basename(fullPath), toRGB(image.imread(fullPath))
+        if len(body) == 0:
+            raise ValueError("empty request body")
+        name = parse_qs(url.query).get("name", ["image"])[0]
+        # imread needs the format of a stream, only png is read differently from other formats
+        fmt = "png" if body.startswith(b"\x89PNG") else "jpg"
+        return name, toRGB(image.imread(io.BytesIO(body), format=fmt))
+
+    def address_string(self):
+        if isinstance(self.client_address, tuple) and len(self.client_address) > 0:
+            return str(self.client_address[0])
+        return "unix"
+
+# HTTP server on a unix socket
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+# Create the server, call serve_forever to handle requests
+def startServer(service, inDir, host="127.0.0.1", port=8000, socketPath=None):
+    handler = type("Handler", (RequestHandler,), {"service": service, "inDir": inDir})
+    if socketPath is not None:
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        return UnixHTTPServer(socketPath, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", default=8000, type=int, help="Port to listen on (default: 8000)")
+    parser.add_argument("--socket", default=None, help="Unix socket to listen on instead of host and port (default: off)")
+    parser.add_argument("--input", default="./input/", help="Folder of the images that can be requested by path (default: ./input/)")
+    parser.add_argument("--mode", default="slow", choices=["slow", "fast"], help="slow / fast (Machine learning turned on or off) (default: slow)")
+    parser.add_argument("--backend", default="matlab", choices=list(backends.backends), help="matlab / numpy / mock (reflection symmetry detection backend) (default: matlab)")
+    parser.add_argument("--reuse-features", action="store_true", help="Compute wavelet features once per image and reuse them for the cut images (numpy backend only)")
+    parser.add_argument("--cache-dir", default=None, help="Folder to cache symmetry detections in (default: off)")
+    parser.add_argument("--workers", default=1, type=int, help="Number of images searched at the same time (default: 1)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.reuse_features and args.backend != "numpy":
+        parser.error("--reuse-features requires --backend numpy")
+
+    main.args = argparse.Namespace(mode=args.mode, backend=args.backend, reuse_features=args.reuse_features, tiled=None)
+    if args.cache_dir is not None:
+        import detectioncache
+        main.detectionCache = detectioncache.DetectionCache(args.cache_dir, parameters.detectionCacheSize * 2**20)
+
+    # Start the backend (or the worker processes with their backends) and load the model before the first request
+    if args.workers > 1:
+        import scheduler
+        main.symmetryPool = scheduler.SymmetryPool(args.workers, args.backend, main.rc, args.reuse_features)
+        main.symmetryPool.warmUp()
+    else:
+        main.startBackend()
+    if args.mode == "slow":
+        main.getModel()
+
+    service = DetectionService(args.workers, parameters.serverQueueSize)
+    server = startServer(service, args.input, args.host, args.port, args.socket)
+    # Stop as on ctrl+c when the server is terminated, so the workers and the socket are cleaned up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print("Listening on", args.socket if args.socket is not None else "http://" + args.host + ":" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if main.symmetryPool is not None:
+            main.symmetryPool.close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
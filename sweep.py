@@ -0,0 +1,202 @@
+# Hyperparameter sweep over the post-processing parameters of main.py
+# Symmetries are detected once per image and stored in the detection cache, every configuration of the grid
+# is then only a post-processing pass over the cached detections, spread over a pool of worker processes
+# Usage:
+# python sweep.py --grid grid.json
+# arguements:
+# --grid "json file with a list of values for post-processing parameters of parameters.py, every combination is evaluated"
+#        e.g. {"symThresholdAC": [0.3, 0.4], "lineSimilarity": [5, 8]}, parameters not in the grid keep their value from parameters.py
+# --input "custom input folder" (default: ./input/)
+# --cache-dir "folder of the detection cache, see main.py" (default: ./cache/)
+# --mode "slow/fast, see main.py" (default: slow)
+# --backend "matlab/numpy, see main.py" (default: matlab)
+# --workers "number of worker processes evaluating configurations, also used for detection" (default: 1)
+# --ground-truth "json file with the true symmetries of images, adds precision and recall over the images in the file to the output" (default: off)
+#        e.g. {"image.jpg": {"reflections": [[x1, y1, x2, y2], ...], "rotations": [[x, y, radius], ...]}}, in pixels of the original image
+# --output "csv file to save the results table in" (default: ./sweep.csv)
+# Detection parameters (resize, rc and the symThresholdBC used for cutting images) are not part of the sweep
+
+from matplotlib import image
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import backends
+import detectioncache
+import forest
+import main
+import parameters
+import pipeline
+import util
+
+# Matching tolerances for precision and recall
+# A reflection matches a true reflection if their angles differ less than reflectionAngle degrees
+# and their centers are closer than reflectionDist times the length of the true line
+# A rotation matches a true rotation if their centers are closer than rotationDist times the true radius
+reflectionAngle = 10
+reflectionDist = 0.2
+rotationDist = 0.2
+
+# Every combination of the values in grid, as post-processing parameters (see main.postParams)
+def gridConfigs(grid):
+    for name in grid:
+        if name not in main.postParams:
+            raise ValueError("Unknown post-processing parameter '" + name + "', choose from: " + ", ".join(main.postParams))
+    names = list(grid)
+    configs = []
+    for values in itertools.product(*[grid[name] for name in names]):
+        config = dict(main.postParams)
+        config.update(zip(names, values))
+        configs.append(config)
+    return configs
+
+# Greedy one to one matching of detections, sorted on score, to true symmetries
+# isMatch(detection, truth) tells if a detection matches a true symmetry
+# Returns the number of matched detections
+def countMatches(detections, truths, isMatch):
+    matched = np.zeros(len(truths), dtype=bool)
+    count = 0
+    for det in detections:
+        for k, truth in enumerate(truths):
+            if not matched[k] and isMatch(det, truth):
+                matched[k] = True
+                count += 1
+                break
+    return count
+
+def reflectionMatch(line, truth):
+    angle = np.degrees(np.arctan2(line[3] - line[1], line[2] - line[0]) - np.arctan2(truth[3] - truth[1], truth[2] - truth[0])) % 180
+    angle = min(angle, 180 - angle)
+    dist = np.hypot((line[0] + line[2] - truth[0] - truth[2]) / 2, (line[1] + line[3] - truth[1] - truth[3]) / 2)
+    length = np.hypot(truth[2] - truth[0], truth[3] - truth[1])
+    return angle < reflectionAngle and dist < reflectionDist * length
+
+def rotationMatch(rot, truth):
+    return np.hypot(rot[0] - truth[0], rot[1] - truth[1]) < rotationDist * truth[2]
+
+# State of a worker process, set by initWorker
+worker = {}
+
+def initWorker(cacheDir, mode):
+    worker["cache"] = detectioncache.DetectionCache(cacheDir, parameters.detectionCacheSize * 2**20)
+    worker["mode"] = mode
+    worker["model"] = None
+    if mode == "slow":
+        worker["model"] = forest.loadModel(main.modelFileName)
+
+# Post-process the cached detections of all images with one configuration
+# images is a list of dicts with the name, cache key, shape and scale (original / resized size) of every image
+# Returns one row of the results table
+def evaluateConfig(config, images, groundTruth):
+    start = time.perf_counter()
+    row = dict(config)
+    counts = {"reflections": 0, "rotations": 0, "reflectionMatches": 0, "reflectionTruths": 0, "reflectionsWithTruth": 0,
+              "rotationMatches": 0, "rotationTruths": 0, "rotationsWithTruth": 0}
+    for img in images:
+        symmetries = worker["cache"].get(img["key"])
+        if symmetries is None:
+            raise RuntimeError("Detections of " + img["name"] + " are not in the cache, increase detectionCacheSize")
+        # Post-processing only uses the shape of the image
+        shape = np.broadcast_to(np.zeros((), dtype=np.uint8), img["shape"])
+        symmetries, rotations = main.postProcess(symmetries, shape, worker["mode"], worker["model"], config)
+        counts["reflections"] += len(symmetries)
+        counts["rotations"] += len(rotations)
+
+        if groundTruth is not None and img["name"] in groundTruth:
+            truth = groundTruth[img["name"]]
+            table = util.asTable(symmetries)
+            order = np.argsort(-table.score, kind="stable")
+            lines = table.line[order] * img["scale"]
+            rots = [[rot[0][0] * img["scale"], rot[0][1] * img["scale"], rot[1] * img["scale"]]
+                    for rot in sorted(rotations, key=lambda rot: -rot[2])]
+            counts["reflectionsWithTruth"] += len(symmetries)
+            counts["rotationsWithTruth"] += len(rotations)
+            counts["reflectionMatches"] += countMatches(lines, truth.get("reflections", []), reflectionMatch)
+            counts["reflectionTruths"] += len(truth.get("reflections", []))
+            counts["rotationMatches"] += countMatches(rots, truth.get("rotations", []), rotationMatch)
+            counts["rotationTruths"] += len(truth.get("rotations", []))
+
+    row["reflections"] = counts["reflections"]
+    row["rotations"] = counts["rotations"]
+    # Precision only counts the symmetries of images with ground truth, the other images have nothing to match
+    if groundTruth is not None:
+        row["reflectionPrecision"] = counts["reflectionMatches"] / max(counts["reflectionsWithTruth"], 1)
+        row["reflectionRecall"] = counts["reflectionMatches"] / max(counts["reflectionTruths"], 1)
+        row["rotationPrecision"] = counts["rotationMatches"] / max(counts["rotationsWithTruth"], 1)
+        row["rotationRecall"] = counts["rotationMatches"] / max(counts["rotationTruths"], 1)
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+# Detect the symmetries of all images once, filling the detection cache
+# Returns the images as used by evaluateConfig
+def detectImages(inDir, imgList, workers):
+    def load(name):
+        data = image.imread(inDir + name)
+        h, w = data.shape[0:2]
+        data = util.resize_image(data, parameters.resize)
+        return {"name": name, "data": data, "scale": w / data.shape[1]}
+
+    images = []
+    stages = [[load, 1], [main.detectImage, workers]]
+    for i, img in enumerate(pipeline.runPipeline(imgList, stages, parameters.queueSize), start=1):
+        print(img["name"] + " [" + str(i) + "/" + str(len(imgList)) + "]")
+        data = img["data"]
+        images.append({"name": img["name"], "key": main.detectionCache.key(data, main.detectorParams(data)),
+                       "shape": data.shape, "scale": img["scale"]})
+    images.sort(key=lambda img: img["name"])
+    return images
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--grid", required=True, help="Json file with the values of every post-processing parameter to sweep")
+    parser.add_argument("--input", default="./input/", help="Custom input folder (default: ./input/)")
+    parser.add_argument("--cache-dir", default="./cache/", help="Folder of the detection cache (default: ./cache/)")
+    parser.add_argument("--mode", default="slow", choices=["slow", "fast"], help="slow / fast (Machine learning turned on or off) (default: slow)")
+    parser.add_argument("--backend", default="matlab", choices=list(backends.backends), help="matlab / numpy (reflection symmetry detection backend) (default: matlab)")
+    parser.add_argument("--workers", default=1, type=int, help="Number of worker processes (default: 1)")
+    parser.add_argument("--ground-truth", default=None, help="Json file with true symmetries, adds precision and recall (default: off)")
+    parser.add_argument("--output", default="./sweep.csv", help="Csv file to save the results in (default: ./sweep.csv)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    with open(args.grid) as file:
+        configs = gridConfigs(json.load(file))
+    groundTruth = None
+    if args.ground_truth is not None:
+        with open(args.ground_truth) as file:
+            groundTruth = json.load(file)
+
+    # Detection runs through main.detectImage with the detection cache
+    main.args = argparse.Namespace(backend=args.backend, reuse_features=False, tiled=None)
+    main.detectionCache = detectioncache.DetectionCache(args.cache_dir, parameters.detectionCacheSize * 2**20)
+    if args.workers > 1:
+        import scheduler
+        main.symmetryPool = scheduler.SymmetryPool(args.workers, args.backend, parameters.rc)
+
+    imgList = util.listImages(args.input, '.jpg')
+    print("Fetching symmetries ...")
+    start = time.perf_counter()
+    try:
+        images = detectImages(args.input, imgList, args.workers)
+    finally:
+        if main.symmetryPool is not None:
+            main.symmetryPool.close()
+    detectSeconds = time.perf_counter() - start
+    print("Detection:", round(detectSeconds, 2), "seconds,", main.detectionCache.stats())
+
+    print("Evaluating " + str(len(configs)) + " configurations ...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=initWorker, initargs=(args.cache_dir, args.mode)) as pool:
+        rows = list(pool.map(evaluateConfig, configs, itertools.repeat(images), itertools.repeat(groundTruth)))
+    print("Post-processing:", round(time.perf_counter() - start, 2), "seconds")
+
+    results = pd.DataFrame(rows)
+    results.to_csv(args.output, index=False)
+    print(results.to_string())
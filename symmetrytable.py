@@ -0,0 +1,128 @@
+import numpy as np
+
+# Reflection symmetry lines stored in one structured numpy array
+# Replaces the nested lists [[x1, y1, x2, y2], slope, score, normScore, depth] used before
+# Fields:
+# line: x1, y1, x2, y2 of the symmetry line
+# slope: slope of the line, see util.getSlope
+# score, normScore: symmetry score and score relative to the best line of the (cut) image
+# depth: recursion depth of the cut image the line was found in
+# node: index of the cut image (recursive loop) the line was found in, in order of the recursive search
+dtype = np.dtype([
+    ("line", "f8", (4,)),
+    ("slope", "f8"),
+    ("score", "f8"),
+    ("normScore", "f8"),
+    ("depth", "i4"),
+    ("node", "i4")
+])
+
+# Slopes of lines, an (n, 4) array, as util.getSlope
+# Infinite slopes (vertical lines) are set to height
+def getSlopes(lines, height):
+    dx = lines[:, 2] - lines[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(dx == 0, height, (lines[:, 3] - lines[:, 1]) / dx)
+
+# Slicing returns a view on the same array, indexing with a mask or index array returns a copy
+# Indexing with an integer and iterating give rows in the old list format [[x1, y1, x2, y2], slope, score, normScore, depth]
+class SymmetryTable:
+    def __init__(self, data=None):
+        if data is None:
+            data = np.zeros(0, dtype=dtype)
+        self.data = data
+
+    # Table of n zeroed rows
+    @classmethod
+    def empty(cls, n=0):
+        return cls(np.zeros(n, dtype=dtype))
+
+    # Table of the output of symBilOurCentLogGaborHSV, rows of x1, y1, x2, y2, score and optionally normScore
+    # Lines are moved by locMove, the location of the (cut) image inside the original image
+    # Slopes are computed after moving, vertical lines get the height of the (cut) image as slope
+    @classmethod
+    def fromDetections(cls, detections, height, locMove={"h":0,"w":0}):
+        detections = np.array(detections, dtype=float)
+        if detections.size == 0:
+            return cls.empty()
+        detections = detections.reshape(len(detections), -1)
+        table = cls.empty(len(detections))
+        table.line[:] = detections[:, 0:4]
+        table.move(locMove.get("h"), locMove.get("w"))
+        table.slope[:] = getSlopes(table.line, height)
+        table.score[:] = detections[:, 4]
+        # As in MATLAB, normScore is missing when only one line is found
+        if detections.shape[1] < 6:
+            table.normScore[:] = 1.0
+        else:
+            table.normScore[:] = detections[:, 5]
+        return table
+
+    # Table of symmetries in the old list format
+    @classmethod
+    def fromList(cls, symmetries):
+        table = cls.empty(len(symmetries))
+        for i, sym in enumerate(symmetries):
+            table.data[i] = (sym[0], sym[1], sym[2], sym[3], sym[4] if len(sym) > 4 else 0, 0)
+        return table
+
+    # Concatenate tables into one new table
+    @classmethod
+    def concatenate(cls, tables):
+        tables = list(tables)
+        if len(tables) == 0:
+            return cls.empty()
+        return cls(np.concatenate([table.data for table in tables]))
+
+    # Symmetries in the old list format
+    def toList(self):
+        return [self[i] for i in range(len(self))]
+
+    # Move all lines by h pixels down and w pixels to the right, in place
+    def move(self, h, w):
+        self.line[:, 0::2] += w
+        self.line[:, 1::2] += h
+        return self
+
+    def copy(self):
+        return SymmetryTable(self.data.copy())
+
+    @property
+    def line(self):
+        return self.data["line"]
+
+    @property
+    def slope(self):
+        return self.data["slope"]
+
+    @property
+    def score(self):
+        return self.data["score"]
+
+    @property
+    def normScore(self):
+        return self.data["normScore"]
+
+    @property
+    def depth(self):
+        return self.data["depth"]
+
+    @property
+    def node(self):
+        return self.data["node"]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            row = self.data[index]
+            return [list(row["line"]), row["slope"], row["score"], row["normScore"], row["depth"]]
+        return SymmetryTable(self.data[index])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "SymmetryTable(" + repr(self.data) + ")"
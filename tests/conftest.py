@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules of the repository are imported from its root folder, as main.py does
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if repoDir not in sys.path:
+    sys.path.insert(0, repoDir)
@@ -0,0 +1,38 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from matplotlib import image
+
+import backends
+import util
+
+# Regression test of the numpy backend: axes of bundled images as computed by an earlier version of the port
+# This is not a parity test with the matlab code (symBilOurCentLogGaborHSV.m), the reference was not produced by matlab
+# A change to the detection (not the post-processing) that moves the axes needs a new reference
+testDir = os.path.dirname(os.path.abspath(__file__))
+inDir = os.path.join(os.path.dirname(testDir), "input")
+referencePath = os.path.join(testDir, "data", "regressionAxes.json")
+with open(referencePath) as f:
+    reference = json.load(f)
+
+def readImage(name, resize):
+    return util.resize_image(image.imread(os.path.join(inDir, name)), resize)
+
+@pytest.fixture(scope="module")
+def numpyBackend():
+    return backends.getBackend("numpy")
+
+@pytest.mark.parametrize("name", sorted(reference["axes"]))
+def test_numpy_backend_regression(numpyBackend, name):
+    symRes = numpyBackend.detect(readImage(name, reference["resize"]))
+    expected = np.array(reference["axes"][name])
+    assert symRes.shape == expected.shape
+    np.testing.assert_allclose(symRes[:, 0:4], expected[:, 0:4], atol=1e-6)
+    np.testing.assert_allclose(symRes[:, 4:], expected[:, 4:], rtol=1e-6)
+
+def test_mock_backend_returns_symres_rows():
+    symRes = np.asarray(backends.getBackend("mock").detect(np.zeros((40, 60, 3), dtype=np.uint8)))
+    assert symRes.ndim == 2 and symRes.shape[1] == 6
+
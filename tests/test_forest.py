@@ -0,0 +1,53 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import forest
+
+sklearnEnsemble = pytest.importorskip("sklearn.ensemble")
+
+@pytest.fixture(scope="module")
+def trained():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 12)) * rng.uniform(0.01, 100, 12)
+    y = (X[:, 0] + X[:, 3] * 0.05 + rng.normal(size=400) > 0)
+    model = sklearnEnsemble.RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    test = rng.normal(size=(2000, 12)) * rng.uniform(0.01, 100, 12)
+    return model, test
+
+def assertSamePredictions(model, exported, X):
+    np.testing.assert_array_equal(exported.predict(X), model.predict(X))
+    np.testing.assert_allclose(exported.predict_proba(X), model.predict_proba(X), rtol=1e-12, atol=1e-12)
+
+def test_exported_forest_matches_sklearn(trained, tmp_path):
+    model, X = trained
+    forest.exportForest(model, str(tmp_path))
+    assertSamePredictions(model, forest.Forest(str(tmp_path)), X)
+
+# The pickle is read without sklearn, the forest must be the same as when exported from the model itself
+def test_exported_pickle_matches_sklearn(trained, tmp_path):
+    model, X = trained
+    modelFileName = str(tmp_path / "model.pkl")
+    with open(modelFileName, "wb") as file:
+        pickle.dump(model, file)
+    forest.exportPickle(modelFileName, str(tmp_path / "model"))
+    assertSamePredictions(model, forest.Forest(str(tmp_path / "model")), X)
+
+def test_load_model_exports_the_pickle(trained, tmp_path):
+    model, X = trained
+    modelFileName = str(tmp_path / "model.pkl")
+    with open(modelFileName, "wb") as file:
+        pickle.dump(model, file)
+    loaded = forest.loadModel(modelFileName)
+    assert isinstance(loaded, forest.Forest)
+    assert os.path.isfile(str(tmp_path / "model" / "forest.json"))
+    assertSamePredictions(model, loaded, X)
+
+def test_load_model_warns_when_falling_back_to_the_pickle(tmp_path):
+    modelFileName = str(tmp_path / "model.pkl")
+    with open(modelFileName, "wb") as file:
+        pickle.dump({"not": "a forest"}, file)
+    with pytest.warns(UserWarning, match="pickled model"):
+        assert forest.loadModel(modelFileName) == {"not": "a forest"}
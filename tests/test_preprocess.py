@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+import preprocess
+import util
+
+lineColumns = ['line1x1', 'line1y1', 'line1x2', 'line1y2', 'line1Score', 'line2x1', 'line2y1', 'line2x2', 'line2y2', 'line2Score', 'height', 'width']
+
+# The row by row version of preproccesData the model was trained with, built on util.line_intersect and util.getSlope
+def rowwisePreproccesData(data):
+    def intersection(row):
+        return util.line_intersect(row['line1x1'], row['line1y1'], row['line1x2'], row['line1y2'], row['line2x1'], row['line2y1'], row['line2x2'], row['line2y2'])
+
+    def distToIntersect(row, x, y):
+        intersect = intersection(row)
+        if intersect == None:
+            return -1
+        subLen = np.sqrt( (row[x] - intersect[0])**2 + (row[y] - intersect[1])**2 )
+        return abs(row['line1Len'] - (subLen * 2)) / (row['width'] * row['height'])
+
+    def calcPerpendicular(row):
+        if row['line1Slope'] != 0:
+            return -1 * (1 / row['line1Slope'])
+        elif row['line2Slope'] != 0:
+            return -1 * (1 / row['line2Slope'])
+        return -1
+
+    def calcPerpDiff(row):
+        if row['line1Slope'] != 0:
+            return abs(row['linePerp'] - row['line2Slope'])
+        elif row['line2Slope'] != 0:
+            return abs(row['linePerp'] - row['line1Slope'])
+        return -1
+
+    data = data.assign(ScoreDiff=abs(data['line1Score'] - data['line2Score']))
+    data['line1Slope'] = data.apply(lambda row: util.getSlope([row['line1x1'], row['line1y1'], row['line1x2'], row['line1y2']], row['height']), axis=1)
+    data['line2Slope'] = data.apply(lambda row: util.getSlope([row['line2x1'], row['line2y1'], row['line2x2'], row['line2y2']], row['height']), axis=1)
+    data = data.assign(SlopeDiff=abs(data['line1Slope'] - data['line2Slope']))
+    data['linePerp'] = data.apply(calcPerpendicular, axis=1)
+    data['perpDiff'] = data.apply(calcPerpDiff, axis=1)
+    data = data.assign(line1Len=np.sqrt( (data['line1x1'] - data['line1x2'])**2 + (data['line1y1'] - data['line1y2'])**2 ))
+    data = data.assign(line2Len=np.sqrt( (data['line2x1'] - data['line2x2'])**2 + (data['line2y1'] - data['line2y2'])**2 ))
+    data = data.assign(LenDiff=abs(data['line1Len'] - data['line2Len']))
+    data['intersect'] = data.apply(lambda row: intersection(row) != None, axis=1)
+    dists = [data.apply(lambda row: distToIntersect(row, x, y), axis=1)
+             for x, y in [('line1x1', 'line1y1'), ('line1x2', 'line1y2'), ('line2x1', 'line2y1'), ('line2x2', 'line2y2')]]
+    mean = (dists[0] + dists[1] + dists[2] + dists[3]) / 4
+    for i in range(4):
+        data['distToIntersectMean' + str(i + 1)] = abs(dists[i] - mean)
+    return data[preprocess.featureColumns]
+
+# Random pairs of lines, with vertical, horizontal, parallel, identical and touching lines and a row with a missing coordinate
+def linePairs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.uniform(0, 200, (n, len(lineColumns))), columns=lineColumns)
+    data[['line1Score', 'line2Score']] = rng.random((n, 2))
+    data[['height', 'width']] = rng.integers(50, 400, (n, 2))
+    special = [
+        [50, 10, 50, 90, 0.5, 10, 50, 90, 50, 0.4],     # vertical and horizontal, crossing
+        [10, 50, 90, 50, 0.5, 10, 60, 90, 60, 0.4],     # parallel horizontal
+        [10, 10, 90, 90, 0.5, 20, 10, 100, 90, 0.4],    # parallel diagonal
+        [10, 10, 90, 90, 0.5, 10, 10, 90, 90, 0.4],     # identical
+        [10, 10, 90, 90, 0.5, 90, 90, 150, 20, 0.4],    # touching at an endpoint
+        [30, 10, 30, 90, 0.5, 60, 10, 60, 90, 0.4],     # parallel vertical
+        [10, 10, 90, np.nan, 0.5, 10, 90, 90, 10, 0.4], # missing coordinate
+    ]
+    for i, row in enumerate(special):
+        data.loc[i, lineColumns[:10]] = row
+    return data
+
+def test_matches_rowwise_version():
+    data = linePairs(300)
+    expected = rowwisePreproccesData(data)
+    result = preprocess.preproccesData(data)
+    assert list(result.columns) == preprocess.featureColumns
+    assert result['intersect'].any() and not result['intersect'].all()
+    np.testing.assert_array_equal(result['intersect'].to_numpy(), expected['intersect'].to_numpy(dtype=bool))
+    # The vectorised distances to the intersection can differ in the last bits
+    for column in preprocess.featureColumns:
+        np.testing.assert_allclose(result[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-15, equal_nan=True, err_msg=column)
+
+def test_keeps_other_columns():
+    data = linePairs(10).assign(hasRotation=np.arange(10) % 2)
+    result = preprocess.preproccesData(data)
+    assert list(result.columns) == ['hasRotation'] + preprocess.featureColumns
+    assert list(result['hasRotation']) == list(np.arange(10) % 2)
+
+def test_empty():
+    result = preprocess.preproccesData(pd.DataFrame(columns=lineColumns, dtype=float))
+    assert len(result) == 0
+    assert list(result.columns) == preprocess.featureColumns
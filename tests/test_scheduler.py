@@ -0,0 +1,23 @@
+import numpy as np
+
+import main
+import scheduler
+
+# A worker gets the original image once, later tasks of the image only carry its key and get the same array
+def test_worker_keeps_the_original_image(monkeypatch):
+    received = []
+    monkeypatch.setattr(main, "symmetryNode", lambda img, depth, rc, locMove, fullImg: received.append(fullImg) or ([], []))
+    monkeypatch.setattr(scheduler, "workerImage", None)
+    monkeypatch.setattr(scheduler, "workerImageKey", None)
+    image = np.zeros((20, 30, 3), dtype=np.uint8)
+    crop = image[0:10]
+
+    assert scheduler.runNode(None, crop, 0, 3, {"h": 0, "w": 0}, 7) is None
+    assert scheduler.runNode(None, crop, 0, 3, {"h": 0, "w": 0}, 7, image) == ([], [])
+    assert scheduler.runNode(None, crop, 0, 3, {"h": 0, "w": 0}, 7) == ([], [])
+    assert received[0] is image and received[1] is image
+    # Another image is asked for again
+    assert scheduler.runNode(None, crop, 0, 3, {"h": 0, "w": 0}, 8) is None
+    # Without reused features nothing is kept
+    assert scheduler.runNode(None, crop, 0, 3, {"h": 0, "w": 0}) == ([], [])
+    assert received[2] is None
@@ -0,0 +1,64 @@
+import argparse
+import http.client
+import io
+import json
+import threading
+
+import cv2
+import numpy as np
+import pytest
+from matplotlib import image
+
+import backends
+import main
+import server
+
+def pngBytes(data):
+    return cv2.imencode(".png", data)[1].tobytes()
+
+@pytest.fixture
+def address(monkeypatch):
+    monkeypatch.setattr(main, "args", argparse.Namespace(mode="fast", backend="mock", reuse_features=False, tiled=None), raising=False)
+    monkeypatch.setattr(main, "backend", backends.getBackend("mock"))
+    httpd = server.startServer(server.DetectionService(1, 1), "./input/", port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+def post(address, body):
+    connection = http.client.HTTPConnection(*address)
+    connection.request("POST", "/detect?name=test.png", body=body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+# png decodes as floats in [0, 1], the server passes it on as 8-bit RGB like a jpg
+def test_png_is_read_as_8bit_rgb():
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    decoded = image.imread(io.BytesIO(pngBytes(data)), format="png")
+    assert decoded.dtype.kind == "f"
+    rgb = server.toRGB(decoded)
+    assert rgb.dtype == np.uint8
+    np.testing.assert_array_equal(rgb, data[:, :, ::-1])
+
+def test_alpha_is_dropped():
+    rgb = server.toRGB(np.ones((4, 5, 4), dtype=np.float32))
+    assert rgb.shape == (4, 5, 3) and (rgb == 255).all()
+
+@pytest.mark.parametrize("shape", [(20, 30), (20, 30, 1), (20, 30, 2)])
+def test_non_rgb_is_refused(shape):
+    with pytest.raises(ValueError):
+        server.toRGB(np.zeros(shape, dtype=np.uint8))
+
+def test_detect_png(address):
+    status, result = post(address, pngBytes(np.full((40, 60, 3), 128, dtype=np.uint8)))
+    assert status == 200
+    assert result["image"] == "test.png"
+    assert (result["height"], result["width"]) == (40 // main.resize, 60 // main.resize)
+
+def test_grayscale_upload_is_a_bad_request(address):
+    status, result = post(address, pngBytes(np.full((40, 60), 128, dtype=np.uint8)))
+    assert status == 400
+    assert "RGB" in result["error"]
@@ -0,0 +1,26 @@
+import os
+
+import cv2
+import numpy as np
+
+import tiles
+
+def writeImage(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, np.full((40, 60, 3), value, dtype=np.uint8))
+
+# Images with the same name in different folders, or changed since their conversion, must not share a raw copy
+def test_raw_copy_is_keyed_on_path_and_contents(tmp_path):
+    rawDir = str(tmp_path / "raw")
+    first = str(tmp_path / "a" / "image.jpg")
+    second = str(tmp_path / "b" / "image.jpg")
+    writeImage(first, 10)
+    writeImage(second, 200)
+    assert tiles.openRaw(first, rawDir, 2).shape == (20, 30, 3)
+    assert (tiles.openRaw(first, rawDir, 2) == 10).all()
+    assert (tiles.openRaw(second, rawDir, 2) == 200).all()
+
+    writeImage(first, 90)
+    os.utime(first, ns=(os.stat(first).st_atime_ns, os.stat(first).st_mtime_ns + 10**9))
+    assert (tiles.openRaw(first, rawDir, 2) == 90).all()
+    assert len(os.listdir(rawDir)) == 3
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import triangulation
+import voting
+
+# wavData of s random features, with the shapes computeWaveletCoeffLogGabor returns for an RGB image
+def randomFeatures(s, seed=0):
+    rng = np.random.default_rng(seed)
+    v = rng.random((s, 32))
+    hC = rng.random((s, 16))
+    return {
+        "c": rng.integers(1, 13, s),
+        "m": rng.random(s),
+        "a": rng.uniform(-np.pi / 2, np.pi / 2, s),
+        "x": rng.uniform(-0.5, 0.5, s),
+        "y": rng.uniform(-0.5, 0.5, s),
+        "xS": rng.integers(1, 100, s),
+        "yS": rng.integers(1, 100, s),
+        "v": v / v.sum(axis=1, keepdims=True),
+        "vi": rng.integers(1, 33, s),
+        "hC": hC / hC.sum(axis=1, keepdims=True)
+    }
+
+@pytest.mark.parametrize("tolerance", [0, 0.05])
+@pytest.mark.parametrize("s", [0, 1])
+def test_no_pairs(s, tolerance):
+    triParam = dict(triangulation.getTriParam(), tolerance=tolerance)
+    triData = triangulation.removeNanPairs(triangulation.computeTriangles(randomFeatures(s), triParam))
+    assert len(triData["gamma"]) == 0
+    assert triData["pairs"].shape == (0, 2)
+    voteParam = voting.getVoteParam((64, 64))
+    voteData = voting.computeVotingProj(triData, voteParam)
+    assert len(voting.computeVotingMax(voteData, voting.getMaxParam())["locs"]) == 0
+
+def test_block_size_does_not_change_pairs():
+    wavData = randomFeatures(40)
+    whole = triangulation.computeTriangles(wavData)
+    blocks = triangulation.computeTriangles(wavData, dict(triangulation.getTriParam(), blockSize=7))
+    assert len(whole["gamma"]) == 40 * 39 // 2
+    for key in ["gamma", "displacement", "sym_wmp", "sym_wgt", "sym_hst", "sym_clr", "pairs"]:
+        np.testing.assert_array_equal(whole[key], blocks[key])
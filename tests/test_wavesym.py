@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+import wavelet
+import wavesym
+
+# A flat image (or a flat crop of recursiveSym) has no wavelet features and no axes, it must not raise
+@pytest.mark.parametrize("shape", [(64, 64, 3), (64, 64)])
+def test_blank_image_has_no_axes(shape):
+    image = np.full(shape, 128, dtype=np.uint8)
+    wavData = wavesym.detectFeatures(image)
+    assert len(wavData["x"]) == 0
+    assert wavData["hC"].shape == (0, 32)
+    assert wavData["v"].shape == (0, 32)
+    assert len(wavesym.symBilOurCentLogGaborHSV(image)) == 0
+    assert len(wavesym.symRegion(wavData, image.shape, (0, 0, 32, 32))) == 0
+
+def test_color_histograms_without_features():
+    image = np.zeros((20, 20, 3), dtype=np.uint8)
+    hC = wavelet.colorHistograms(image, np.zeros(0, dtype=int), np.zeros(0, dtype=int), 2)
+    assert hC.shape == (0, 32)
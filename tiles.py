@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from matplotlib import image as mpimage
+
+import instrument
+import util
+import wavelet
+
+# Tiled wavelet feature extraction for images too large to transform at once
+# The image is read from a memory-mapped raw copy (.npy) and the Log-Gabor responses are computed one overlapping
+# tile of tileSize x tileSize pixels at a time, so memory depends on the tile size instead of the image size.
+# Every feature window belongs to the tile its center lies in, windows in the overlap of two tiles are only taken from
+# that tile. The windows of all tiles are merged into the window grid of the whole image before the features are
+# selected, so the features are in the coordinates of the whole image, as computeWaveletCoeffLogGabor returns them
+
+# Memory-mapped raw copy of the image at path, resized by resize, saved in rawDir
+# The raw copy is named after a hash of the absolute path, size and modification time of the image, so images with the
+# same name in different folders get their own copy and a changed image is converted again (its old copy is left in rawDir)
+# The image is decoded and resized once, later runs map the raw copy.
+# This first conversion decodes and resizes the whole image in memory, as loadImage does without --tiled:
+# JPEG and PNG images can not be decoded in parts, so its memory still depends on the image size
+def openRaw(path, rawDir, resize):
+    stat = os.stat(path)
+    key = hashlib.sha256(json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns]).encode()).hexdigest()[:16]
+    rawPath = os.path.join(rawDir, os.path.basename(path) + "-" + key + "-" + ("%g" % resize) + ".npy")
+    if not os.path.isfile(rawPath):
+        os.makedirs(rawDir, exist_ok=True)
+        data = util.resize_image(mpimage.imread(path), resize)
+        # Written next to the raw copy and renamed, so an interrupted conversion is never mapped
+        tmpPath = rawPath + "." + str(os.getpid()) + ".tmp.npy"
+        raw = np.lib.format.open_memmap(tmpPath, mode="w+", dtype=data.dtype, shape=data.shape)
+        raw[:] = data
+        raw.flush()
+        del raw
+        os.replace(tmpPath, rawPath)
+    return np.load(rawPath, mmap_mode="r")
+
+# Pixels around a tile that are transformed with it, so the responses inside the tile are not affected by its edges:
+# the half window of a feature and three times the longest wavelength of the filter bank
+def tileMargin(wavParam):
+    longest = wavParam["minWaveLength"] * wavParam["mult"]**(wavParam["nScls"] - 1)
+    return wavParam["halfWindowSize"] + int(np.ceil(3 * longest))
+
+# Tiles along an axis of n pixels, as (start, end) of the pixels a tile owns and (start, end) of the pixels it reads
+# (0-based, end exclusive). All tiles read tileSize pixels, the tileSize - 2 * margin pixels they own and the margin on
+# both sides. Outside of the image they wrap around like the Fourier transform of the whole image does.
+# An axis that fits in one tile is read as a whole
+def tileSpans(n, tileSize, margin):
+    if n <= tileSize:
+        return [(0, n, 0, n)]
+    step = tileSize - 2 * margin
+    if step < 1:
+        raise ValueError("Tiles of " + str(tileSize) + " pixels are too small for a margin of " + str(margin) + " pixels")
+    return [(start, min(start + step, n), start - margin, start - margin + tileSize) for start in range(0, n, step)]
+
+# Wavelet features of an image (or a memory-mapped image) computed tile by tile
+# Returns wavData like computeWaveletCoeffLogGabor on the whole image
+@instrument.traced
+def tiledFeatures(image, wavParam, tileSize):
+    rows, cols = image.shape[0:2]
+    winRows, winCols = wavelet.windowCenters(rows, cols, wavParam)
+    nr = len(winRows)
+    nc = len(winCols)
+    precision = wavParam["precision"]
+    windows = {
+        "C": np.zeros((nr, nc), dtype=precision),
+        "A": np.zeros((nr, nc), dtype=precision),
+        "X": np.zeros((nr, nc), dtype=int),
+        "Y": np.zeros((nr, nc), dtype=int),
+        "SC": np.zeros((nr, nc), dtype=int),
+        "V": np.zeros((nr, nc, wavParam["histBinNumT"]), dtype=precision),
+        "VI": np.zeros((nr, nc), dtype=int)
+    }
+
+    margin = tileMargin(wavParam)
+    tiles = 0
+    for rowStart, rowEnd, readTop, readBottom in tileSpans(rows, tileSize, margin):
+        tileRows = (winRows > rowStart) & (winRows <= rowEnd)
+        for colStart, colEnd, readLeft, readRight in tileSpans(cols, tileSize, margin):
+            tileCols = (winCols > colStart) & (winCols <= colEnd)
+            if not tileRows.any() or not tileCols.any():
+                continue
+            tile = image[np.ix_(np.arange(readTop, readBottom) % rows, np.arange(readLeft, readRight) % cols)]
+            ampM, angM, sclM = wavelet.reduceLogGaborResponses(wavelet.grayImage(tile, wavParam), wavParam)
+            tileWindows = wavelet.windowMaxima(ampM, angM, sclM, winRows[tileRows] - readTop, winCols[tileCols] - readLeft, wavParam)
+            tileWindows["X"] += readTop
+            tileWindows["Y"] += readLeft
+            for key, value in tileWindows.items():
+                windows[key][np.ix_(tileRows, tileCols)] = value
+            tiles += 1
+
+    wavData = wavelet.selectFeatures(windows, image, wavParam)
+    instrument.record(height=rows, width=cols, tiles=tiles, featurePoints=len(wavData["x"]))
+    return wavData
@@ -0,0 +1,223 @@
+import numpy as np
+
+# Python port of libs/sym/computeTriangles.m
+# Pairs are processed in blocks of array operations instead of one at a time,
+# so the memory for intermediate results only depends on the block size
+
+# Approximate triangulation, set from parameters.py by the numpy backend
+# Pairs that can not get a vote of at least tolerance are skipped, 0 evaluates every pair
+tolerance = 0
+# Fraction of the skipped pairs that is evaluated anyway, chosen at random, their votes count 1 / sampleFraction times
+sampleFraction = 0
+# Floating point type of the pair arrays, set from parameters.py by the numpy backend
+precision = "float64"
+
+# Default triangulation parameters
+# blockSize is the number of pairs processed at once
+# tolerance, orientationBuckets, sampleFraction and seed control the approximate triangulation, see computeTriangles
+# precision is the floating point type of the symmetry measures of the pairs
+def getTriParam():
+    triParam = {
+        "blockSize": 16384,
+        "tolerance": tolerance,
+        "orientationBuckets": 8,
+        "sampleFraction": sampleFraction,
+        "seed": 0,
+        "precision": precision
+    }
+    return triParam
+
+# Angle of vectors given their cosine and sine, in [0, 2pi)
+# Port of libs/util/ang.m
+def ang(cx, sx):
+    return np.where(sx >= 0, np.arccos(cx), np.arccos(-cx) + np.pi)
+
+# Indices (j, k) of the pairs start to end in the order of the MATLAB double loop:
+# (0, 1), (0, 2), ..., (0, s-1), (1, 2), ..., (s-2, s-1)
+def pairIndices(s, start, end):
+    idx = np.arange(start, end, dtype=np.int64)
+    j = np.arange(s, dtype=np.int64)
+    rowStart = j * (2 * s - j - 1) // 2
+    j = np.searchsorted(rowStart, idx, side="right") - 1
+    k = idx - rowStart[j] + j + 1
+    return j, k
+
+# Axis angle, axis offset and weak mirror potential of the pairs j, k of features at locs with orientations tau
+def pairGeometry(locs, tau, j, k):
+    p = locs[j]
+    q = locs[k]
+    taup = tau[j]
+    tauq = tau[k]
+
+    T_pq = (q - p) / np.sqrt(np.sum((q - p)**2, axis=1))[:, None]
+    theta = ang(-T_pq[:, 1], T_pq[:, 0])
+    # Weak mirror potential |tauq' * S * taup| with S the reflection matrix over the perpendicular of pq
+    cos2 = np.cos(2 * theta)
+    sin2 = np.sin(2 * theta)
+    wmp = np.abs(tauq[:, 0] * (cos2 * taup[:, 0] + sin2 * taup[:, 1]) + tauq[:, 1] * (sin2 * taup[:, 0] - cos2 * taup[:, 1]))
+
+    d = np.where((T_pq[:, 1] < 0)[:, None], -T_pq, T_pq)
+    gamma = np.arctan2(d[:, 1], d[:, 0])
+    displacement = np.sum((p + q) / 2 * d, axis=1)
+    return gamma, displacement, wmp
+
+# Buckets of features with about the same orientation and the same dominant colour histogram bin
+# Returns the bucket of every feature and estimate, the sym_clr * sym_hst expected for a pair with its first feature
+# in bucket b1 and second feature in bucket b2, estimate[b1, b2], from the mean histograms of the two buckets
+def bucketEstimates(a, hC, vRolled, vMirrored, orientationBuckets):
+    orientation = np.clip(((np.asarray(a) + np.pi / 2) / np.pi * orientationBuckets).astype(int), 0, orientationBuckets - 1)
+    _, bucket = np.unique(orientation * hC.shape[1] + np.argmax(np.nan_to_num(hC), axis=1), return_inverse=True)
+    bucket = bucket.ravel()
+    counts = np.bincount(bucket)[:, None]
+
+    # Mean histograms of every bucket, missing (NaN) bins count as empty
+    def bucketMean(hist):
+        sums = np.zeros((len(counts), hist.shape[1]))
+        np.add.at(sums, bucket, np.nan_to_num(hist))
+        return sums / counts
+
+    meanC = bucketMean(hC)
+    clr = np.sum(np.minimum(meanC[:, None, :], meanC[None, :, :]), axis=2)
+    hst = np.sum(np.minimum(bucketMean(vRolled)[:, None, :], bucketMean(vMirrored)[None, :, :]), axis=2)
+    return bucket, clr * hst
+
+# Compute the symmetry candidate of every pair of wavelet features
+# Returns triData, a dict with the fields of the MATLAB struct:
+# gamma (axis angle), displacement (axis offset), sym_wmp (weak mirror potential), sym_wgt (magnitude weight),
+# sym_hst (orientation histogram intersection), sym_clr (colour histogram intersection)
+# Instead of the p / q cells, pairs holds the (j, k) feature indices of every pair and locs the feature locations
+# With a tolerance above 0 pairs with an estimated vote (sym_clr * sym_wmp * sym_hst) below tolerance are skipped.
+# Features are bucketed on orientation and colour (see bucketEstimates), pairs of buckets whose mean histograms
+# do not reach the tolerance are skipped before anything is computed. The orientations of a pair only constrain the
+# direction between its features, so that is checked per pair with the weak mirror potential, before the histograms.
+# Higher tolerances skip more pairs, and more of the pairs that would have voted for an axis.
+# With a sampleFraction, that fraction of the skipped pairs is evaluated as well and triData gets a weight
+# of 1 / sampleFraction for them (1 for the others), so the skipped votes are still counted on average
+def computeTriangles(wavData, triParam=None):
+    if triParam is None:
+        triParam = getTriParam()
+    if triParam["tolerance"] > 0:
+        return computeTrianglesApprox(wavData, triParam)
+    blockSize = triParam["blockSize"]
+
+    s = len(wavData["m"])
+    npairs = s * (s - 1) // 2
+    precision = triParam["precision"]
+    gamma = np.zeros(npairs, dtype=precision)
+    displacement = np.zeros(npairs, dtype=precision)
+    sym_wmp = np.zeros(npairs, dtype=precision)
+    sym_wgt = np.zeros(npairs, dtype=precision)
+    sym_hst = np.zeros(npairs, dtype=precision)
+    sym_clr = np.zeros(npairs, dtype=precision)
+    pairs = np.zeros((npairs, 2), dtype=np.int32)
+
+    locs, tau, m, hC, vRolled, vMirrored = pairInputs(wavData, precision)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, npairs, blockSize):
+            end = min(start + blockSize, npairs)
+            j, k = pairIndices(s, start, end)
+            gamma[start:end], displacement[start:end], sym_wmp[start:end] = pairGeometry(locs, tau, j, k)
+            sym_wgt[start:end] = m[j] * m[k]
+            # fmin ignores NaN bins like MATLAB's min does
+            sym_hst[start:end] = np.sum(np.fmin(vRolled[j], vMirrored[k]), axis=1)
+            sym_clr[start:end] = np.sum(np.fmin(hC[j], hC[k]), axis=1)
+            pairs[start:end, 0] = j
+            pairs[start:end, 1] = k
+
+    triData = {
+        "gamma": gamma,
+        "displacement": displacement,
+        "sym_wmp": sym_wmp,
+        "sym_wgt": sym_wgt,
+        "sym_hst": sym_hst,
+        "sym_clr": sym_clr,
+        "pairs": pairs,
+        "locs": locs
+    }
+    return triData
+
+# Per feature inputs of the pairs: locations, orientation vectors, magnitudes, colour and orientation histograms
+# All in the floating point type precision
+# The histograms are reshaped to their own number of bins, so an image without features gives (0, nBins) arrays
+def pairInputs(wavData, precision):
+    s = len(wavData["m"])
+    locs = np.column_stack([wavData["x"], wavData["y"]]).astype(precision)
+    a = np.asarray(wavData["a"], dtype=precision)
+    tau = np.column_stack([np.cos(a), np.sin(a)])
+    m = np.asarray(wavData["m"], dtype=precision)
+    hC = np.asarray(wavData["hC"], dtype=precision)
+    hC = hC.reshape(s, hC.shape[-1])
+
+    # Orientation histograms rotated to start at their dominant orientation,
+    # the second one is mirrored so that a histogram intersection measures mirror symmetry
+    v = np.asarray(wavData["v"], dtype=precision)
+    v = v.reshape(s, v.shape[-1])
+    vi = np.asarray(wavData["vi"], dtype=np.int64)
+    nBins = v.shape[1]
+    bins = np.arange(nBins)
+    vRolled = np.take_along_axis(v, (vi[:, None] - 1 + bins) % nBins, axis=1)
+    vMirrored = np.take_along_axis(v, (vi[:, None] - 1 - bins) % nBins, axis=1)
+    return locs, tau, m, hC, vRolled, vMirrored
+
+# computeTriangles with a tolerance, only the pairs that pass the estimates (and the sampled pairs) are returned,
+# in the same order as computeTriangles
+def computeTrianglesApprox(wavData, triParam):
+    blockSize = triParam["blockSize"]
+    tol = triParam["tolerance"]
+    fraction = triParam["sampleFraction"]
+    rng = np.random.default_rng(triParam["seed"])
+
+    s = len(wavData["m"])
+    npairs = s * (s - 1) // 2
+    locs, tau, m, hC, vRolled, vMirrored = pairInputs(wavData, triParam["precision"])
+    bucket, estimate = bucketEstimates(wavData["a"], hC, vRolled, vMirrored, triParam["orientationBuckets"])
+
+    blocks = []
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, npairs, blockSize):
+            end = min(start + blockSize, npairs)
+            j, k = pairIndices(s, start, end)
+            pairEstimate = estimate[bucket[j], bucket[k]]
+            sampled = rng.random(end - start) < fraction if fraction > 0 else np.zeros(end - start, dtype=bool)
+            candidates = (pairEstimate >= tol) | sampled
+            j, k, pairEstimate, sampled = j[candidates], k[candidates], pairEstimate[candidates], sampled[candidates]
+
+            gamma, displacement, wmp = pairGeometry(locs, tau, j, k)
+            # NaN measures are kept, removeNanPairs removes them
+            passed = ~(wmp * pairEstimate < tol)
+            keep = passed | sampled
+            j, k = j[keep], k[keep]
+            blocks.append({
+                "gamma": gamma[keep],
+                "displacement": displacement[keep],
+                "sym_wmp": wmp[keep],
+                "sym_wgt": m[j] * m[k],
+                "sym_hst": np.sum(np.fmin(vRolled[j], vMirrored[k]), axis=1),
+                "sym_clr": np.sum(np.fmin(hC[j], hC[k]), axis=1),
+                "pairs": np.column_stack([j, k]).astype(np.int32),
+                "weight": np.where(passed[keep], 1, 1 / fraction if fraction > 0 else 1).astype(triParam["precision"])
+            })
+
+    keys = ["gamma", "displacement", "sym_wmp", "sym_wgt", "sym_hst", "sym_clr", "pairs", "weight"]
+    if len(blocks) == 0:
+        triData = {key: np.zeros(0, dtype=triParam["precision"]) for key in keys}
+        triData["pairs"] = np.zeros((0, 2), dtype=np.int32)
+    else:
+        triData = {key: np.concatenate([block[key] for block in blocks]) for key in keys}
+    triData["locs"] = locs
+    if fraction == 0:
+        del triData["weight"]
+    return triData
+
+# Remove pairs for which any of the symmetry measures could not be computed
+def removeNanPairs(triData):
+    keys = ["sym_wmp", "sym_hst", "sym_wgt", "sym_clr", "displacement", "gamma"]
+    keep = np.ones(len(triData["gamma"]), dtype=bool)
+    for key in keys:
+        keep &= ~np.isnan(triData[key])
+    if keep.all():
+        return triData
+    for key in keys + ["pairs"] + (["weight"] if "weight" in triData else []):
+        triData[key] = triData[key][keep]
+    return triData
@@ -0,0 +1,117 @@
+# Report on the approximate triangulation (tolerance and sampleFraction in parameters.py)
+# Every image is voted on once with all pairs and once for every combination of tolerance and sample fraction,
+# the peaks of the voting space (the reflection axes before post-processing) are compared to those of the exhaustive vote
+# Usage:
+# python triangulationreport.py
+# arguements:
+# --input "custom input folder" (default: ./input/)
+# --tolerances "values of triangulationTolerance to compare" (default: 0.02 0.05 0.1 0.2)
+# --sample-fractions "values of triangulationSample to compare" (default: 0 0.1)
+# --match-bins "distance in bins of the voting space within which two peaks are the same" (default: 5)
+# --top "number of strongest exhaustive peaks topRecall is computed for" (default: 10)
+# --output "csv file to save the results table in" (default: ./triangulation.csv)
+# Columns, averaged over the images: pairs (fraction of the pairs evaluated), speedup (of the triangulation and
+# the projection into the voting space), recall and topRecall (fraction of the exhaustive peaks found again),
+# precision (fraction of the found peaks that are exhaustive peaks), locError (bins between matched peaks),
+# scoreError and normScoreError (relative difference of the scores and normalized scores of matched peaks)
+
+from matplotlib import image
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import parameters
+import triangulation
+import util
+import voting
+import wavesym
+
+# Peaks and scores of the voting space of the features of an image, with the time taken by triangulation and projection
+def votePeaks(wavData, shape, triParam):
+    start = time.perf_counter()
+    triData = triangulation.computeTriangles(wavData, triParam)
+    triData = triangulation.removeNanPairs(triData)
+    voteData = voting.computeVotingProj(triData, voting.getVoteParam(shape))
+    seconds = time.perf_counter() - start
+    maxData = voting.computeVotingMax(voteData, voting.getMaxParam())
+    locs = maxData["locs"]
+    scores = maxData["voteMapBlur"][locs[:, 0] - 1, locs[:, 1] - 1] if len(locs) else np.zeros(0)
+    return {"locs": locs, "scores": scores, "pairs": len(triData["gamma"]), "seconds": seconds}
+
+# Greedy one to one matching of the peaks of an approximate vote to the exhaustive peaks, strongest exhaustive peak first
+# The angle axis of the voting space wraps around
+# Returns the (exhaustive, approximate) index pairs of matched peaks, and their distances in bins
+def matchPeaks(exact, approx, accheight, matchBins):
+    matched = []
+    distances = []
+    used = np.zeros(len(approx["locs"]), dtype=bool)
+    for i in np.argsort(-exact["scores"], kind="stable"):
+        if len(approx["locs"]) == 0:
+            break
+        diff = np.abs(approx["locs"] - exact["locs"][i]).astype(float)
+        diff[:, 0] = np.minimum(diff[:, 0], accheight - diff[:, 0])
+        dist = np.sqrt(np.sum(diff**2, axis=1))
+        dist[used] = np.inf
+        j = np.argmin(dist)
+        if dist[j] <= matchBins:
+            used[j] = True
+            matched.append((i, j))
+            distances.append(dist[j])
+    return matched, distances
+
+# Compare an approximate vote of an image to the exhaustive vote
+def comparePeaks(exact, approx, totalPairs, matchBins, top):
+    matched, distances = matchPeaks(exact, approx, voting.getVoteParam((1, 1))["accheight"], matchBins)
+    topPeaks = set(np.argsort(-exact["scores"], kind="stable")[:top])
+    exactScores = np.array([exact["scores"][i] for i, _ in matched])
+    approxScores = np.array([approx["scores"][j] for _, j in matched])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        exactNorm = exactScores / exact["scores"].max() if len(exact["scores"]) else exactScores
+        approxNorm = approxScores / approx["scores"].max() if len(approx["scores"]) else approxScores
+        return {
+            "pairs": approx["pairs"] / totalPairs if totalPairs else 1.0,
+            "speedup": exact["seconds"] / approx["seconds"],
+            "recall": len(matched) / len(exact["locs"]) if len(exact["locs"]) else 1.0,
+            "topRecall": sum(i in topPeaks for i, _ in matched) / len(topPeaks) if topPeaks else 1.0,
+            "precision": len(matched) / len(approx["locs"]) if len(approx["locs"]) else 1.0,
+            "locError": np.mean(distances) if distances else np.nan,
+            "scoreError": np.mean(np.abs(approxScores - exactScores) / exactScores) if matched else np.nan,
+            "normScoreError": np.mean(np.abs(approxNorm - exactNorm) / exactNorm) if matched else np.nan
+        }
+
+# Fastest of repeat votes, the triangulation of a single image takes only milliseconds
+def fastestVote(wavData, shape, triParam, repeat):
+    runs = [votePeaks(wavData, shape, triParam) for _ in range(repeat)]
+    return min(runs, key=lambda run: run["seconds"])
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="./input/", help="Custom input folder (default: ./input/)")
+    parser.add_argument("--tolerances", nargs="+", type=float, default=[0.02, 0.05, 0.1, 0.2], help="Values of triangulationTolerance to compare (default: 0.02 0.05 0.1 0.2)")
+    parser.add_argument("--sample-fractions", nargs="+", type=float, default=[0, 0.1], help="Values of triangulationSample to compare (default: 0 0.1)")
+    parser.add_argument("--match-bins", default=5, type=float, help="Distance in bins within which two peaks are the same (default: 5)")
+    parser.add_argument("--top", default=10, type=int, help="Number of strongest exhaustive peaks for topRecall (default: 10)")
+    parser.add_argument("--output", default="./triangulation.csv", help="Csv file to save the results in (default: ./triangulation.csv)")
+    args = parser.parse_args()
+    repeat = 3
+
+    rows = []
+    for name in util.listImages(args.input, '.jpg'):
+        data = util.resize_image(image.imread(args.input + name), parameters.resize)
+        wavData = wavesym.detectFeatures(data)
+        s = len(wavData["x"])
+        exact = fastestVote(wavData, data.shape, dict(triangulation.getTriParam(), tolerance=0), repeat)
+        print(name, s, "features,", len(exact["locs"]), "peaks")
+        for tolerance in args.tolerances:
+            for fraction in args.sample_fractions:
+                triParam = dict(triangulation.getTriParam(), tolerance=tolerance, sampleFraction=fraction)
+                approx = fastestVote(wavData, data.shape, triParam, repeat)
+                rows.append(dict(image=name, tolerance=tolerance, sampleFraction=fraction,
+                                 **comparePeaks(exact, approx, s * (s - 1) // 2, args.match_bins, args.top)))
+
+    results = pd.DataFrame(rows).groupby(["tolerance", "sampleFraction"]).mean(numeric_only=True).reset_index()
+    results.to_csv(args.output, index=False)
+    print(results.to_string())
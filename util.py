@@ -1,9 +1,9 @@
 import os
-import cv2
+import json
 import numpy as np
-import pandas as pd
-from matplotlib import pyplot as plt
 import preprocess
+import instrument
+from symmetrytable import SymmetryTable
 
 # Return a list of all image names with a given extension in a given folder
 def listImages(dir, extension):
@@ -76,15 +76,38 @@ def minDistance(intersect, line1, line2):
 
     return (min(dist1, dist2, dist3, dist4))
 
+# Symmetries as a SymmetryTable, lists in the format [[[line], slope, score, normScore, depth], ...] are converted
+# All post-processing functions accept both a SymmetryTable and a list
+def asTable(symmetries):
+    if isinstance(symmetries, SymmetryTable):
+        return symmetries
+    return SymmetryTable.fromList(symmetries)
+
+# Symmetries where keep is True, as a SymmetryTable or a list like the given symmetries
+def selectSymmetries(symmetries, keep):
+    if isinstance(symmetries, SymmetryTable):
+        return symmetries[np.asarray(keep, dtype=bool)]
+    return [sym for sym, k in zip(symmetries, keep) if k]
+
+# Join the symmetries of multiple recursive loops, SymmetryTables are concatenated
+def joinSymmetries(parts):
+    if len(parts) > 0 and all(isinstance(part, SymmetryTable) for part in parts):
+        return SymmetryTable.concatenate(parts)
+    newSymmetries = []
+    for part in parts:
+        newSymmetries += list(part)
+    return newSymmetries
+
 # Used to reorder symmetries for ease of processing 
 # from:
-# [[[[[line], slope, score, normScore, depth], ...], depth] ... ]
+# [[symmetries, depth] ... ], with the symmetries of every recursive loop as a SymmetryTable or a list
 # To:
-# [[[line], slope, score, normScore, depth], ...]
+# one SymmetryTable (or [[[line], slope, score, normScore, depth], ...] for lists)
+# The node of every symmetry in a SymmetryTable is set to the index of its recursive loop
 def placeInOrder(symmetries):
-    newSymmetries = []
-    for syms in symmetries:
-        newSymmetries += syms[0]
+    newSymmetries = joinSymmetries([syms[0] for syms in symmetries])
+    if isinstance(newSymmetries, SymmetryTable):
+        newSymmetries.node[:] = np.repeat(np.arange(len(symmetries)), [len(syms[0]) for syms in symmetries])
     return newSymmetries
 
 # Only required when cuts are made before knowing symThreshold (Ipynb kernel)
@@ -96,7 +119,7 @@ def removeBadCuts(symmetries, symThreshold):
     deleteDepth = 99999
     for syms in symmetries:
         if syms[1] == 0:
-            newSymmetries += syms[0]
+            newSymmetries.append(syms[0])
             continue
         if syms[1] >= deleteDepth:
             symmetries.remove(syms)
@@ -109,109 +132,175 @@ def removeBadCuts(symmetries, symThreshold):
                 symmetries.remove(syms)
                 continue
             else:
-                newSymmetries += syms[0]
-    return newSymmetries
+                newSymmetries.append(syms[0])
+    return joinSymmetries(newSymmetries)
+
+# Greedy suppression of similar candidates in list order, as in a double loop over the remaining candidates
+# points are looked up in a grid of cells of size radius: every remaining candidate i is only compared to the
+# remaining candidates j > i in its own and the eight neighbouring cells, all points within radius in x and y
+# similar(i, js) tells which of these candidates are similar to i, removeFirst(i, js) if i is removed instead of j
+# i removes its similar candidates in order, until it is removed itself
+# Candidates with non finite points are never similar
+# The number of compared pairs is recorded as comparisons in the trace event of the caller
+# Returns a boolean mask of the removed candidates
+def suppressSimilar(points, radius, similar, removeFirst):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    removed = np.zeros(len(points), dtype=bool)
+    if not radius > 0:
+        return removed
+    idx = np.nonzero(np.isfinite(points).all(axis=1))[0]
+    cells = np.floor(points[idx] / radius).astype(np.int64)
+    order = np.lexsort((idx, cells[:, 1], cells[:, 0]))
+    keys, starts, counts = np.unique(cells[order], axis=0, return_index=True, return_counts=True)
+    grid = {(x, y): members for (x, y), members in zip(keys.tolist(), np.split(idx[order], starts[1:]))}
+
+    # Candidates without any other candidate in the neighbouring cells are skipped
+    if len(keys) > 0:
+        low = keys.min(axis=0) - 1
+        span = keys[:, 1].max() - low[1] + 2
+        code = (keys[:, 0] - low[0]) * span + keys[:, 1] - low[1]
+        cellCode = (cells[:, 0] - low[0]) * span + cells[:, 1] - low[1]
+        near = np.zeros(len(idx), dtype=np.int64)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                pos = np.minimum(np.searchsorted(code, cellCode + dx * span + dy), len(code) - 1)
+                near += np.where(code[pos] == cellCode + dx * span + dy, counts[pos], 0)
+        keep = near > 1
+        idx, cells = idx[keep], cells[keep]
+
+    comparisons = 0
+    for i, (x, y) in zip(idx.tolist(), cells.tolist()):
+        if removed[i]:
+            continue
+        js = []
+        for key in [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]:
+            members = grid.get(key)
+            if members is None:
+                continue
+            # Drop removed candidates from the grid as they are found
+            if removed[members].any():
+                members = members[~removed[members]]
+                grid[key] = members
+            js.append(members[members > i])
+        js = np.sort(np.concatenate(js))
+        if len(js) == 0:
+            continue
+        comparisons += len(js)
+        js = js[similar(i, js)]
+        if len(js) == 0:
+            continue
+        first = removeFirst(i, js)
+        if first.any():
+            k = np.argmax(first)
+            removed[js[:k]] = True
+            removed[i] = True
+        else:
+            removed[js] = True
+    instrument.record(comparisons=comparisons)
+    return removed
 
 # Remove symmetries if they have a normalized score under normThreshold
 # or if they have a normalized score of 1.0 and a score under symThreshold, i.e. are the main symmetry in their recursive loop (sub image)
 # If a main symmetry is removed, all other symmetries in that recursive loop are also removed, 
 # by removing next symmetries untill they have a different depth, meaning they belong to a different loop
+@instrument.traced
 def removeBadSymmetries(symmetries, symThreshold, normThreshold):
-    copySym = symmetries[:]
-
-    # Start from one, always keep first symmetry
-    for i in range(1, len(symmetries)):
-        if symmetries[i] not in copySym:
-            continue
-        if symmetries[i][3] < normThreshold:
-            copySym.remove(symmetries[i])
-        elif symmetries[i][3] == 1.0:
-            if symmetries[i][2] < symThreshold:
-                copySym.remove(symmetries[i])
-                j = i + 1
-                if j >= len(symmetries):
-                    break
-                while (symmetries[i][4] == symmetries[j][4]):
-                    if symmetries[j] not in copySym:
-                        j = j + 1
-                        if j >= len(symmetries):
-                            break
-                        continue
-                    copySym.remove(symmetries[j])
-                    j = j + 1
-                    if j >= len(symmetries):
-                        break
-
-    return copySym
-
-# Loop over each line and compare to other lines
-# If slope is similar and the distance between endpoints is small enough, remove line with lower symmetry score
+    n = len(symmetries)
+    instrument.record(lines=n)
+    if n == 0:
+        return symmetries[:]
+    table = asTable(symmetries)
+    score = table.score
+    normScore = table.normScore
+    depth = table.depth
+    idx = np.arange(n)
+
+    # Runs of following symmetries with the same depth
+    runStart = np.maximum.accumulate(np.where(np.r_[True, depth[1:] != depth[:-1]], idx, 0))
+    bad = normScore < normThreshold
+    main = ~bad & (normScore == 1.0) & (score < symThreshold)
+    # Removed main symmetries take the rest of their run with them
+    lastMain = np.maximum.accumulate(np.where(main & (idx > 0), idx, -1))
+    removed = bad | main | ((lastMain >= 0) & (lastMain >= runStart))
+
+    # Always keep first symmetry
+    removed[0] = False
+    instrument.record(kept=int(n - removed.sum()))
+    return selectSymmetries(symmetries, ~removed)
+
+# Compare each line to the other lines
+# If slope is similar and the distance between the centers of the lines is small enough, remove line with lower symmetry score
+# The first line is never removed. Lines are compared in order and removed lines are not compared anymore
 # maxDistX and maxDistY set based on width and height of image
-# Both dictate the maximum distance between endpoints of lines
-# If line1-endpoint1 is within maxDist to line2-endpoint1
-# line1-endpoint2 only has to lie within (maxDist*0,66) line2-endpoint2 to be flagged as similar
+# Both dictate the maximum distance between line centers
+# Nearby lines are found with a grid over the line centers, so not every pair of lines is compared
+# Returns the remaining lines, a given list is also changed in place
+@instrument.traced
 def removeSimilarLines(symmetries, image, lineSimilarity):
 
     height, width, _ = image.shape
+    instrument.record(lines=len(symmetries))
 
     maxDistX = width / lineSimilarity
     maxDistY = height / lineSimilarity
     maxDist = (maxDistX + maxDistY) / 2
     maxSlopeDiff = maxDistY
 
-    copySym = symmetries[:]
-
-    def lowerScore(sym1, sym2):
-        if sym1[2] < sym2[2]:
-            return sym1
-        return sym2
-
-    for i in range(0, len(copySym)):
-        for j in range(i + 1, len(copySym)):
-            if copySym[i] not in symmetries:
-                break
-            if copySym[j] not in symmetries:
-                continue
-            if abs(copySym[i][1] - copySym[j][1]) < maxSlopeDiff or (abs(copySym[i][1]) > height / 3 and abs(copySym[j][1]) > height / 3):
-                center1 = (((copySym[i][0][0] + copySym[i][0][2]) / 2), ((copySym[i][0][1] + copySym[i][0][3]) / 2))
-                center2 = (((copySym[j][0][0] + copySym[j][0][2]) / 2), ((copySym[j][0][1] + copySym[j][0][3]) / 2))
-                dist = np.sqrt( (center1[0] - center2[0])**2 + (center1[1] - center2[1])**2 )
-                if dist < maxDist:
-                    if i == 0:
-                        symmetries.remove(copySym[j])
-                    else:
-                        symmetries.remove(lowerScore(copySym[i], copySym[j]))
+    if len(symmetries) < 2:
+        return symmetries
+    table = asTable(symmetries)
+    lines = table.line
+    slope = table.slope
+    score = table.score
+    centers = np.column_stack([(lines[:, 0] + lines[:, 2]) / 2, (lines[:, 1] + lines[:, 3]) / 2])
+
+    def similar(i, js):
+        dist = np.sqrt( (centers[i, 0] - centers[js, 0])**2 + (centers[i, 1] - centers[js, 1])**2 )
+        similarSlope = (abs(slope[i] - slope[js]) < maxSlopeDiff) | ((abs(slope[i]) > height / 3) & (abs(slope[js]) > height / 3))
+        return similarSlope & (dist < maxDist)
+
+    # Remove line with lower symmetry score, but never the first line
+    def removeFirst(i, js):
+        return (i != 0) & (score[i] < score[js])
+
+    removed = suppressSimilar(centers, maxDist, similar, removeFirst)
+    instrument.record(kept=int(len(removed) - removed.sum()))
+
+    # Lists are changed in place, tables can not change size so a new table is returned
+    if isinstance(symmetries, SymmetryTable):
+        return symmetries[~removed]
+    symmetries[:] = selectSymmetries(symmetries, ~removed)
     return symmetries
 
 # Remove similar rotational symmetries
 # Remove if centerpoint is within maxDistX and maxDistY and the radius is within max(maxDistX, maxDistY)
-# Rotation symmetry which has the highest avarage depth is removed
-# Average depth is calculated based on the depth of the two reflection lines that form the rotational symmetry
+# Rotation symmetry with the smaller radius is removed
+# Rotations are compared in order and removed rotations are not compared anymore
+@instrument.traced
 def removeSimilarRotational(rotations, image, rotationSimilarity):
     height, width, _ = image.shape
+    instrument.record(rotations=len(rotations))
 
     maxDistX = width / rotationSimilarity
     maxDistY = height / rotationSimilarity
-    copyRot = rotations[:]
-
-    def removeRot(rot1, rot2):
-        # i=1 -> Remove rotaional with smaller radius 
-        # i=2 -> Remove rotational with lower average scores of reflection symmetries that made the rotation:
-        i = 1
-        if rot1[i] < rot2[i]:
-            return rot1
-        return rot2
-
-    for i in range(0, len(copyRot)):
-        for j in range(i + 1, len(copyRot)):
-            if copyRot[i] not in rotations:
-                break
-            if copyRot[j] not in rotations:
-                continue
-            if abs(copyRot[i][0][0] - copyRot[j][0][0]) < maxDistX:
-                if abs(copyRot[i][0][1] - copyRot[j][0][1]) < maxDistY:
-                    if abs(copyRot[i][1] - copyRot[j][1]) < max(maxDistX, maxDistY):
-                        rotations.remove(removeRot(copyRot[i], copyRot[j]))
+
+    if len(rotations) < 2:
+        return
+    centers = np.array([rot[0] for rot in rotations], dtype=float).reshape(-1, 2)
+    radius = np.array([rot[1] for rot in rotations], dtype=float)
+
+    def similar(i, js):
+        return (abs(centers[i, 0] - centers[js, 0]) < maxDistX) & (abs(centers[i, 1] - centers[js, 1]) < maxDistY) & \
+            (abs(radius[i] - radius[js]) < max(maxDistX, maxDistY))
+
+    # Remove rotational symmetry with smaller radius
+    def removeFirst(i, js):
+        return radius[i] < radius[js]
+
+    removed = suppressSimilar(centers, max(maxDistX, maxDistY), similar, removeFirst)
+    instrument.record(kept=int(len(removed) - removed.sum()))
+
+    rotations[:] = [rot for rot, r in zip(rotations, removed) if not r]
 
 # Checks if distance between intersection point and endpoints of reflection lines is similar enough
 # Used to calculate rotational symmetries with a non ML approach
@@ -236,50 +325,77 @@ def checkDistance(intersect, line1, line2, distDifference):
         return False
     return True
 
-# Find rotaional symmetries with a given machine learning model
-# Will loop over each reflection symmetry in a double loop and check if any have intersections
-# Pairs with intersections will be pre-processed and subsequently predicted by the model
+# Intersections of line segments in A and B, arrays of x1, y1, x2, y2 on the last axis that broadcast together
+# Same test and arithmetic as line_intersect, for all segments at once
+# Returns a boolean array of intersecting segments and the x, y of the intersections (NaN or meaningless where not intersecting)
+def intersectSegments(A, B):
+    Ax1, Ay1, Ax2, Ay2 = np.moveaxis(np.asarray(A, dtype=float), -1, 0)
+    Bx1, By1, Bx2, By2 = np.moveaxis(np.asarray(B, dtype=float), -1, 0)
+    d = (By2 - By1) * (Ax2 - Ax1) - (Bx2 - Bx1) * (Ay2 - Ay1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        uA = ((Bx2 - Bx1) * (Ay1 - By1) - (By2 - By1) * (Ax1 - Bx1)) / d
+        uB = ((Ax2 - Ax1) * (Ay1 - By1) - (Ay2 - Ay1) * (Ax1 - Bx1)) / d
+        x = Ax1 + uA * (Ax2 - Ax1)
+        y = Ay1 + uA * (Ay2 - Ay1)
+    hit = (d != 0) & (0 <= uA) & (uA <= 1) & (0 <= uB) & (uB <= 1)
+    return hit, x, y
+
+# Intersections of all pairs of line segments, lines is an (n, 4) array of x1, y1, x2, y2
+# Computed with intersectSegments on blocks of rows of the pair matrix at once
+# Returns the indices i < j of the intersecting pairs, in the order of a double loop over i and j,
+# and their intersections as an (k, 2) array
+def lineIntersections(lines, blockSize=2**20):
+    lines = np.asarray(lines, dtype=float).reshape(-1, 4)
+    n = len(lines)
+    iAll, jAll, xyAll = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)], [np.zeros((0, 2))]
+    rows = max(1, blockSize // max(n, 1))
+    for start in range(0, n, rows):
+        i = np.arange(start, min(start + rows, n))
+        hit, x, y = intersectSegments(lines[i, None, :], lines[None, :, :])
+        hit &= np.arange(n)[None, :] > i[:, None]
+        hi, hj = np.nonzero(hit)
+        iAll.append(i[hi])
+        jAll.append(hj)
+        xyAll.append(np.column_stack([x[hi, hj], y[hi, hj]]))
+    return np.concatenate(iAll), np.concatenate(jAll), np.concatenate(xyAll)
+
+# Finds rotational symmetries with the machine learning model
+# Every pair of reflection symmetries is checked for an intersection (see lineIntersections)
+# Intersecting pairs are pre-processed and predicted by the model in one batch
 # Positive results will create a rotational symmetry in their centerpoint
-# The radius is determined by the minDistance function
-# Reflection symmetries which create a rotational symmetrie are removed afterwards
-# Will not be executed in 'fast' mode
+# The radius is the minimum distance from the centerpoint to any endpoint of both lines (see minDistance)
+# Will not be executed in 'fast' mode, pandas is only imported here
+@instrument.traced
 def rotationalSymmetriesML(symmetries, model, data):
+    import pandas as pd
     h, w, _ = data.shape
     rotations = []
-    data = pd.DataFrame()
-    for i in range(0, len(symmetries)):
-        for j in range(i + 1, len(symmetries)):
-            intersect = line_intersect(symmetries[i][0][0], symmetries[i][0][1], symmetries[i][0][2], symmetries[i][0][3], symmetries[j][0][0], symmetries[j][0][1], symmetries[j][0][2], symmetries[j][0][3])
-            if intersect == None:
-                continue
-            s = pd.Series(data={
-                "line1x1": symmetries[i][0][0],
-                "line1y1": symmetries[i][0][1],
-                "line1x2": symmetries[i][0][2],
-                "line1y2": symmetries[i][0][3],
-                "line1Score": symmetries[i][2],
-                "line2x1": symmetries[j][0][0],
-                "line2y1": symmetries[j][0][1],
-                "line2x2": symmetries[j][0][2],
-                "line2y2": symmetries[j][0][3],
-                "line2Score": symmetries[j][2],
-                "height": h,
-                "width": w
-            }, name="rotation")
-            data = data.append(s, ignore_index=False)
-    if len(data) > 0:
-        cpyData = data.copy()
-        data = preprocess.preproccesData(data)
-        pred = model.predict(data)
-
-        for i in range(0, len(data)):
-            if pred[i] == True:
-                intersect = line_intersect(cpyData["line1x1"][i], cpyData["line1y1"][i], cpyData["line1x2"][i], cpyData["line1y2"][i], cpyData["line2x1"][i], cpyData["line2y1"][i], cpyData["line2x2"][i], cpyData["line2y2"][i])
-                rad = minDistance(intersect, [cpyData["line1x1"][i], cpyData["line1y1"][i], cpyData["line1x2"][i], cpyData["line1y2"][i]], [cpyData["line2x1"][i], cpyData["line2y1"][i], cpyData["line2x2"][i], cpyData["line2y2"][i]])
-                meanScore = (cpyData["line1Score"][i] + cpyData["line2Score"][i]) / 2
-                rot = [intersect, rad, meanScore]
-                rotations.append(rot)
-
+    table = asTable(symmetries)
+    lines = table.line
+    scores = table.score
+    i, j, intersects = lineIntersections(lines)
+    instrument.record(lines=len(lines), pairs=len(lines) * (len(lines) - 1) // 2, intersections=len(i))
+    if len(i) > 0:
+        columns = {}
+        for line, idx in [["line1", i], ["line2", j]]:
+            columns[line + "x1"] = lines[idx, 0]
+            columns[line + "y1"] = lines[idx, 1]
+            columns[line + "x2"] = lines[idx, 2]
+            columns[line + "y2"] = lines[idx, 3]
+            columns[line + "Score"] = scores[idx]
+        columns["height"] = np.full(len(i), h)
+        columns["width"] = np.full(len(i), w)
+        pred = model.predict(preprocess.preproccesData(pd.DataFrame(columns)))
+
+        # Distances from the intersections to the four endpoints, the smallest is the radius
+        endpoints = np.stack([lines[i, 0:2], lines[i, 2:4], lines[j, 0:2], lines[j, 2:4]])
+        rads = np.sqrt(((endpoints - intersects)**2).sum(axis=2)).min(axis=0)
+        meanScores = (scores[i] + scores[j]) / 2
+        for k in np.nonzero(pred == True)[0]:
+            rot = [(intersects[k, 0], intersects[k, 1]), rads[k], meanScores[k]]
+            rotations.append(rot)
+
+    instrument.record(rotations=len(rotations))
     return rotations
 
 # Find rotaional symmetries given reflection symmetries and a threshold
@@ -292,13 +408,16 @@ def rotationalSymmetriesML(symmetries, model, data):
 # The radius is determined by the minDistance function
 # Reflection symmetries which create a rotational symmetrie are removed afterwards
 # Will not be executed in 'slow' mode
+@instrument.traced
 def rotationalSymmetries(symmetries, image, circleSymThreshold):
     rotations = []
     tmp = []
-    copySym = symmetries[:]
+    # Lines in the list format, a SymmetryTable is converted once
+    copySym = list(symmetries)
+    instrument.record(lines=len(copySym), pairs=len(copySym)**2)
     height, width, _ = image.shape
     distDifference = min(height / 5, width / 5)
-    for sym in symmetries:
+    for sym in copySym:
         for subsym in copySym:
             # First check if lines have similar symmetry scores
             if max(sym[2], subsym[2]) * circleSymThreshold > min(sym[2], subsym[2]):
@@ -314,10 +433,13 @@ def rotationalSymmetries(symmetries, image, circleSymThreshold):
                 meanScore = (sym[2] + subsym[2]) / 2
                 rot = [intersect, rad, meanScore]
                 rotations.append(rot)
+    instrument.record(rotations=len(rotations))
     return rotations
 
 # Plot all given reflection symmetry lines
+# pyplot is only imported when plotting
 def plotLines(symmetries):
+    from matplotlib import pyplot as plt
     n = 0
     for sym in symmetries:
         if sym[4] > n:
@@ -333,14 +455,86 @@ def plotLines(symmetries):
 
 # Plot all given rotational symmetries
 def plotRotations(rotations):
+    from matplotlib import pyplot as plt
     for rot in rotations:
         circleSym = plt.Circle(rot[0], linewidth=2.5, radius=rot[1], color="yellow", fill=False)
         fig = plt.gcf()
         axs = fig.gca()
         axs.add_patch(circleSym)
 
+# Draw all given reflection symmetry lines onto an RGB image array, without opening a figure
+# Uses the same colors as plotLines
+# cv2 and matplotlib are only imported when drawing, resizing or saving images, so importing util does not wait for them
+def drawLines(image, symmetries):
+    import cv2
+    from matplotlib import cm
+    n = 0
+    for sym in symmetries:
+        if sym[4] > n:
+            n = sym[4]
+    linewidth = 3
+    colors = cm.jet(np.linspace(0,1,n + 1))
+    for sym in symmetries:
+        if not np.isfinite(sym[0]).all():
+            continue
+        color = tuple(int(c * 255) for c in colors[sym[4]][:3])
+        p1 = (int(round(sym[0][0])), int(round(sym[0][1])))
+        p2 = (int(round(sym[0][2])), int(round(sym[0][3])))
+        cv2.line(image, p1, p2, color, linewidth, cv2.LINE_AA)
+    return image
+
+# Draw all given rotational symmetries onto an RGB image array, without opening a figure
+def drawRotations(image, rotations):
+    import cv2
+    for rot in rotations:
+        center = (int(round(rot[0][0])), int(round(rot[0][1])))
+        cv2.circle(image, center, int(round(rot[1])), (255, 255, 0), 3, cv2.LINE_AA)
+    return image
+
+# Draw symmetries on a copy of an RGB image and save it, the file type follows the extension of fileName
+def saveImage(fileName, image, symmetries, rotations):
+    import cv2
+    image = np.ascontiguousarray(image[:, :, 0:3], dtype=np.uint8).copy()
+    drawLines(image, symmetries)
+    drawRotations(image, rotations)
+    cv2.imwrite(fileName, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+# Reflection and rotational symmetries as arrays:
+# reflections (n, 8): x1, y1, x2, y2, slope, score, normScore, depth
+# nodes (n): recursive loop of every reflection, see SymmetryTable
+# rotations (m, 4): center x, center y, radius, score
+def symmetryArrays(symmetries, rotations):
+    table = asTable(symmetries)
+    reflections = np.column_stack([table.line, table.slope, table.score, table.normScore, table.depth]).reshape(-1, 8)
+    rots = np.zeros((len(rotations), 4))
+    for i, rot in enumerate(rotations):
+        rots[i] = [rot[0][0], rot[0][1], rot[1], rot[2]]
+    return reflections, table.node.copy(), rots
+
+# Save the symmetries of an image as a .npz file with the arrays of symmetryArrays
+def saveResultsNpz(fileName, symmetries, rotations):
+    reflections, nodes, rots = symmetryArrays(symmetries, rotations)
+    np.savez(fileName, reflections=reflections, nodes=nodes, rotations=rots)
+
+# The symmetries of an image as one line of JSON, for a JSON Lines file
+def resultsJson(name, image, symmetries, rotations):
+    h, w = image.shape[0:2]
+    table = asTable(symmetries)
+    result = {
+        "image": name,
+        "height": h,
+        "width": w,
+        "reflections": [{"line": line, "slope": slope, "score": score, "normScore": normScore, "depth": depth, "node": node}
+                        for line, slope, score, normScore, depth, node in zip(table.line.tolist(), table.slope.tolist(),
+                        table.score.tolist(), table.normScore.tolist(), table.depth.tolist(), table.node.tolist())],
+        "rotations": [{"center": [float(rot[0][0]), float(rot[0][1])], "radius": float(rot[1]), "score": float(rot[2])}
+                      for rot in rotations]
+    }
+    return json.dumps(result)
+
 # Used to resize an image by a given fraction
 def resize_image(image, fraction):
+    import cv2
     h, w, _ = image.shape
     desiredW = int(w / fraction)
     desiredH = int(h / fraction)
@@ -0,0 +1,368 @@
+import functools
+
+import numpy as np
+from scipy import ndimage, signal
+from scipy.spatial import ConvexHull, QhullError, cKDTree
+
+from wavelet import matRound
+
+# Python port of libs/sym/computeVotingProj.m, computeVotingMax.m and computeSymAxis.m
+# Accumulator locations (locs) keep MATLAB's 1-based values
+
+# Floating point type of the voting space, set from parameters.py by the numpy backend
+precision = "float64"
+
+# Default voting parameters for an image of the given shape, as set in symBilOurCentLogGaborHSV.m
+# precision is the floating point type of the voting space
+def getVoteParam(shape):
+    voteParam = {
+        "accwidth": 2 * int(np.ceil(np.sqrt(shape[0]**2 + shape[1]**2))) + 1,
+        "accheight": 360,
+        "precision": precision
+    }
+    return voteParam
+
+# Default local maxima parameters, as set in symBilOurCentLogGaborHSV.m
+def getMaxParam():
+    maxParam = {
+        "hsize": 20,
+        "halfwindow": 10,
+        "mindistbetcent": 10,
+        "lowerbound": 0.01,
+        "minarea": 0.1
+    }
+    return maxParam
+
+# Project the symmetry candidates into an (angle, displacement) voting space
+# Every vote is weighted by its colour, mirror and orientation histogram measures, and by triData["weight"] if it has one
+# All votes are added in one scatter-add, in the same order as the MATLAB loop. The votes are summed in float64
+# and the voting space is stored in the precision of voteParam
+# The pairs that voted in each bin are kept in a compressed sparse index over the occupied bins only:
+# the pairs of occupied bin pntBins[i] are pntPairs[pntOffsets[i]:pntOffsets[i + 1]], see getVotePairs
+def computeVotingProj(triData, voteParam):
+    accheight = voteParam["accheight"]
+    accwidth = voteParam["accwidth"]
+
+    pntX = matRound(triData["gamma"] / np.pi * accheight).astype(np.int64)
+    pntY = matRound(accwidth * ((triData["displacement"] + (np.sqrt(2) / 2)) / np.sqrt(2))).astype(np.int64)
+    pntX[pntX == 0] = accheight
+    pntY = np.clip(pntY, 1, accwidth)
+    bins = (pntX - 1) * accwidth + (pntY - 1)
+    votes = triData["sym_clr"] * triData["sym_wmp"] * triData["sym_hst"]
+    if "weight" in triData:
+        votes = votes * triData["weight"]
+    voteMap = np.bincount(bins, weights=votes, minlength=accheight * accwidth).reshape(accheight, accwidth).astype(voteParam["precision"], copy=False)
+    countMap = np.bincount(bins, minlength=accheight * accwidth).reshape(accheight, accwidth).astype(voteParam["precision"])
+
+    order = np.argsort(bins, kind="stable")
+    pntBins, counts = np.unique(bins[order], return_counts=True)
+    pntOffsets = np.concatenate([[0], np.cumsum(counts)])
+
+    voteData = {
+        "voteMap": voteMap,
+        "countMap": countMap,
+        "pntBins": pntBins,
+        "pntOffsets": pntOffsets,
+        "pntPairs": order.astype(np.int32),
+        "pairs": triData["pairs"],
+        "locs": triData["locs"]
+    }
+    return voteData
+
+# Indices of the pairs that voted in the bins rows[0]..rows[1] x cols[0]..cols[1] (0-based, inclusive)
+# Occupied bins of a row are contiguous in the sparse index, so every row is a single slice
+def getVotePairs(voteData, rows, cols):
+    accwidth = voteData["voteMap"].shape[1]
+    rowStarts = np.arange(rows[0], rows[1] + 1) * accwidth
+    first = np.searchsorted(voteData["pntBins"], rowStarts + cols[0], side="left")
+    last = np.searchsorted(voteData["pntBins"], rowStarts + cols[1], side="right")
+    offsets = voteData["pntOffsets"]
+    pntPairs = voteData["pntPairs"]
+    return np.concatenate([pntPairs[offsets[f]:offsets[l]] for f, l in zip(first, last)])
+
+# Rotationally symmetric gaussian lowpass filter, as MATLAB's fspecial('gaussian', hsize, sigma)
+def fspecialGaussian(hsize, sigma):
+    siz = (hsize - 1) / 2
+    x, y = np.meshgrid(np.arange(-siz, siz + 1), np.arange(-siz, siz + 1))
+    h = np.exp(-(x * x + y * y) / (2 * sigma * sigma))
+    h[h < np.finfo(float).eps * h.max()] = 0
+    if h.sum() != 0:
+        h = h / h.sum()
+    return h
+
+# Central part of the 2D convolution, the same size as A, as MATLAB's conv2(A, H, 'same')
+def conv2same(A, H):
+    full = signal.convolve2d(A, H, mode="full")
+    r0 = H.shape[0] // 2
+    c0 = H.shape[1] // 2
+    return full[r0:r0 + A.shape[0], c0:c0 + A.shape[1]]
+
+# Blur with fspecial('gaussian', hsize, sigma), zero padded like conv2(A, H, 'same')
+# Unless the kernel is cut off at eps, it is the outer product of two 1D gaussians,
+# so the blur is done as two 1D convolutions instead of one hsize x hsize convolution
+# The kernel is computed in float64 and applied in the floating point type of A
+def gaussianBlur(A, hsize, sigma):
+    H = fspecialGaussian(hsize, sigma)
+    if not np.all(H > 0):
+        return conv2same(A, H.astype(A.dtype))
+    siz = (hsize - 1) / 2
+    g = np.exp(-np.arange(-siz, siz + 1)**2 / (2 * sigma * sigma))
+    g = (g / g.sum()).astype(A.dtype)
+    return conv2same(conv2same(A, g[:, None]), g[None, :])
+
+# Offsets of the samples on the three rings (radius d, d/4 and d/8) that a maximum is compared to
+# Duplicate offsets of the small rings are only kept once
+@functools.lru_cache(maxsize=None)
+def ringOffsets(d, n=8):
+    offsets = []
+    for k in range(n):
+        ag = k / n * 2 * np.pi
+        for radius in [d, d / 4, d / 8]:
+            offsets.append(tuple(matRound(radius * np.array([np.cos(ag), np.sin(ag)])).astype(int)))
+    return tuple(dict.fromkeys(offsets))
+
+# Greedily remove blobs that have a stronger (larger) blob closer than minDist
+# Close pairs come from a KD-tree and are handled closest first, ties on the lowest indices first,
+# which removes the same blobs as repeatedly taking the minimum of the full distance matrix
+# Returns a boolean mask of the blobs to keep
+def suppressCloseBlobs(centers, areas, minDist):
+    keep = np.ones(len(centers), dtype=bool)
+    if len(centers) < 2:
+        return keep
+    pairs = cKDTree(centers).query_pairs(minDist, output_type="ndarray")
+    if len(pairs) == 0:
+        return keep
+    dist = np.sqrt(np.sum((centers[pairs[:, 0]] - centers[pairs[:, 1]])**2, axis=1))
+    pairs = np.sort(pairs[dist < minDist], axis=1)
+    dist = dist[dist < minDist]
+    for c, r in pairs[np.lexsort((pairs[:, 1], pairs[:, 0], dist))]:
+        if not keep[c] or not keep[r]:
+            continue
+        if areas[c] < areas[r]:
+            keep[c] = False
+        else:
+            keep[r] = False
+    return keep
+
+# Find the local maxima in the blurred voting space
+# The angle axis wraps around, so the vote map is extended with halfwindow rows on both sides before blurring
+# Returns maxData with locs, an (n, 2) array of 1-based (angle, displacement) bins, and voteMapBlur
+def computeVotingMax(voteData, maxParam):
+    d = maxParam["halfwindow"]
+    voteMap = voteData["voteMap"]
+    voteMapEx = np.vstack([voteMap[-d:, :], voteMap, voteMap[:d, :]])
+
+    I = gaussianBlur(voteMapEx.astype(np.result_type(voteMap.dtype, np.float32)), maxParam["hsize"], maxParam["hsize"] / 4)
+    voteMapBlur = I[d:-d, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        I = I / I.max()
+
+    # A pixel is a maximum if it is larger than the samples on three rings around it,
+    # compared for all pixels at once with one shifted view of the map per ring offset
+    nr, nc = I.shape
+    J = np.zeros((nr, nc), dtype=bool)
+    if nr > 2 * d and nc > 2 * d:
+        center = I[d:nr - d, d:nc - d]
+        values = np.full(center.shape, -np.inf)
+        for dr, dc in ringOffsets(d):
+            np.maximum(values, I[d + dr:nr - d + dr, d + dc:nc - d + dc], out=values)
+        J[d:nr - d, d:nc - d] = (center > values) & (center > maxParam["lowerbound"])
+
+    # Connected blobs of maxima, labelled in column-major order like MATLAB's bwconncomp
+    labels, l = ndimage.label(J.T, structure=np.ones((3, 3)))
+    cols, rows = np.nonzero(labels)
+    blob = labels[cols, rows] - 1
+    areas = np.bincount(blob, minlength=l).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centers = matRound(np.column_stack([
+            np.bincount(blob, weights=rows + 1, minlength=l) / areas,
+            np.bincount(blob, weights=cols + 1, minlength=l) / areas
+        ]))
+
+    # Get rid of blobs that are too small
+    if l > 0:
+        small = areas < maxParam["minarea"] * areas.max()
+        areas = areas[~small]
+        centers = centers[~small]
+
+    # Get rid of blobs for which there's a strong blob nearby
+    keep = suppressCloseBlobs(centers, areas, maxParam["mindistbetcent"])
+    centers = centers[keep]
+
+    locs = centers.astype(int)
+    if len(locs) != 0:
+        locs[:, 0] = locs[:, 0] - d
+
+    maxData = {
+        "locs": locs,
+        "voteMapBlur": voteMapBlur
+    }
+    return maxData
+
+# Sample the line belonging to an (angle, displacement) bin in the coordinates of an image of the given shape
+# Returns the row and column coordinates of the sampled points
+def getSegment(shape, loc, voteParam):
+    accwidth = voteParam["accwidth"]
+    accheight = voteParam["accheight"]
+    rows = shape[0]
+    cols = shape[1]
+    maxDim = max(shape)
+    ro = (-np.sqrt(2) / 2) + np.arange(accwidth) * np.sqrt(2) / (accwidth - 1)
+    ag = np.pi * np.arange(accheight) / (accheight - 1)
+    X_d = ro[loc[1] - 1]
+    X_g = ag[loc[0] - 1]
+
+    diag = matRound(np.sqrt(rows**2 + cols**2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.arange(-diag, diag + 1)
+        y = (X_d - x * np.cos(X_g)) / np.sin(X_g)
+        xx = x * maxDim + (rows / 2)
+        yy = y * maxDim + (cols / 2)
+
+        y1 = np.arange(-diag, diag + 1)
+        x1 = (X_d - y1 * np.sin(X_g)) / np.cos(X_g)
+        xx1 = x1 * maxDim + (rows / 2)
+        yy1 = y1 * maxDim + (cols / 2)
+
+        if np.var(xx, ddof=1) < np.var(xx1, ddof=1):
+            return xx, yy
+    return xx1, yy1
+
+# Value at 'at' of the least squares line Y = p1 * X + p2
+# NaN when X does not span a line, where MATLAB's polyfit is rank deficient
+def polyfitLine(X, Y, at):
+    if np.ptp(X) == 0 or not np.all(np.isfinite(X)) or not np.all(np.isfinite(Y)):
+        return np.full(len(at), np.nan)
+    mX = X.mean()
+    mY = Y.mean()
+    p1 = np.sum((X - mX) * (Y - mY)) / np.sum((X - mX)**2)
+    return mY + p1 * (at - mX)
+
+# Endpoints of the line fitted through the given points, fitted both vertically and horizontally
+# The longest of the two fits is returned
+# Port of libs/util/getEndPointsLine.m
+def getEndPointsLine(X, Y):
+    idx = np.argsort(X, kind="stable")
+    X = X[idx]
+    Y = Y[idx]
+    fittedxVer = np.array([X.min(), X.max()])
+    fittedyVer = polyfitLine(X, Y, fittedxVer)
+    stPntVer = np.array([fittedxVer[0], fittedyVer[0]])
+    edPntVer = np.array([fittedxVer[1], fittedyVer[1]])
+
+    idx = np.argsort(Y, kind="stable")
+    Y = Y[idx]
+    X = X[idx]
+    fittedyHor = np.array([Y.min(), Y.max()])
+    fittedxHor = polyfitLine(Y, X, fittedyHor)
+    stPntHor = np.array([fittedxHor[0], fittedyHor[0]])
+    edPntHor = np.array([fittedxHor[1], fittedyHor[1]])
+
+    if np.isnan(stPntHor).any() or np.isnan(edPntHor).any():
+        return stPntVer, edPntVer
+    if np.isnan(stPntVer).any() or np.isnan(edPntVer).any():
+        return stPntHor, edPntHor
+    if np.linalg.norm(stPntVer - edPntVer) > np.linalg.norm(stPntHor - edPntHor):
+        return stPntVer, edPntVer
+    return stPntHor, edPntHor
+
+# Intersections of a polyline with a single line segment, sorted and without duplicates
+# Port of the robust option of libs/util/intersections.m
+def intersections(polyline, stPnt, edPnt):
+    P = polyline[:-1]
+    dP = np.diff(polyline, axis=0)
+    Q = np.asarray(stPnt, dtype=float)
+    dQ = np.asarray(edPnt, dtype=float) - Q
+
+    # Only segments with overlapping bounding boxes can intersect
+    candidates = (np.minimum(P[:, 0], P[:, 0] + dP[:, 0]) <= max(Q[0], Q[0] + dQ[0])) & \
+        (np.maximum(P[:, 0], P[:, 0] + dP[:, 0]) >= min(Q[0], Q[0] + dQ[0])) & \
+        (np.minimum(P[:, 1], P[:, 1] + dP[:, 1]) <= max(Q[1], Q[1] + dQ[1])) & \
+        (np.maximum(P[:, 1], P[:, 1] + dP[:, 1]) >= min(Q[1], Q[1] + dQ[1]))
+    P = P[candidates]
+    dP = dP[candidates]
+
+    QP = Q - P
+    denom = dP[:, 0] * dQ[1] - dP[:, 1] * dQ[0]
+    scale = np.linalg.norm(dP, axis=1) * np.linalg.norm(dQ)
+    singular = np.abs(denom) <= np.finfo(float).eps * scale
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t1 = (QP[:, 0] * dQ[1] - QP[:, 1] * dQ[0]) / denom
+        t2 = (QP[:, 0] * dP[:, 1] - QP[:, 1] * dP[:, 0]) / denom
+    t1[singular] = np.nan
+    inRange = (t1 >= 0) & (t2 >= 0) & (t1 <= 1) & (t2 <= 1)
+    xy0 = P[inRange] + t1[inRange, None] * dP[inRange]
+
+    # Parallel segments on the same line intersect in the middle of their overlapping region
+    crossQP = dP[:, 0] * QP[:, 1] - dP[:, 1] * QP[:, 0]
+    overlap = singular & (np.abs(crossQP) <= np.finfo(float).eps * scale)
+    if overlap.any():
+        Po = P[overlap]
+        Eo = Po + dP[overlap]
+        lo = np.maximum(np.minimum(Po, Eo), np.minimum(Q, Q + dQ))
+        hi = np.minimum(np.maximum(Po, Eo), np.maximum(Q, Q + dQ))
+        xy0 = np.vstack([xy0, (lo + hi) / 2])
+
+    if len(xy0) == 0:
+        return xy0
+    return np.unique(xy0, axis=0)
+
+# Clip a line segment to the convex hull of the given points
+# Port of libs/util/getConvexHullInter.m
+def getConvexHullInter(pnts, stPntIN, edPntIN):
+    hull = ConvexHull(pnts)
+    ch = pnts[np.append(hull.vertices, hull.vertices[0])]
+    xy = intersections(ch, stPntIN, edPntIN)
+    if len(xy) > 1:
+        return xy[0], xy[1]
+    return stPntIN, edPntIN
+
+# Compute the symmetry axis of every local maximum
+# The sampled line of a maximum is clipped to the convex hull of the pairs that voted near it
+# The score of a maximum is its value in the blurred voting space, unless maxData holds the scores itself
+# Returns symData with the scores and the start / end points (x, y) of every axis
+def computeSymAxis(shape, voteData, maxData, voteParam, maxParam):
+    locs = maxData["locs"]
+    accheight, accwidth = voteData["voteMap"].shape
+    maxDim = max(shape)
+    wd = maxParam["halfwindow"]
+    axisLoc = [None] * len(locs)
+    axisPnts = [None] * len(locs)
+    scores = np.zeros(len(locs))
+    for i, loc in enumerate(locs):
+        row, col = getSegment(shape, loc, voteParam)
+        axisLoc[i] = np.column_stack([row, col])
+        axisRows = np.clip([loc[0] - wd, loc[0] + wd], 1, accheight) - 1
+        axisCols = np.clip([loc[1] - wd, loc[1] + wd], 1, accwidth) - 1
+        axisPnts[i] = getVotePairs(voteData, axisRows, axisCols)
+        if "scores" in maxData:
+            scores[i] = maxData["scores"][i]
+        else:
+            scores[i] = maxData["voteMapBlur"][loc[0] - 1, loc[1] - 1]
+
+    axsSt = [None] * len(locs)
+    axsEd = [None] * len(locs)
+    for i in range(len(locs)):
+        stPnt, edPnt = getEndPointsLine(axisLoc[i][:, 0], axisLoc[i][:, 1])
+        pairIds = axisPnts[i]
+        if len(pairIds) > 0:
+            features = np.unique(voteData["pairs"][pairIds])
+            votePnts = np.unique(voteData["locs"][features], axis=0)
+            if len(votePnts) > 2:
+                votePnts[:, 0] = votePnts[:, 0] * maxDim + shape[0] / 2
+                votePnts[:, 1] = votePnts[:, 1] * maxDim + shape[1] / 2
+                try:
+                    stPnt, edPnt = getConvexHullInter(votePnts, stPnt, edPnt)
+                except QhullError:
+                    pass
+        axsSt[i] = np.flip(stPnt)
+        axsEd[i] = np.flip(edPnt)
+
+    symData = {
+        "axisLoc": axisLoc,
+        "axisPnts": axisPnts,
+        "scores": scores,
+        "axsSt": axsSt,
+        "axsEd": axsEd
+    }
+    return symData
@@ -0,0 +1,410 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import fft, ndimage
+
+# Python port of libs/sym/computeLogGaborResponse.m and libs/sym/computeWaveletCoeff_LogGabor.m
+# Pixel coordinates, orientation and scale indices keep MATLAB's 1-based values
+# so the returned features are identical to the ones produced by the matlab backend
+
+# Floating point type of the filter banks, responses and histograms, set from parameters.py by the numpy backend
+precision = "float64"
+
+# Default wavelet parameters, as set in symBilOurCentLogGaborHSV.m
+# halfWindowSize and hopSize depend on the image size, see getWavParam
+# precision is the floating point type the features are computed in
+def getWavParam(image):
+    wavParam = {
+        "nAngs": 32,
+        "nScls": 12,
+        "minWaveLength": 6,
+        "mult": 1.2,
+        "radSigma": 0.55,
+        "angSigma": 0.2,
+        "histBinNumT": 32,
+        "magThreshold": 0.01,
+        "precision": precision
+    }
+    wavParam["halfWindowSize"] = int(matRound(max(image.shape) / 50))
+    wavParam["hopSize"] = 2 * wavParam["halfWindowSize"] + 1
+    return wavParam
+
+# Round half away from zero, as MATLAB's round does (numpy rounds half to even)
+def matRound(x):
+    return np.sign(x) * np.floor(np.abs(x) + 0.5)
+
+# Bin index of each value as returned by MATLAB's histcounts
+# Bins are [edge(i), edge(i+1)), the last bin also includes the last edge
+# Values outside of the edges are given bin 0, others are 1-based
+def histcountsBin(values, edges):
+    values = np.asarray(values, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    bins = np.searchsorted(edges, values, side="right")
+    bins[values == edges[-1]] = len(edges) - 1
+    bins[~((values >= edges[0]) & (values <= edges[-1]))] = 0
+    return bins
+
+# Convert an RGB image to grayscale with the same weights (and rounding for integer images) as MATLAB's rgb2gray
+def rgb2gray(image):
+    gray = 0.298936021293775 * image[..., 0] + 0.587043074451121 * image[..., 1] + 0.114020904255103 * image[..., 2]
+    if np.issubdtype(image.dtype, np.integer):
+        gray = matRound(gray).astype(image.dtype)
+    return gray
+
+# Convert an RGB image to HSV the same way MATLAB's rgb2hsv does
+# Hue, saturation and value are all in [0, 1]
+def rgb2hsv(image):
+    image = np.asarray(image)
+    if np.issubdtype(image.dtype, np.integer):
+        image = image / float(np.iinfo(image.dtype).max)
+    r = image[..., 0].astype(float)
+    g = image[..., 1].astype(float)
+    b = image[..., 2].astype(float)
+    v = np.maximum(np.maximum(r, g), b)
+    h = np.zeros(v.shape)
+    s = v - np.minimum(np.minimum(r, g), b)
+    z = s == 0
+    s = s + z
+    # Later assignments take precedence, as in MATLAB
+    k = r == v
+    h[k] = (g[k] - b[k]) / s[k]
+    k = g == v
+    h[k] = 2 + (b[k] - r[k]) / s[k]
+    k = b == v
+    h[k] = 4 + (r[k] - g[k]) / s[k]
+    h = h / 6
+    h[h < 0] = h[h < 0] + 1
+    h = (~z) * h
+    k = v != 0
+    s[k] = (~z[k]) * s[k] / v[k]
+    s[~k] = 0
+    return np.stack([h, s, v], axis=-1)
+
+# Normalised frequency range of a filter axis, adjusted for odd and even sizes
+def freqRange(n):
+    if n % 2:
+        return np.arange(-(n - 1) / 2, (n - 1) / 2 + 1) / (n - 1)
+    return np.arange(-n / 2, n / 2) / n
+
+# Constructs a low-pass butterworth filter with the frequency origin at the corners
+# Port of libs/util/lowpassfilter.m
+def lowpassfilter(sze, cutoff, n):
+    if cutoff < 0 or cutoff > 0.5:
+        raise ValueError("cutoff frequency must be between 0 and 0.5")
+    if n % 1 != 0 or n < 1:
+        raise ValueError("n must be an integer >= 1")
+    rows, cols = sze
+    x, y = np.meshgrid(freqRange(cols), freqRange(rows))
+    radius = np.sqrt(x**2 + y**2)
+    return np.fft.ifftshift(1.0 / (1.0 + (radius / cutoff)**(2 * n)))
+
+# Parameters that define a Log-Gabor filter bank, together with the image size
+filterBankKeys = ["nAngs", "nScls", "minWaveLength", "mult", "radSigma", "angSigma", "precision"]
+
+# Radial and angular components of the Log-Gabor filter bank for an image size
+# Returns logGabor, an (nScls, rows, cols) array and spread, an (nAngs, rows, cols) array
+# The filter of scale s and orientation o is logGabor[s] * spread[o]
+# The filters are computed in float64 and stored in the precision of wavParam
+def computeFilterBank(rows, cols, wavParam):
+    nAngs = wavParam["nAngs"]
+    nScls = wavParam["nScls"]
+
+    x, y = np.meshgrid(freqRange(cols), freqRange(rows))
+    radius = np.fft.ifftshift(np.sqrt(x**2 + y**2))
+    theta = np.fft.ifftshift(np.arctan2(-y, x))
+    # Get rid of the 0 radius value at the 0 frequency point so taking the log of the radius is safe
+    radius[0, 0] = 1
+    sintheta = np.sin(theta)
+    costheta = np.cos(theta)
+
+    # Radial filter component, limited by a low-pass filter
+    lp = lowpassfilter([rows, cols], .45, 15)
+    logGabor = np.zeros((nScls, rows, cols))
+    for s in range(nScls):
+        wavelength = wavParam["minWaveLength"] * wavParam["mult"]**s
+        fo = 1.0 / wavelength
+        lg = np.exp((-(np.log(radius / fo))**2) / (2 * np.log(wavParam["radSigma"])**2))
+        lg = lg * lp
+        lg[0, 0] = 0
+        logGabor[s] = lg
+
+    # Angular filter component
+    thetaSigma = np.pi / nAngs / wavParam["angSigma"]
+    spread = np.zeros((nAngs, rows, cols))
+    for o in range(nAngs):
+        angl = o * np.pi / nAngs
+        ds = sintheta * np.cos(angl) - costheta * np.sin(angl)
+        dc = costheta * np.cos(angl) + sintheta * np.sin(angl)
+        dtheta = np.abs(np.arctan2(ds, dc))
+        spread[o] = np.exp((-dtheta**2) / (2 * thetaSigma**2))
+
+    logGabor = logGabor.astype(wavParam["precision"], copy=False)
+    spread = spread.astype(wavParam["precision"], copy=False)
+    logGabor.setflags(write=False)
+    spread.setflags(write=False)
+    return logGabor, spread
+
+# LRU cache of Log-Gabor filter banks, keyed on the image size and the filter parameters
+# recursiveSym crops and the images in a batch mostly share a handful of sizes,
+# so their filter banks only have to be computed once
+# Banks are evicted least recently used first when the cache holds more than maxBytes
+class FilterBankCache:
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.banks = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, rows, cols, wavParam):
+        key = (rows, cols) + tuple(wavParam[k] for k in filterBankKeys)
+        with self.lock:
+            bank = self.banks.get(key)
+            if bank is not None:
+                self.banks.move_to_end(key)
+                self.hits = self.hits + 1
+                return bank
+            self.misses = self.misses + 1
+
+        bank = computeFilterBank(rows, cols, wavParam)
+        size = bank[0].nbytes + bank[1].nbytes
+        with self.lock:
+            if size <= self.maxBytes and key not in self.banks:
+                self.banks[key] = bank
+                self.nbytes = self.nbytes + size
+                while self.nbytes > self.maxBytes:
+                    _, old = self.banks.popitem(last=False)
+                    self.nbytes = self.nbytes - (old[0].nbytes + old[1].nbytes)
+                    self.evictions = self.evictions + 1
+        return bank
+
+    def clear(self):
+        with self.lock:
+            self.banks.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "banks": len(self.banks),
+                "bytes": self.nbytes
+            }
+
+# Filter banks shared by all detections in this process
+# The numpy backend sets its size from filterCacheSize in parameters.py
+filterBankCache = FilterBankCache(512 * 2**20)
+
+# Number of threads used for the batched inverse FFTs, -1 uses all cores
+fftWorkers = 1
+
+# Number of orientations transformed in one batched inverse FFT
+# Bounds the number of full resolution complex planes held in memory at once
+fftBatchSize = 8
+
+# Yield the complex Log-Gabor responses of a grayscale image in batches of orientations
+# Every step yields (s, o, responses) with responses an (n, rows, cols) array of orientations o to o + n of scale s
+# The image FFT is computed once and the inverse FFTs of a batch are done in a single call
+# A float32 image and filter bank give complex64 responses
+def iterLogGaborResponses(img, wavParam):
+    rows, cols = img.shape
+    logGabor, spread = filterBankCache.get(rows, cols, wavParam)
+    imagefft = fft.fft2(img)
+    for s in range(wavParam["nScls"]):
+        scaled = imagefft * logGabor[s]
+        for o in range(0, wavParam["nAngs"], fftBatchSize):
+            filtered = scaled * spread[o:o + fftBatchSize]
+            yield s, o, fft.ifft2(filtered, axes=(-2, -1), overwrite_x=True, workers=fftWorkers)
+
+# Compute the complex Log-Gabor responses of a grayscale image
+# Returns EO, an (nScls, nAngs, rows, cols) array of complex valued convolution results
+def computeLogGaborResponse(img, wavParam):
+    rows, cols = img.shape
+    EO = np.zeros((wavParam["nScls"], wavParam["nAngs"], rows, cols), dtype=complex)
+    for s, o, responses in iterLogGaborResponses(img, wavParam):
+        EO[s, o:o + len(responses)] = responses
+    return EO
+
+# Maximum Log-Gabor amplitude of every pixel, with the orientation and scale it was found at
+# Responses are folded into running maxima as they are produced, so only one batch of
+# orientations is in memory instead of all nScls x nAngs responses.
+# Ties keep the first orientation and scale, as MATLAB's max over orientations and then scales does
+# Returns ampM, angM and sclM; angM and sclM are 1-based
+def reduceLogGaborResponses(img, wavParam):
+    nAngs = wavParam["nAngs"]
+    ampM = np.full(img.shape, -np.inf, dtype=img.dtype)
+    angM = np.zeros(img.shape, dtype=int)
+    sclM = np.zeros(img.shape, dtype=int)
+    for s, o, responses in iterLogGaborResponses(img, wavParam):
+        if o == 0:
+            sclAmp = np.full(img.shape, -np.inf, dtype=img.dtype)
+            sclAng = np.zeros(img.shape, dtype=int)
+        amp = np.abs(responses)
+        batchAng = np.argmax(amp, axis=0)
+        batchAmp = np.take_along_axis(amp, batchAng[None], axis=0)[0]
+        better = batchAmp > sclAmp
+        sclAmp[better] = batchAmp[better]
+        sclAng[better] = batchAng[better] + o
+        if o + len(responses) == nAngs:
+            better = sclAmp > ampM
+            ampM[better] = sclAmp[better]
+            angM[better] = sclAng[better] + 1
+            sclM[better] = s + 1
+    return ampM, angM, sclM
+
+# Indices of the pixels in the windows around the given 1-based centers
+# Returns an (n, 2 * halfWindowSize + 1) array of 0-based indices
+def windowIndices(centers, halfWindowSize):
+    return np.asarray(centers)[:, None] - 1 + np.arange(-halfWindowSize, halfWindowSize + 1)
+
+# Normalised colour histograms of the windows around all feature points
+# 8x2x2 HSV histograms for RGB images, 32 bin histograms of the standardised intensities for grayscale images
+# Returns an (s, nBins) array
+def colorHistograms(imgRGB, x, y, halfWindowSize):
+    s = len(x)
+    # Pixels of a window, explicit so that an image without features gives an (0, nBins) array
+    winPixels = (2 * halfWindowSize + 1)**2
+    rIdx = windowIndices(x, halfWindowSize)
+    cIdx = windowIndices(y, halfWindowSize)
+    imP = imgRGB[rIdx[:, :, None], cIdx[:, None, :]]
+    if imgRGB.ndim == 2:
+        imP = imP.astype(float)
+        if np.issubdtype(imgRGB.dtype, np.integer):
+            imP = imP / np.iinfo(imgRGB.dtype).max
+        with np.errstate(invalid="ignore", divide="ignore"):
+            imP = (imP - imP.mean(axis=(1, 2), keepdims=True)) / imP.std(axis=(1, 2), ddof=1, keepdims=True)
+        imP[np.isnan(imP)] = 0
+        RGBq = 32
+        nBins = RGBq + 1
+        bins = histcountsBin(imP.reshape(s, winPixels), np.arange(RGBq + 1) / RGBq)
+    else:
+        imHSV = rgb2hsv(imP)
+        imH = imHSV[..., 0]
+        imS = imHSV[..., 1]
+        imV = imHSV[..., 2]
+        imH[imH == 0] = 1
+        Hq = 8
+        Sq = 2
+        Vq = 2
+        nBins = Hq * Sq * Vq
+        binH = histcountsBin(imH.reshape(s, winPixels), np.arange(Hq + 1) / Hq)
+        binS = histcountsBin(imS.reshape(s, winPixels), np.arange(Sq + 1) / Sq)
+        binV = histcountsBin(imV.reshape(s, winPixels), np.arange(Vq + 1) / Vq)
+        # Column-major flattening of the Hq x Sq x Vq histogram, as histC(:) in MATLAB
+        bins = (binH - 1) + Hq * (binS - 1) + Hq * Sq * (binV - 1)
+    # One bincount for all features, every feature gets its own range of bins
+    hC = np.bincount((bins + nBins * np.arange(s)[:, None]).ravel(), minlength=nBins * s).reshape(s, nBins).astype(float)
+    if imgRGB.ndim == 2:
+        # Bin 0 holds the values outside of the histogram edges
+        hC = hC[:, 1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return hC / hC.sum(axis=1, keepdims=True)
+
+# Extract wavelet edge features with textural and colour histograms from an image
+# Returns wavData, a dict with the same fields as the MATLAB struct:
+# c (scale), m (magnitude), a (orientation), x / y (normalised location), xS / yS (pixel location),
+# v (orientation histograms), vi (dominant orientation bin) and hC (colour histograms)
+# All fields are arrays with one row per feature
+def computeWaveletCoeffLogGabor(img, wavParam):
+    imgRGB = img
+    img = grayImage(imgRGB, wavParam)
+    rows, cols = img.shape
+
+    ampM, angM, sclM = reduceLogGaborResponses(img, wavParam)
+    winRows, winCols = windowCenters(rows, cols, wavParam)
+    windows = windowMaxima(ampM, angM, sclM, winRows, winCols, wavParam)
+    return selectFeatures(windows, imgRGB, wavParam)
+
+# Grayscale image in [0, 1] the Log-Gabor responses are computed on, in the precision of wavParam
+def grayImage(imgRGB, wavParam):
+    img = imgRGB
+    if imgRGB.ndim > 2 and imgRGB.shape[2] > 1:
+        img = rgb2gray(imgRGB)
+    return img.astype(wavParam["precision"]) / 255
+
+# 1-based centers of the rows and columns of the windows a feature is searched in
+def windowCenters(rows, cols, wavParam):
+    halfWindowSize = wavParam["halfWindowSize"]
+    hopSize = wavParam["hopSize"]
+    nr = min(int(np.floor((rows - 2 * halfWindowSize) / hopSize)) + 1, rows)
+    nc = min(int(np.floor((cols - 2 * halfWindowSize) / hopSize)) + 1, cols)
+    winRows = matRound(np.linspace(halfWindowSize + 1, rows - halfWindowSize, nr)).astype(int)
+    winCols = matRound(np.linspace(halfWindowSize + 1, cols - halfWindowSize, nc)).astype(int)
+    return winRows, winCols
+
+# Strongest response of every window and the magnitude weighted orientation histogram of the window
+# winRows and winCols are 1-based window centers in the pixels of ampM, angM and sclM
+# Returns a dict of (len(winRows), len(winCols)) arrays: C (magnitude), A (orientation), X / Y (1-based pixel location),
+# SC (scale), VI (dominant orientation bin) and V, the orientation histograms
+# Floating point results have the type of ampM, the histograms are summed in float64
+def windowMaxima(ampM, angM, sclM, winRows, winCols, wavParam):
+    nAngs = wavParam["nAngs"]
+    halfWindowSize = wavParam["halfWindowSize"]
+    histBinNumT = wavParam["histBinNumT"]
+    binEdgesT = np.linspace(1, nAngs, histBinNumT)
+    nr = len(winRows)
+    nc = len(winCols)
+
+    # All nr x nc windows at once, flattened in column-major order as MATLAB's (:)
+    winSize = 2 * halfWindowSize + 1
+    rIdx = windowIndices(winRows, halfWindowSize)[:, None, None, :]
+    cIdx = windowIndices(winCols, halfWindowSize)[None, :, :, None]
+    mgVec = ampM[rIdx, cIdx].reshape(nr, nc, -1)
+    orVec = angM[rIdx, cIdx].reshape(nr, nc, -1)
+    scVec = sclM[rIdx, cIdx].reshape(nr, nc, -1)
+
+    # First maximum of every window, as MATLAB's find
+    first = np.argmax(mgVec, axis=2)
+    C = np.take_along_axis(mgVec, first[:, :, None], axis=2)[:, :, 0]
+    angMax = np.take_along_axis(orVec, first[:, :, None], axis=2)[:, :, 0]
+    A = ((angMax - 1) * np.pi / nAngs - np.pi / 2).astype(ampM.dtype)
+    X = winRows[:, None] + first % winSize - halfWindowSize
+    Y = winCols[None, :] + first // winSize - halfWindowSize
+    SC = np.take_along_axis(scVec, first[:, :, None], axis=2)[:, :, 0]
+
+    # Histograms of magnitude weighted orientations, one bincount for all windows
+    whichBin = histcountsBin(orVec, binEdgesT) + 1
+    offsets = histBinNumT * np.arange(nr * nc).reshape(nr, nc, 1)
+    V = np.bincount((whichBin - 1 + offsets).ravel(), weights=mgVec.ravel(), minlength=nr * nc * histBinNumT).reshape(nr, nc, histBinNumT)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        V = (V / V.sum(axis=2, keepdims=True)).astype(ampM.dtype)
+    VI = np.take_along_axis(whichBin, first[:, :, None], axis=2)[:, :, 0]
+    return {"C": C, "A": A, "X": X, "Y": Y, "SC": SC, "V": V, "VI": VI}
+
+# Features of the windows of windowMaxima that are local maxima above the magnitude threshold, border windows are never kept
+# Colour histograms are taken from imgRGB, the image the window locations are in
+# Returns wavData as computeWaveletCoeffLogGabor
+def selectFeatures(windows, imgRGB, wavParam):
+    rows, cols = imgRGB.shape[0:2]
+    C = windows["C"]
+    M = np.zeros(C.shape, dtype=C.dtype)
+    if C.shape[0] > 2 and C.shape[1] > 2:
+        t = wavParam["magThreshold"] * C.max()
+        bMax = ndimage.maximum_filter(C, size=3)[1:-1, 1:-1]
+        bMin = ndimage.minimum_filter(C, size=3)[1:-1, 1:-1]
+        inner = C[1:-1, 1:-1]
+        M[1:-1, 1:-1] = np.where((inner > 0.5 * bMax) & (bMin > t), inner, 0)
+
+    # Features in row-major order of the windows
+    keep = M > 0
+    x = windows["X"][keep]
+    y = windows["Y"][keep]
+
+    wavData = {
+        "c": windows["SC"][keep],
+        "m": M[keep],
+        "a": windows["A"][keep],
+        "x": (x - (rows / 2)) / max(rows, cols),
+        "y": (y - (cols / 2)) / max(rows, cols),
+        "xS": x,
+        "yS": y,
+        "v": windows["V"][keep],
+        "vi": windows["VI"][keep],
+        "hC": colorHistograms(imgRGB, x, y, wavParam["halfWindowSize"]).astype(C.dtype)
+    }
+    return wavData
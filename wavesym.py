@@ -0,0 +1,138 @@
+import numpy as np
+
+import instrument
+import pyramid
+import tiles
+import triangulation
+import voting
+import wavelet
+
+# Python port of symBilOurCentLogGaborHSV.m
+# Wavelet-based reflection symmetry detection via textural and color histograms (Elawady et al.)
+
+# Floating point type ('float32' or 'float64') of the wavelet, triangulation and voting stages
+def setPrecision(precision):
+    wavelet.precision = precision
+    triangulation.precision = precision
+    voting.precision = precision
+
+# Detect reflection symmetry axes in an RGB or grayscale image
+# Returns symRes, an (n, 6) array with columns x1, y1, x2, y2, score, normalized score,
+# sorted on score. As in MATLAB, the normalized score column is only added when more than one axis is found
+def symBilOurCentLogGaborHSV(image):
+    symRes, _ = detect(image)
+    return symRes
+
+# Same as symBilOurCentLogGaborHSV, but also return the blurred voting space
+def detect(image):
+    wavData = detectFeatures(image)
+    return voteSymmetries(wavData, image.shape)
+
+# Wavelet features of an image
+@instrument.traced
+def detectFeatures(image):
+    wavParam = wavelet.getWavParam(image)
+    wavData = wavelet.computeWaveletCoeffLogGabor(image, wavParam)
+    instrument.record(height=image.shape[0], width=image.shape[1], featurePoints=len(wavData["x"]))
+    return wavData
+
+# Pairwise triangulation, voting, maxima selection and axis computation on the features of an image of the given shape
+# Returns symRes and the blurred voting space
+# The trace event holds the number of feature points s, their s(s-1)/2 pairs, the pairs that voted,
+# the occupied and total bins of the voting space, the largest number of votes in one bin and the number of maxima and axes
+@instrument.traced
+def voteSymmetries(wavData, shape):
+    s = len(wavData["x"])
+    triData = triangulation.computeTriangles(wavData)
+    triData = triangulation.removeNanPairs(triData)
+
+    voteParam = voting.getVoteParam(shape)
+    voteData = voting.computeVotingProj(triData, voteParam)
+
+    maxParam = voting.getMaxParam()
+    maxData = voting.computeVotingMax(voteData, maxParam)
+
+    symData = voting.computeSymAxis(shape, voteData, maxData, voteParam, maxParam)
+    if instrument.enabled:
+        instrument.record(featurePoints=s, pairs=s * (s - 1) // 2, votes=len(voteData["pntPairs"]),
+                          occupiedBins=len(voteData["pntBins"]), bins=voteData["voteMap"].size,
+                          maxBinVotes=int(voteData["countMap"].max()) if voteData["countMap"].size else 0,
+                          maxima=len(maxData["locs"]), axes=len(symData["scores"]))
+
+    return symResults(symData), maxData["voteMapBlur"]
+
+# Rows of symRes from the axes of computeSymAxis, sorted on score, with the normalized score when there is more than one axis
+def symResults(symData):
+    symRes = np.zeros((len(symData["scores"]), 5))
+    for i in range(len(symData["scores"])):
+        symRes[i, 0:2] = symData["axsSt"][i]
+        symRes[i, 2:4] = symData["axsEd"][i]
+        symRes[i, 4] = symData["scores"][i]
+
+    if len(symRes) > 1:
+        idx = np.argsort(-symRes[:, 4], kind="stable")
+        symRes = symRes[idx]
+        symRes = np.column_stack([symRes, symRes[:, 4] / symRes[0, 4]])
+
+    return symRes
+
+# Detect reflection symmetry axes coarse-to-fine on an image pyramid with the given number of levels
+# The axes are found on the coarsest level, as symBilOurCentLogGaborHSV would on the downsampled image,
+# and moved to their location in the full resolution image on the finer levels (see pyramid.py)
+# Scores are normalised to the voting space of the coarsest level, so the same thresholds apply for any number of levels
+# Returns symRes like symBilOurCentLogGaborHSV, in the coordinates of image
+def symPyramid(image, levels):
+    pyrParam = pyramid.getPyramidParam(levels)
+    images = pyramid.buildPyramid(image, pyrParam)
+    if len(images) == 1:
+        return symBilOurCentLogGaborHSV(image)
+
+    coarse = images[0]
+    wavData = detectFeatures(coarse)
+    triData = triangulation.computeTriangles(wavData)
+    triData = triangulation.removeNanPairs(triData)
+    voteData = voting.computeVotingProj(triData, voting.getVoteParam(coarse.shape))
+    maxParam = voting.getMaxParam()
+    locs = voting.computeVotingMax(voteData, maxParam)["locs"]
+    if len(locs) == 0:
+        return np.zeros((0, 5))
+
+    accwidth = voteData["voteMap"].shape[1]
+    colScale = 1
+    for img in images[1:]:
+        prevColScale = colScale
+        colScale = voting.getVoteParam(img.shape)["accwidth"] / accwidth
+        wavData, voteData, locs, scores = pyramid.refineLevel(wavData, voteData, locs, img, pyrParam, colScale, prevColScale)
+
+    maxData = {"locs": locs, "scores": scores}
+    symData = voting.computeSymAxis(image.shape, voteData, maxData, voting.getVoteParam(image.shape), maxParam)
+    return symResults(symData)
+
+# Detect reflection symmetry axes in an image (or a memory-mapped image) whose wavelet features are computed
+# in tiles of tileSize pixels (see tiles.py), voting is the same as in symBilOurCentLogGaborHSV
+def symTiled(image, tileSize):
+    wavData = tiles.tiledFeatures(image, wavelet.getWavParam(image), tileSize)
+    symRes, _ = voteSymmetries(wavData, image.shape)
+    return symRes
+
+# Features of a whole image that lie inside the region top, left, height, width (pixels)
+# Locations are normalised to the region, as if the features were computed on the cut out region
+def regionFeatures(wavData, region):
+    top, left, height, width = region
+    inside = (wavData["xS"] > top) & (wavData["xS"] <= top + height) & \
+        (wavData["yS"] > left) & (wavData["yS"] <= left + width)
+    regionData = {key: value[inside] for key, value in wavData.items()}
+    regionData["x"] = (regionData["xS"] - top - (height / 2)) / max(height, width)
+    regionData["y"] = (regionData["yS"] - left - (width / 2)) / max(height, width)
+    return regionData
+
+# Detect reflection symmetry axes inside a region of an image, reusing the features of the whole image
+# Only triangulation and voting are done for the region, the wavelet features are not recomputed
+# Returns symRes like symBilOurCentLogGaborHSV, with coordinates in the whole image
+def symRegion(wavData, imageShape, region):
+    top, left, height, width = region
+    shape = (height, width) + tuple(imageShape[2:])
+    symRes, _ = voteSymmetries(regionFeatures(wavData, region), shape)
+    symRes[:, [0, 2]] += left
+    symRes[:, [1, 3]] += top
+    return symRes